@@ -1,35 +1,84 @@
-# aggregator.py — Zenn新着横断 → タグ集計（完全版）
-# - 直近31日だけDB保持（古い metrics / articles は自動削除）
-# - /api/articles?order=latest をページング -> 各記事HTMLから tags / liked_count 補完
+# aggregator.py — Zenn / Qiita 新着横断 → タグ集計（完全版）
+# - 直近31日だけDB保持（古い metrics / articles は取り込みのコミット後に小分けで削除し、空きページが
+#   閾値を超えたら incremental_vacuum、WAL をチェックポイント。テーブル・インデックスのサイズを報告）
+# - 取得元ごとのアダプタ（SourceAdapter）で一覧をページング。取得元は別スレッドで並行にクロールし、書き込みは1本
+#   Zenn: /api/articles?order=latest -> 各記事HTMLから tags / liked_count 補完
+#   Qiita: /api/v2/items（一覧だけで揃うので詳細は取らない）
 # - 新着のみ INSERT OR IGNORE、既存は残す（重複防止: articles.url UNIQUE）
-# - 1/7/30日の metrics を毎回再計算（DB内の該当期間データで集計）
-# - 読み出し: get_rankings / get_tool_detail / get_stats
-
+# - 記事は1URL1行、タグとの対応は article_tags（複数タグの記事も全タグで集計される）
+# - タグは tag_aliases.csv の別名表で正規 slug にそろえて保存（golang -> go。表に足した別名は既存データも付け替え）
+# - DB にある記事は詳細を取り直さない。取得元ごとの前回の最新記事（crawl_state）より古いページに着いたら打ち切り
+# - 記事HTMLはスレッドプールで並列取得（ホスト単位のトークンバケットで流量制限、DB書き込みは呼び出し元スレッドのみ）
+# - 記事HTMLはストリーミングで読み、title / 公開日時 / タグが揃った時点で接続を閉じる（上限バイト数あり）
+# - 1/7/30日の metrics を毎回再計算（DB内の該当期間データで集計。取得元別の内訳は metrics_sources）
+# - metrics スナップショットの記事のあるタグを順位付きで metrics_history に複製（長期保持、古い分は週1点に間引き）
+# - タグ検索: tools_fts（FTS5 trigram）で slug / 表示名 / 別名を部分一致検索
+# - 取得・解析・SQL・レート制限待ち・フェーズの所要時間と書き込み行数を telemetry に記録
+# - 読み出し: get_rankings / get_tool_detail / get_stats / get_trends / get_history / search_tools
+
+import codecs
+import base64
+from abc import ABC, abstractmethod
 import csv
+import html as html_lib
+import json
 import os
+import queue
 import re
 import time
 import sqlite3
+import threading
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
 from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
-from typing import Dict, List, Optional
+from typing import Dict, Generator, Iterable, Iterator, List, Optional, Sequence, Tuple
+from urllib.parse import urlsplit
 import datetime as dt
 
-import requests
+from http_client import HTTP_CACHE_PATH, ResponseCache, fetch_cached, fetch_cached_stream
+from maintenance import PruneRule, checkpoint, format_size_report, prune, reclaim_space, size_report
+from scoring import SCORING_SPEC, ScoringConfig, compute_bucket_metrics, parse_scoring
+from telemetry import PHASE_SECONDS, RATE_WAIT_SECONDS, ROWS_WRITTEN, SQL_SECONDS
 
 # ===========================
 # 定数・設定
 # ===========================
 JST = timezone(timedelta(hours=9))
 DB_PATH = os.getenv("DB_PATH", os.path.abspath("trend.db"))
+# 設定CSVはカレントディレクトリによらず backend/ 直下のものを使う（リポジトリ直下から dump_json.py を起動しても同じ）
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+TOOLS_CSV = os.getenv("TOOLS_CSV", os.path.join(BACKEND_DIR, "tools.csv"))
+TAG_ALIASES_CSV = os.getenv("TAG_ALIASES_CSV", os.path.join(BACKEND_DIR, "tag_aliases.csv"))
 
 USER_AGENT = "oss-rank-bot/1.0 (+https://example.com)"
-ZENN_ARTICLES_API = "https://zenn.dev/api/articles"  # ?order=latest&page=1
+ZENN_BASE_URL = os.getenv("ZENN_BASE_URL", "https://zenn.dev").rstrip("/")  # スタブサーバー差し替え用
+ZENN_ARTICLES_API = f"{ZENN_BASE_URL}/api/articles"  # ?order=latest&page=1
+QIITA_BASE_URL = os.getenv("QIITA_BASE_URL", "https://qiita.com").rstrip("/")
+QIITA_ITEMS_API = f"{QIITA_BASE_URL}/api/v2/items"   # ?page=1&per_page=100（新しい順）
+QIITA_TOKEN = os.getenv("QIITA_TOKEN")                # あれば利用制限が 60 -> 1000 リクエスト/時
+QIITA_PER_PAGE = 100
+QIITA_MAX_PAGES = 100                                  # API の page 上限
+QIITA_RATE_PER_SEC = (1000 if QIITA_TOKEN else 60) / 3600
+CRAWL_SOURCES = os.getenv("CRAWL_SOURCES", "zenn")    # aggregate / refresh_likes の既定の取得元（"zenn,qiita" など）
+SOURCE_QUEUE_SIZE = 4     # 取得元スレッド → 書き込みスレッドの受け渡しで溜めるページ数
+SOURCE_PUT_TIMEOUT = 0.5  # キューが詰まっている間、取得元スレッドが停止の合図を確かめる間隔（秒）
+SOURCE_STOP_TIMEOUT = 60  # 途中で止めたとき取得元スレッドの後片付け（実行中の HTTP の完了）を待つ上限（秒）
 
 RETENTION_DAYS = 31
 DAYS_BUCKETS = (1, 7, 30)
+HISTORY_DAILY_DAYS = 90        # metrics_history を日次のまま残す期間
+HISTORY_RETENTION_DAYS = 730   # それより古い分は週1点に間引き、この期間を過ぎたら削除
+TREND_WINDOW_DAYS = 7          # 順位変化・伸び率の比較対象（何日前のスナップショットと比べるか）
 MAX_PAGES = 100            # 新着をどの程度さかのぼるかの上限
 SLEEP_SEC = 0.25          # マナー
+CRAWL_WORKERS = 8         # 記事HTML取得の並列数
+RATE_PER_SEC = 4.0        # ホストあたりの平均リクエスト数/秒（トークンバケット）
+MAX_ARTICLE_BYTES = 2 * 1024 * 1024  # 記事HTMLの読み込み上限（これ以上は読まずに解析）
+STREAM_CHUNK_BYTES = 16 * 1024
+TAG_SETTLE_CHARS = 4096   # 最後のタグリンクからこの文字数だけ新しいタグが無ければタグ一覧は終わりとみなす
+STREAM_SCAN_OVERLAP = 512  # ArticleStreamParser が前回の末尾から読み直す文字数（チャンク境界をまたぐ要素を拾う）
 
 # ===========================
 # 抽出用 正規表現
@@ -38,6 +87,10 @@ TITLE_RE = re.compile(r"<h1[^>]*>(.*?)</h1>", re.S | re.I)
 TIME_RE  = re.compile(r'<time[^>]+datetime="([^"]+)"', re.I)
 LIKES_RE = re.compile(r'"liked_count"\s*:\s*(\d+)', re.I)
 TAG_LINK_RE = re.compile(r'href="/topics/([a-z0-9\-_]+)"', re.I)
+TAG_SLUG_RE = re.compile(r"[a-z0-9\-_]+")
+NEXT_DATA_MARKER = '<script id="__NEXT_DATA__"'
+H1_OPEN_RE = re.compile(r"<h1[^>]*>", re.I)   # TITLE_RE を開始タグと終了タグに分けたもの（ストリーム判定用）
+H1_CLOSE_RE = re.compile(r"</h1>", re.I)
 
 # ===========================
 # モデル
@@ -59,6 +112,16 @@ class ArticleRow:
     likes: int
     published_at: str   # ISO
 
+@dataclass
+class ArticleRecord:
+    """クロールで得た新着記事1件（ArticleWriter に渡す単位）"""
+    title: str
+    url: str
+    likes: int
+    published_at: str   # ISO
+    tags: List[str]     # 小文字の slug
+    source: str = "zenn"
+
 # ===========================
 # ユーティリティ
 # ===========================
@@ -77,15 +140,98 @@ def _parse_iso(s: str) -> Optional[datetime]:
 def _log(*s):
     print("[aggregator]", *s)
 
+# ===========================
+# レート制限（ホスト単位のトークンバケット）
+# ===========================
+class RateLimiter:
+    """
+    ホストごとに rate 個/秒でトークンを補充し、最大 burst 個まで貯める。
+    acquire(url) はトークンが取れるまでブロックする（スレッドセーフ）。
+    rate <= 0 の場合は制限なし。待った秒は telemetry に記録する。
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = float(rate)
+        self.burst = max(1, int(burst))
+        self._lock = threading.Lock()
+        self._buckets: Dict[str, List[float]] = {}  # host -> [tokens, last_refill]
+
+    def acquire(self, url: str) -> None:
+        if self.rate <= 0:
+            return
+        host = urlsplit(url).netloc
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                bucket = self._buckets.setdefault(host, [float(self.burst), now])
+                bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+                bucket[1] = now
+                if bucket[0] >= 1.0:
+                    bucket[0] -= 1.0
+                    break
+                wait = (1.0 - bucket[0]) / self.rate
+            time.sleep(wait)
+            waited += wait
+        RATE_WAIT_SECONDS.observe(waited)
+
+_NO_LIMIT = RateLimiter(0)
+
+# ===========================
+# 進捗（ジョブ実行時に別スレッドから参照される）
+# ===========================
+class RunProgress:
+    """
+    フェーズごとの経過時間とカウンタ（pages / articles_added など）を保持する。
+    enter(phase) で前のフェーズを締めて次に進む（締めたフェーズの秒は telemetry にも記録）。
+    snapshot() はスレッドセーフ。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.phase: Optional[str] = None
+        self._phase_started = 0.0
+        self.phases: Dict[str, float] = {}     # phase -> 経過秒
+        self.counters: Dict[str, int] = {}
+
+    def enter(self, phase: Optional[str]) -> None:
+        now = time.monotonic()
+        with self._lock:
+            closed, elapsed = self.phase, now - self._phase_started
+            if closed is not None:
+                self.phases[closed] = self.phases.get(closed, 0.0) + elapsed
+            self.phase = phase
+            self._phase_started = now
+        if closed is not None:
+            PHASE_SECONDS.observe(elapsed, phase=closed)
+
+    def add(self, key: str, n: int = 1) -> None:
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + n
+
+    def snapshot(self) -> Dict:
+        now = time.monotonic()
+        with self._lock:
+            phases = dict(self.phases)
+            if self.phase is not None:
+                phases[self.phase] = phases.get(self.phase, 0.0) + now - self._phase_started
+            return {
+                "phase": self.phase,
+                "phases_sec": {k: round(v, 3) for k, v in phases.items()},
+                "counters": dict(self.counters),
+            }
+
 # ===========================
 # DB スキーマ・初期化
 # ===========================
 SCHEMA_SQL = """
+PRAGMA auto_vacuum=INCREMENTAL;  -- 新規DBのみ有効（既存DBは maintenance.reclaim_space が初回に VACUUM で切り替える）
 PRAGMA journal_mode=WAL;
 
 CREATE TABLE IF NOT EXISTS tools (
   slug TEXT PRIMARY KEY,
-  name TEXT NOT NULL
+  name TEXT NOT NULL,
+  aliases TEXT NOT NULL DEFAULT ''   -- 検索用の別名（"|" 区切り。tools.csv の aliases 列と tag_aliases.csv の別名）
 );
 
 CREATE TABLE IF NOT EXISTS metrics (
@@ -101,44 +247,511 @@ CREATE TABLE IF NOT EXISTS metrics (
 
 CREATE TABLE IF NOT EXISTS articles (
   id INTEGER PRIMARY KEY AUTOINCREMENT,
-  slug TEXT NOT NULL,
   title TEXT NOT NULL,
   url TEXT NOT NULL UNIQUE,
   likes INTEGER NOT NULL,
   published_at TEXT NOT NULL,
+  source TEXT NOT NULL DEFAULT 'zenn'   -- 取得元（SOURCE_ADAPTERS のキー）
+);
+
+-- 記事×タグ。published_at / likes / source はタグ別集計をインデックスだけで済ませるための複製
+CREATE TABLE IF NOT EXISTS article_tags (
+  article_id INTEGER NOT NULL,
+  slug TEXT NOT NULL,
+  published_at TEXT NOT NULL,
+  likes INTEGER NOT NULL,
+  source TEXT NOT NULL DEFAULT 'zenn',
+  PRIMARY KEY (article_id, slug),
+  FOREIGN KEY (article_id) REFERENCES articles(id),
   FOREIGN KEY (slug) REFERENCES tools(slug)
+) WITHOUT ROWID;
+
+CREATE TRIGGER IF NOT EXISTS trg_articles_likes
+AFTER UPDATE OF likes ON articles
+BEGIN
+  UPDATE article_tags SET likes = NEW.likes WHERE article_id = NEW.id;
+END;
+
+CREATE TABLE IF NOT EXISTS crawl_state (
+  source TEXT PRIMARY KEY,
+  newest_published_at TEXT,
+  newest_url TEXT,
+  updated_at TEXT NOT NULL
+);
+
+-- metrics の取得元別の内訳（合計は metrics。記事の無い取得元の行は作らない）
+CREATE TABLE IF NOT EXISTS metrics_sources (
+  date TEXT NOT NULL,
+  days INTEGER NOT NULL,
+  slug TEXT NOT NULL,
+  source TEXT NOT NULL,
+  articles INTEGER NOT NULL,
+  likes_sum INTEGER NOT NULL,
+  PRIMARY KEY (date, days, slug, source)
+) WITHOUT ROWID;
+
+-- metrics を保存し直すたびに version を進める（読み出し側キャッシュの無効化用）
+CREATE TABLE IF NOT EXISTS snapshot_state (
+  id INTEGER PRIMARY KEY CHECK (id = 1),
+  version INTEGER NOT NULL,
+  date TEXT NOT NULL,
+  updated_at TEXT NOT NULL,
+  scoring TEXT            -- スコア式（ScoringConfig の JSON）
 );
 
-CREATE INDEX IF NOT EXISTS idx_metrics_days_date ON metrics(days, date);
+-- metrics スナップショットの長期保存（順位付き）。タグ別の推移は主キーの範囲スキャン1回で読める
+CREATE TABLE IF NOT EXISTS metrics_history (
+  slug TEXT NOT NULL,
+  days INTEGER NOT NULL,
+  date TEXT NOT NULL,
+  rank INTEGER NOT NULL,
+  articles INTEGER NOT NULL,
+  likes_sum INTEGER NOT NULL,
+  score REAL NOT NULL,
+  PRIMARY KEY (slug, days, date)
+) WITHOUT ROWID;
+
+-- ランキングの並び（score 降順・slug 昇順）そのままの索引。keyset ページングはここを seek するだけ
+DROP INDEX IF EXISTS idx_metrics_days_date;
+CREATE INDEX IF NOT EXISTS idx_metrics_rank ON metrics(days, date, score DESC, slug);
+CREATE INDEX IF NOT EXISTS idx_metrics_history_days_date ON metrics_history(days, date);
 CREATE INDEX IF NOT EXISTS idx_articles_pub ON articles(published_at);
-CREATE INDEX IF NOT EXISTS idx_articles_slug_pub ON articles(slug, published_at);
+-- (slug, published_at, likes) + 主キーの article_id でタグ別の COUNT/SUM/TopN を index-only に
+CREATE INDEX IF NOT EXISTS idx_article_tags_slug_pub_likes ON article_tags(slug, published_at, likes);
+CREATE INDEX IF NOT EXISTS idx_article_tags_pub ON article_tags(published_at);
 """
 
+# タグ検索用の全文索引（trigram なので slug / 表示名 / 別名の部分一致を索引で引ける）。tools とはトリガーで同期
+SEARCH_SCHEMA_SQL = """
+CREATE VIRTUAL TABLE IF NOT EXISTS tools_fts USING fts5(
+  slug, name, aliases, content='tools', tokenize='trigram'
+);
+
+CREATE TRIGGER IF NOT EXISTS trg_tools_fts_ins AFTER INSERT ON tools BEGIN
+  INSERT INTO tools_fts(rowid, slug, name, aliases) VALUES (NEW.rowid, NEW.slug, NEW.name, NEW.aliases);
+END;
+CREATE TRIGGER IF NOT EXISTS trg_tools_fts_del AFTER DELETE ON tools BEGIN
+  INSERT INTO tools_fts(tools_fts, rowid, slug, name, aliases) VALUES ('delete', OLD.rowid, OLD.slug, OLD.name, OLD.aliases);
+END;
+CREATE TRIGGER IF NOT EXISTS trg_tools_fts_upd AFTER UPDATE ON tools BEGIN
+  INSERT INTO tools_fts(tools_fts, rowid, slug, name, aliases) VALUES ('delete', OLD.rowid, OLD.slug, OLD.name, OLD.aliases);
+  INSERT INTO tools_fts(rowid, slug, name, aliases) VALUES (NEW.rowid, NEW.slug, NEW.name, NEW.aliases);
+END;
+"""
+
+# 旧スキーマ（articles.slug に最初のタグだけを保持）からの移行
+MIGRATE_ARTICLE_TAGS_SQL = """
+BEGIN;
+INSERT OR IGNORE INTO article_tags(article_id, slug, published_at, likes)
+  SELECT id, slug, published_at, likes FROM articles;
+CREATE TABLE articles_new (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  title TEXT NOT NULL,
+  url TEXT NOT NULL UNIQUE,
+  likes INTEGER NOT NULL,
+  published_at TEXT NOT NULL
+);
+INSERT INTO articles_new(id, title, url, likes, published_at)
+  SELECT id, title, url, likes, published_at FROM articles;
+DROP TABLE articles;
+ALTER TABLE articles_new RENAME TO articles;
+COMMIT;
+"""
+
+def _migrate_article_tags(conn: sqlite3.Connection) -> bool:
+    cols = [r[1] for r in conn.execute("PRAGMA table_info(articles)")]
+    if "slug" not in cols:
+        return False
+    conn.executescript(MIGRATE_ARTICLE_TAGS_SQL)
+    _log("[migrate] articles.slug -> article_tags")
+    return True
+
+# metrics の指定日のスナップショットを順位付きで metrics_history に複製（articles テーブルは読まない）。
+# 記事の無いタグ（articles = 0）の行は長期保持しても意味がないので複製せず、順位も記事のあるタグの中で付ける
+HISTORY_SNAPSHOT_SQL = """
+INSERT OR REPLACE INTO metrics_history(slug, days, date, rank, articles, likes_sum, score)
+SELECT slug, days, date,
+       ROW_NUMBER() OVER (PARTITION BY date, days ORDER BY score DESC, slug),
+       articles, likes_sum, score
+FROM metrics
+WHERE date BETWEEN ? AND ? AND articles > 0
+"""
+
+def _rerank_history(conn: sqlite3.Connection, dates: List[str]):
+    """metrics_history の指定日の順位を score 順に振り直す（変わった行だけ書く）"""
+    conn.execute(
+        "UPDATE metrics_history SET rank = r.rnk FROM ("
+        "  SELECT slug, days, date, ROW_NUMBER() OVER (PARTITION BY date, days ORDER BY score DESC, slug) AS rnk"
+        "  FROM metrics_history WHERE days IN (SELECT value FROM json_each(:days))"
+        "  AND date IN (SELECT value FROM json_each(:dates))"
+        ") AS r WHERE metrics_history.slug = r.slug AND metrics_history.days = r.days "
+        "AND metrics_history.date = r.date AND metrics_history.rank <> r.rnk",
+        {"days": json.dumps(DAYS_BUCKETS), "dates": json.dumps(dates)},
+    )
+
+def _backfill_history(conn: sqlite3.Connection) -> bool:
+    """metrics_history が空なら、残っている metrics の全スナップショットから作る"""
+    if conn.execute("SELECT 1 FROM metrics_history LIMIT 1").fetchone():
+        return False
+    if not conn.execute("SELECT 1 FROM metrics LIMIT 1").fetchone():
+        return False
+    conn.execute(HISTORY_SNAPSHOT_SQL, ("", "9999-12-31"))
+    _log("[migrate] metrics -> metrics_history")
+    return True
+
+def _drop_dead_history(conn: sqlite3.Connection) -> bool:
+    """
+    以前の版が metrics_history に複製していた articles = 0 の行を消し、その日の順位を振り直す。
+    各バケットの最新日に 0 の行があるときだけ動く（今の版は書かないので、以後は索引を数回引くだけ）。
+    """
+    if not any(conn.execute(
+        "SELECT 1 FROM metrics_history WHERE days=? AND articles = 0 "
+        "AND date = (SELECT MAX(date) FROM metrics_history WHERE days=?) LIMIT 1", (d, d)
+    ).fetchone() for d in DAYS_BUCKETS):
+        return False
+    dates = [r[0] for r in conn.execute("SELECT DISTINCT date FROM metrics_history WHERE articles = 0")]
+    n = conn.execute("DELETE FROM metrics_history WHERE articles = 0").rowcount
+    _rerank_history(conn, dates)
+    _log(f"[migrate] metrics_history: dropped {n} rows without articles ({len(dates)} dates re-ranked)")
+    return True
+
+def _migrate_snapshot_scoring(conn: sqlite3.Connection) -> bool:
+    cols = [r[1] for r in conn.execute("PRAGMA table_info(snapshot_state)")]
+    if "scoring" in cols:
+        return False
+    conn.execute("ALTER TABLE snapshot_state ADD COLUMN scoring TEXT")
+    return True
+
+def _migrate_tool_aliases(conn: sqlite3.Connection) -> bool:
+    cols = [r[1] for r in conn.execute("PRAGMA table_info(tools)")]
+    if "aliases" in cols:
+        return False
+    conn.execute("ALTER TABLE tools ADD COLUMN aliases TEXT NOT NULL DEFAULT ''")
+    return True
+
+def _migrate_article_source(conn: sqlite3.Connection) -> bool:
+    """articles / article_tags に source を足し（既存行は zenn）、取得元別のインデックスを作る"""
+    migrated = False
+    for table in ("articles", "article_tags"):
+        cols = [r[1] for r in conn.execute(f"PRAGMA table_info({table})")]
+        if "source" not in cols:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN source TEXT NOT NULL DEFAULT 'zenn'")
+            migrated = True
+    # 取得元ごとの watermark と、取得元 × タグの内訳を index-only で
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_articles_source_pub ON articles(source, published_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_article_tags_source "
+                 "ON article_tags(source, slug, published_at, likes)")
+    return migrated
+
+def _init_search(conn: sqlite3.Connection) -> bool:
+    """
+    表示名の前方一致用インデックスと tools_fts を作り、新規作成時は既存の tools から索引を組む。
+    FTS5（trigram）が使えない SQLite では作らない（query_search は LIKE で探す）。
+    """
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_tools_name_nocase ON tools(name COLLATE NOCASE)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_tools_aliases ON tools(slug) WHERE aliases <> ''")
+    created = conn.execute("SELECT 1 FROM sqlite_master WHERE name='tools_fts'").fetchone() is None
+    try:
+        conn.executescript(SEARCH_SCHEMA_SQL)
+    except sqlite3.OperationalError as e:
+        _log(f"[search] FTS5 trigram unavailable ({e}) -> LIKE fallback")
+        return False
+    if created:
+        conn.execute("INSERT INTO tools_fts(tools_fts) VALUES ('rebuild')")
+    return True
+
 def init_db(db_path: str = DB_PATH):
     conn = sqlite3.connect(db_path)
     try:
         conn.executescript(SCHEMA_SQL)
+        if _migrate_article_tags(conn):
+            # 作り直した articles のインデックス・トリガーを再作成
+            conn.executescript(SCHEMA_SQL)
+        _migrate_snapshot_scoring(conn)
+        _migrate_tool_aliases(conn)
+        _migrate_article_source(conn)
+        _init_search(conn)
+        _backfill_history(conn)
+        _drop_dead_history(conn)
         conn.commit()
     finally:
         conn.close()
 
 # ===========================
-# 古いデータの削除（保持31日）
+# クロール状態（前回どこまで取り込んだか）
+# ===========================
+CRAWL_SOURCE = "zenn"
+
+def _load_known_urls(conn: sqlite3.Connection, source: Optional[str] = None) -> Dict[str, str]:
+    """DB にある記事（source 指定時はその取得元だけ）の url -> published_at"""
+    if source is None:
+        return {r[0]: r[1] for r in conn.execute("SELECT url, published_at FROM articles")}
+    return {r[0]: r[1] for r in conn.execute("SELECT url, published_at FROM articles WHERE source=?", (source,))}
+
+def _load_watermark(conn: sqlite3.Connection, source: str = CRAWL_SOURCE) -> Optional[datetime]:
+    row = conn.execute(
+        "SELECT newest_published_at FROM crawl_state WHERE source=?", (source,)
+    ).fetchone()
+    return _parse_iso(row[0]) if row and row[0] else None
+
+def _save_watermark(conn: sqlite3.Connection, source: str = CRAWL_SOURCE):
+    """
+    DB 内のその取得元の最新記事を high-water mark として記録する。
+    前回の watermark から最新まで取りこぼしなく走査できた回だけ呼ぶこと。
+    """
+    row = conn.execute(
+        "SELECT published_at, url FROM articles WHERE source=? ORDER BY published_at DESC LIMIT 1",
+        (source,),
+    ).fetchone()
+    if not row:
+        return
+    conn.execute(
+        "INSERT INTO crawl_state(source, newest_published_at, newest_url, updated_at) "
+        "VALUES (?, ?, ?, ?) "
+        "ON CONFLICT(source) DO UPDATE SET newest_published_at=excluded.newest_published_at, "
+        "newest_url=excluded.newest_url, updated_at=excluded.updated_at",
+        (source, row[0], row[1], _now_jst().isoformat(timespec="seconds")),
+    )
+    _log(f"[watermark] {source} -> {row[0]} {row[1]}")
+
+# ===========================
+# 古いデータの削除（保持31日）と DB の保守
 # ===========================
-def _prune_old(conn: sqlite3.Connection):
-    cutoff_dt = _now_jst() - timedelta(days=RETENTION_DAYS)
-    cutoff_iso = cutoff_dt.isoformat(timespec="seconds")
-    cutoff_date = cutoff_dt.strftime("%Y-%m-%d")
+# 子（article_tags）から先に消す。article_tags は同じ記事の行が同じ published_at を持つので記事単位で消す。metrics_history は HISTORY_DAILY_DAYS より古い分を週ごとに最終日の1点だけ残し、
+# HISTORY_RETENTION_DAYS を過ぎた分は削除する（days を付けて idx_metrics_history_days_date で引く）
+_HISTORY_DAYS_SQL = f"days IN ({', '.join(map(str, DAYS_BUCKETS))})"
+PRUNE_RULES = (
+    PruneRule("article_tags", "article_id", "published_at < :cutoff_iso"),
+    PruneRule("articles", "rowid", "published_at < :cutoff_iso"),
+    PruneRule("metrics", "rowid", "date < :cutoff_date"),
+    PruneRule("metrics_sources", "date, days, slug, source", "date < :cutoff_date"),
+    PruneRule("metrics_history", "slug, days, date", f"{_HISTORY_DAYS_SQL} AND date < :retention_cut"),
+    PruneRule("metrics_history", "slug, days, date",
+              f"{_HISTORY_DAYS_SQL} AND date < :daily_cut AND date NOT IN ("
+              "SELECT MAX(date) FROM metrics_history WHERE date < :daily_cut GROUP BY strftime('%Y-%W', date))"),
+)
+
+def _prune_old(conn: sqlite3.Connection) -> Dict[str, int]:
+    """
+    保持期間外の行を PRUNE_BATCH_ROWS 行ずつ消し、テーブルごとの削除行数を返す。
+    1バッチごとにコミットするので、取り込みのトランザクションをコミットしてから呼ぶこと。
+    """
+    now = _now_jst()
+    cutoff_dt = now - timedelta(days=RETENTION_DAYS)
+    params = {
+        "cutoff_iso": cutoff_dt.isoformat(timespec="seconds"),
+        "cutoff_date": _date_str(cutoff_dt),
+        "daily_cut": _date_str(now - timedelta(days=HISTORY_DAILY_DAYS)),
+        "retention_cut": _date_str(now - timedelta(days=HISTORY_RETENTION_DAYS)),
+    }
+    pruned = prune(conn, PRUNE_RULES, params)
+    _log(f"[prune] articles< {params['cutoff_iso']}, metrics< {params['cutoff_date']}: "
+         + (" ".join(f"{t}={n}" for t, n in pruned.items()) or "nothing"))
+    return pruned
+
+def _maintain(conn: sqlite3.Connection, db_path: str, cache: Optional[ResponseCache] = None) -> Dict:
+    """
+    取り込みをコミットした後の保守: 保持期間外の分割削除 → 空き領域の回収（空きページが閾値を超えたときだけ）
+    → WAL のチェックポイント → テーブル・インデックスのサイズ報告（ログには大きい順に出す）。
+    cache があれば RETENTION_DAYS の間取得・検証していない URL を HTTP キャッシュからも消す。
+    """
+    pruned = _prune_old(conn)
+    vacuum = reclaim_space(conn)
+    if vacuum["mode"]:
+        _log(f"[vacuum] {vacuum['mode']}: pages {vacuum['page_count']} -> {vacuum['page_count_after']} "
+             f"(free {vacuum['freelist_count']} -> {vacuum['freelist_count_after']})")
+    wal = checkpoint(conn)
+    size = size_report(conn, db_path)
+    for line in format_size_report(size):
+        _log(f"[db] {line}")
+    out = {"pruned": pruned, "vacuum": vacuum, "checkpoint": wal, "size": size}
+    if cache is not None:
+        out["http_cache"] = cache.prune(RETENTION_DAYS * 86400)
+        if out["http_cache"]["deleted"]:
+            _log(f"[http_cache] pruned {out['http_cache']['deleted']} entries older than {RETENTION_DAYS}d")
+    return out
+
+# ===========================
+# タグの正規化（別名 -> 正規 slug）
+# ===========================
+@dataclass(frozen=True)
+class TagCanonicalizer:
+    """
+    タグの別名 -> 正規 slug の表（golang -> go など）。実行1回につき1回だけ作り、
+    取り込み時は lower().strip() したタグで辞書を1回引くだけ。表に無いタグはそのまま。
+    """
+    mapping: Dict[str, str]
+
+    def canonical(self, slug: str) -> str:
+        return self.mapping.get(slug, slug)
+
+    def apply(self, tags: Iterable) -> List[str]:
+        """タグ列を正規 slug にし、重複（go と golang の両方が付いた記事など）を順序を保って除く"""
+        get = self.mapping.get
+        out: Dict[str, None] = {}
+        for t in tags:
+            slug = str(t).lower().strip()
+            if slug:
+                out.setdefault(get(slug, slug), None)
+        return list(out)
+
+    def search_aliases(self) -> Dict[str, List[str]]:
+        """正規 slug -> 別名の一覧（タグ検索で別名からも引けるようにする）"""
+        out: Dict[str, List[str]] = {}
+        for alias, slug in self.mapping.items():
+            out.setdefault(slug, []).append(alias)
+        return out
+
+NO_TAG_ALIASES = TagCanonicalizer({})
+
+def load_tag_aliases(path: str = TAG_ALIASES_CSV) -> TagCanonicalizer:
+    """
+    任意: slug,aliases の CSV（aliases は "|" 区切り）。別名 -> 正規 slug の表を作る。
+    - 別名が別の行の正規 slug になっていれば、最後の正規 slug までたどる（循環している別名は捨てる）
+    - 同じ別名が複数の行にあれば先の行を使う
+    """
+    if not os.path.exists(path):
+        _log(f"[tag_aliases] WARNING: {path} not found -> tags are not canonicalized")
+        return NO_TAG_ALIASES
+    listed: Dict[str, str] = {}
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            slug = (row.get("slug") or "").strip().lower()
+            if not slug:
+                continue
+            for alias in (row.get("aliases") or "").split("|"):
+                alias = alias.strip().lower()
+                if not alias or alias == slug:
+                    continue
+                if listed.setdefault(alias, slug) != slug:
+                    _log(f"[tag_aliases] {alias}: {listed[alias]} / {slug} -> {listed[alias]}")
+
+    mapping: Dict[str, str] = {}
+    for alias, slug in listed.items():
+        seen = {alias}
+        while slug in listed and slug not in seen:
+            seen.add(slug)
+            slug = listed[slug]
+        if slug in seen:
+            _log(f"[tag_aliases] {alias}: cycle -> ignored")
+            continue
+        mapping[alias] = slug
+    return TagCanonicalizer(mapping)
+
+def _retag(conn: sqlite3.Connection, canon: TagCanonicalizer) -> Dict[str, int]:
+    """
+    既存データのタグを canon で付け替え、移した行数を返す。tools に別名の行が残っているときだけ動くので、
+    別名を足した後の最初の1回だけ仕事をし、以後は tools の主キーを引くだけで終わる。
+    - article_tags: 別名の行を正規 slug に付け替える（両方付いていた記事は1行にまとめる）
+    - metrics / metrics_sources / metrics_history: 別名の行を正規 slug の行に足し込んで消す。
+      記事数・いいね合計・score の足し算なので、両方付いていた記事は二重に数え、score も
+      likes_sum / decay 以外の式では近似になる（今日の分は続く再計算で正確な値に置き換わる）
+    - metrics_history は足し込んだ日の順位を振り直す
+    - tools: 別名の行を消す（検索索引はトリガーで追従）
+    """
+    if not canon.mapping:
+        return {}
+    aliases = [r[0] for r in conn.execute(
+        "SELECT slug FROM tools WHERE slug IN (SELECT value FROM json_each(?))",
+        (json.dumps(sorted(canon.mapping)),),
+    )]
+    if not aliases:
+        return {}
 
-    # 記事（保持期間外）
-    conn.execute("DELETE FROM articles WHERE published_at < ?", (cutoff_iso,))
-    # metrics（古いスナップショット）
-    conn.execute("DELETE FROM metrics WHERE date < ?", (cutoff_date,))
-    _log(f"[prune] articles< {cutoff_iso}, metrics< {cutoff_date}")
+    with SQL_SECONDS.time(op="retag"):
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS retag_map(alias TEXT PRIMARY KEY, canonical TEXT NOT NULL)")
+        conn.execute("DELETE FROM temp.retag_map")
+        conn.executemany("INSERT INTO temp.retag_map(alias, canonical) VALUES (?, ?)",
+                         [(a, canon.canonical(a)) for a in aliases])
+        dates = [r[0] for r in conn.execute(
+            "SELECT DISTINCT h.date FROM temp.retag_map m JOIN metrics_history h ON h.slug = m.alias"
+        )]
+
+        counts: Dict[str, int] = {"aliases": len(aliases)}
+        conn.execute("INSERT OR IGNORE INTO tools(slug, name) SELECT DISTINCT canonical, canonical FROM temp.retag_map")
+        counts["article_tags"] = conn.execute(
+            "INSERT OR IGNORE INTO article_tags(article_id, slug, published_at, likes, source) "
+            "SELECT at.article_id, m.canonical, at.published_at, at.likes, at.source "
+            "FROM temp.retag_map m JOIN article_tags at ON at.slug = m.alias"
+        ).rowcount
+        conn.execute("DELETE FROM article_tags WHERE slug IN (SELECT alias FROM temp.retag_map)")
+
+        # ON CONFLICT の前の WHERE true は INSERT ... SELECT の構文の曖昧さを避けるためのもの
+        counts["metrics"] = conn.execute(
+            "INSERT INTO metrics(date, days, slug, articles, likes_sum, score) "
+            "SELECT x.date, x.days, m.canonical, SUM(x.articles), SUM(x.likes_sum), SUM(x.score) "
+            "FROM metrics x JOIN temp.retag_map m ON m.alias = x.slug WHERE true "
+            "GROUP BY x.date, x.days, m.canonical "
+            "ON CONFLICT(date, days, slug) DO UPDATE SET articles = articles + excluded.articles, "
+            "likes_sum = likes_sum + excluded.likes_sum, score = score + excluded.score"
+        ).rowcount
+        conn.execute(
+            "INSERT INTO metrics_sources(date, days, slug, source, articles, likes_sum) "
+            "SELECT x.date, x.days, m.canonical, x.source, SUM(x.articles), SUM(x.likes_sum) "
+            "FROM metrics_sources x JOIN temp.retag_map m ON m.alias = x.slug WHERE true "
+            "GROUP BY x.date, x.days, m.canonical, x.source "
+            "ON CONFLICT(date, days, slug, source) DO UPDATE SET articles = articles + excluded.articles, "
+            "likes_sum = likes_sum + excluded.likes_sum"
+        )
+        counts["metrics_history"] = conn.execute(
+            "INSERT INTO metrics_history(slug, days, date, rank, articles, likes_sum, score) "
+            "SELECT m.canonical, x.days, x.date, 0, SUM(x.articles), SUM(x.likes_sum), SUM(x.score) "
+            "FROM temp.retag_map m JOIN metrics_history x ON x.slug = m.alias WHERE true "
+            "GROUP BY m.canonical, x.days, x.date "
+            "ON CONFLICT(slug, days, date) DO UPDATE SET articles = articles + excluded.articles, "
+            "likes_sum = likes_sum + excluded.likes_sum, score = score + excluded.score"
+        ).rowcount
+        for table in ("metrics", "metrics_sources", "metrics_history", "tools"):
+            conn.execute(f"DELETE FROM {table} WHERE slug IN (SELECT alias FROM temp.retag_map)")
+        _rerank_history(conn, dates)
+        conn.execute("DELETE FROM temp.retag_map")
+
+    _log(f"[retag] {', '.join(f'{a}->{canon.canonical(a)}' for a in aliases)}: "
+         + " ".join(f"{k}={v}" for k, v in counts.items()))
+    return counts
+
+# TAG_SLUG_RE（[a-z0-9\-_]+）に合わない slug。GLOB の [...] 末尾の "-" は文字そのもの
+INVALID_TAG_GLOB = "slug = '' OR slug GLOB '*[^a-z0-9_-]*'"
+
+def _drop_invalid_tags(conn: sqlite3.Connection) -> int:
+    """
+    slug として使えないタグ（Qiita のタグを TAG_SLUG_RE で絞る前に入った日本語のタグなど）を
+    article_tags / metrics 系 / tools から消し、消したタグ数を返す。_retag の後に呼ぶ（別名で救えるものは先に移す）。
+    """
+    slugs = [r[0] for r in conn.execute(f"SELECT slug FROM tools WHERE {INVALID_TAG_GLOB}")]
+    if not slugs:
+        return 0
+    with SQL_SECONDS.time(op="retag"):
+        for table in ("article_tags", "metrics", "metrics_sources", "metrics_history", "tools"):
+            conn.execute(f"DELETE FROM {table} WHERE slug IN (SELECT value FROM json_each(?))", (json.dumps(slugs),))
+    _log(f"[retag] dropped {len(slugs)} invalid tags: {', '.join(slugs[:10])}{' ...' if len(slugs) > 10 else ''}")
+    return len(slugs)
 
 # ===========================
 # tools.csv 読み込み（表示名マッピング）
 # ===========================
+def load_tool_aliases(path: str, canon: TagCanonicalizer = NO_TAG_ALIASES) -> Dict[str, str]:
+    """
+    任意: tools.csv の aliases 列（"|" 区切り）。slug -> 正規化した "別名1|別名2"
+    canon を渡すと、タグの別名（tag_aliases.csv）も正規 slug の検索用の別名に足す。
+    """
+    listed: Dict[str, List[str]] = {}
+    if os.path.exists(path):
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                slug = (row.get("slug") or "").strip().lower()
+                if slug:
+                    listed.setdefault(slug, []).extend((row.get("aliases") or "").split("|"))
+    for slug, aliases in canon.search_aliases().items():
+        listed.setdefault(slug, []).extend(aliases)
+
+    mapping = {}
+    for slug, aliases in listed.items():
+        aliases = [a for a in dict.fromkeys(normalize_query(a) for a in aliases) if a]
+        if aliases:
+            mapping[slug] = "|".join(aliases)
+    return mapping
+
 def load_tools_csv(path: str) -> Dict[str, str]:
     """
     任意: name,slug のCSV（存在すれば表示名として使用。無ければ slug をそのまま name に）
@@ -155,29 +768,29 @@ def load_tools_csv(path: str) -> Dict[str, str]:
                 mapping[slug] = name
     return mapping
 
-def _upsert_tool(conn: sqlite3.Connection, slug: str, name: Optional[str]):
-    display = name or slug
-    conn.execute(
-        "INSERT INTO tools(slug, name) VALUES(?, ?) "
-        "ON CONFLICT(slug) DO UPDATE SET name=excluded.name",
-        (slug, display),
-    )
-
 # ===========================
 # Zenn 新着一覧（API）
 # ===========================
-def _fetch_latest_list_api(page: int) -> Optional[dict]:
+def _fetch_latest_list_api(
+    page: int,
+    limiter: RateLimiter = _NO_LIMIT,
+    cache: Optional[ResponseCache] = None,
+) -> Optional[dict]:
     try:
-        r = requests.get(
+        limiter.acquire(ZENN_ARTICLES_API)
+        status, data = fetch_cached(
             ZENN_ARTICLES_API,
+            json.loads,
+            cache=cache,
             params={"order": "latest", "page": page},
             headers={"User-Agent": USER_AGENT, "Accept": "application/json"},
             timeout=15,
+            kind="list",
         )
-        if r.status_code != 200:
-            _log(f"[API] page={page} -> HTTP {r.status_code}")
+        if data is None:
+            _log(f"[API] page={page} -> HTTP {status}")
             return None
-        return r.json()
+        return data
     except Exception as e:
         _log(f"[API] EXC page={page} -> {e}")
         return None
@@ -185,70 +798,723 @@ def _fetch_latest_list_api(page: int) -> Optional[dict]:
 # ===========================
 # 記事詳細（HTMLからタグ・いいね等を抽出）
 # ===========================
-def _fetch_article_detail(url: str) -> dict:
+def _to_jst_iso(s: str) -> Optional[str]:
+    try:
+        return datetime.fromisoformat(s.replace("Z", "+00:00")).astimezone(JST).isoformat()
+    except Exception:
+        return None
+
+def _extract_next_data(html: str) -> Optional[dict]:
+    """<script id="__NEXT_DATA__" type="application/json"> の中身を str.find で切り出して JSON として読む"""
+    i = html.find(NEXT_DATA_MARKER)
+    if i < 0:
+        return None
+    start = html.find(">", i) + 1
+    end = html.find("</script>", start)
+    if start <= 0 or end < 0:
+        return None
+    try:
+        data = json.loads(html[start:end])
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+def _parse_next_data(html: str) -> Optional[dict]:
+    """
+    __NEXT_DATA__ の props.pageProps.article から title / published_at / liked_count / topics を取る。
+    キーは camelCase（publishedAt / likedCount）と snake_case の両方を受け付ける。
+    title か公開日時が取れなければ None（正規表現にフォールバック）。
+    """
+    data = _extract_next_data(html)
+    if data is None:
+        return None
+    article = ((data.get("props") or {}).get("pageProps") or {}).get("article")
+    if not isinstance(article, dict):
+        return None
+
+    title = str(article.get("title") or "").strip()
+    pub = article.get("publishedAt") or article.get("published_at")
+    published_at_iso = _to_jst_iso(pub) if isinstance(pub, str) else None
+    if not title or not published_at_iso:
+        return None
+
+    likes = article.get("likedCount", article.get("liked_count"))
+    try:
+        likes = int(likes or 0)
+    except (TypeError, ValueError):
+        likes = 0
+
+    tags = []
+    for t in article.get("topics") or []:
+        name = (t.get("name") or t.get("id")) if isinstance(t, dict) else t
+        slug = str(name or "").lower().strip()
+        if TAG_SLUG_RE.fullmatch(slug) and slug not in tags:
+            tags.append(slug)
+
+    return {
+        "title": title,
+        "published_at": published_at_iso,
+        "likes": likes,
+        "tags": tags,
+    }
+
+def _parse_article_html(html: str) -> dict:
+    """
+    記事HTMLから title / published_at / liked_count / tags を抽出。
+    __NEXT_DATA__ の JSON を1回読むのが基本で、取れない場合は正規表現で拾う。
+    """
+    detail = _parse_next_data(html)
+    if detail is not None:
+        return detail
+    return _parse_article_html_regex(html)
+
+def _parse_article_html_regex(html: str) -> dict:
+    """正規表現によるフォールバック抽出"""
+    # タイトル
+    title = ""
+    mt = TITLE_RE.search(html)
+    if mt:
+        title = html_lib.unescape(re.sub(r"<.*?>", "", mt.group(1))).strip()
+
+    # 公開日時
+    published_at_iso = None
+    mt = TIME_RE.search(html)
+    if mt:
+        published_at_iso = _to_jst_iso(mt.group(1))
+
+    # いいね
+    likes = 0
+    ml = LIKES_RE.search(html)
+    if ml:
+        try:
+            likes = int(ml.group(1))
+        except Exception:
+            likes = 0
+
+    # タグ
+    tags = list({m.group(1).lower() for m in TAG_LINK_RE.finditer(html)})
+
+    return {
+        "title": title,
+        "published_at": published_at_iso,
+        "likes": likes,
+        "tags": tags,
+    }
+
+class ArticleStreamParser:
+    """
+    記事HTMLを先頭から少しずつ受け取り、必要な項目が揃ったかを判定する（fetch_cached_stream 用）。
+    揃ったとみなす条件:
+    - __NEXT_DATA__ の <script> が閉じるところまで読めた、または
+    - <h1> タイトル・<time datetime> ・タグリンクが見つかり、最後のタグリンクから
+      TAG_SETTLE_CHARS 文字読んでも新しいタグリンクが出てこない
+    後者で打ち切った場合 likes は取れない（aggregate 側で一覧APIの liked_count を使う）。
+    各パターンは前回までの位置から、新しく届いた部分（+ 末尾 STREAM_SCAN_OVERLAP 文字）だけを走査する。
+    判定は控えめで良い（境界をまたぐ長い要素を見逃しても読み続けるだけ）。抽出は result() で全文に対して1回行う。
+    """
+
+    def __init__(self):
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self._chunks: List[str] = []
+        self._size = 0          # これまでに受け取った文字数
+        self._tail = ""         # 直前の末尾 STREAM_SCAN_OVERLAP 文字
+        self._title = False
+        self._h1_end = -1       # <h1 ...> の終わりの位置（この後ろで </h1> を探す）
+        self._time = False
+        self._tags: set[str] = set()
+        self._last_tag_end = 0
+        self._next_data_at = -1
+
+    def feed(self, chunk: bytes) -> bool:
+        new = self._decoder.decode(chunk)
+        if not new:
+            return False
+        self._chunks.append(new)
+        window = self._tail + new
+        base = self._size - len(self._tail)   # window[0] の位置
+        self._size += len(new)
+        self._tail = window[-STREAM_SCAN_OVERLAP:]
+        return self._complete(window, base)
+
+    def _complete(self, window: str, base: int) -> bool:
+        if self._next_data_at < 0:
+            i = window.find(NEXT_DATA_MARKER)
+            if i >= 0:
+                self._next_data_at = base + i
+        if self._next_data_at >= 0:
+            return window.find("</script>", max(0, self._next_data_at - base)) >= 0
+
+        if not self._title:
+            if self._h1_end < 0:
+                m = H1_OPEN_RE.search(window)
+                if m:
+                    self._h1_end = base + m.end()
+            if self._h1_end >= 0:
+                self._title = H1_CLOSE_RE.search(window, max(0, self._h1_end - base)) is not None
+        if not self._time:
+            self._time = TIME_RE.search(window) is not None
+        for m in TAG_LINK_RE.finditer(window, max(0, self._last_tag_end - base)):
+            self._tags.add(m.group(1).lower())
+            self._last_tag_end = base + m.end()
+
+        return (self._title and self._time and bool(self._tags)
+                and self._size - self._last_tag_end >= TAG_SETTLE_CHARS)
+
+    def result(self) -> dict:
+        self._chunks.append(self._decoder.decode(b"", final=True))
+        return _parse_article_html("".join(self._chunks))
+
+def _fetch_article_detail(
+    url: str,
+    limiter: RateLimiter = _NO_LIMIT,
+    cache: Optional[ResponseCache] = None,
+    stream: bool = False,
+) -> dict:
     """
     記事ページから title / published_at / liked_count / tags を抽出。
     __NEXT_DATA__ が使えない場合に備え、HTMLの正規表現でフォールバック。
+    cache があれば条件付きリクエストを送り、304 なら前回の抽出結果をそのまま使う。
+    stream=True なら本文を分割して読み、ArticleStreamParser が揃ったと判定した時点
+    （または MAX_ARTICLE_BYTES）で読み込みをやめる。
     """
     try:
-        r = requests.get(url, headers={"User-Agent": USER_AGENT}, timeout=15)
-        if r.status_code != 200:
-            return {}
-        html = r.text
-
-        # タイトル
-        title = ""
-        mt = TITLE_RE.search(html)
-        if mt:
-            title = re.sub(r"<.*?>", "", mt.group(1)).strip()
-
-        # 公開日時
-        published_at_iso = None
-        mt = TIME_RE.search(html)
-        if mt:
-            try:
-                published_at_iso = datetime.fromisoformat(
-                    mt.group(1).replace("Z", "+00:00")
-                ).astimezone(JST).isoformat()
-            except Exception:
-                pass
-
-        # いいね
-        likes = 0
-        ml = LIKES_RE.search(html)
-        if ml:
-            try:
-                likes = int(ml.group(1))
-            except Exception:
-                likes = 0
-
-        # タグ
-        tags = list({m.group(1).lower() for m in TAG_LINK_RE.finditer(html)})
-
-        return {
-            "title": title,
-            "published_at": published_at_iso,
-            "likes": likes,
-            "tags": tags,
-        }
+        limiter.acquire(url)
+        if stream:
+            _, detail = fetch_cached_stream(
+                url,
+                ArticleStreamParser(),
+                cache=cache,
+                headers={"User-Agent": USER_AGENT},
+                timeout=15,
+                max_bytes=MAX_ARTICLE_BYTES,
+                chunk_size=STREAM_CHUNK_BYTES,
+                kind="detail",
+            )
+        else:
+            _, detail = fetch_cached(
+                url,
+                _parse_article_html,
+                cache=cache,
+                headers={"User-Agent": USER_AGENT},
+                timeout=15,
+                kind="detail",
+            )
+        return detail or {}
     except Exception:
         return {}
 
+# ===========================
+# 取得元アダプタ（一覧のページング・詳細の取得・流量・保持期間の打ち切り）
+# ===========================
+@dataclass
+class ListItem:
+    """一覧APIの1件を取得元によらない形にしたもの"""
+    url: str
+    title: str
+    likes: Optional[int]          # 一覧に無ければ None
+    published_at: Optional[str]   # ISO（一覧に無ければ None）
+    tags: List[str]
+
+class SourceAdapter(ABC):
+    """
+    記事の取得元1つ分の定義。aggregate / refresh_likes はこれだけを通して取得元に触る。
+    fetch_list / fetch_detail は抽象メソッドで、実装していない取得元はインスタンスを作る時点で TypeError になる。
+    - fetch_list(page): 新しい順の一覧 page ページ目（None は取得失敗、[] は一覧の末尾）
+    - fetch_detail(item): needs_detail の取得元だけ呼ぶ。title / published_at / likes / tags の dict
+    - cutoff(now): これより古い記事に達したら走査を打ち切る
+    - make_limiter(): rate_per_sec と取得元の利用制限（max_rate_per_sec）の小さい方で流量を絞る
+    """
+
+    name = ""
+    needs_detail = False                        # 一覧だけで公開日時・タグが揃わないなら True
+    max_pages = MAX_PAGES                       # 一覧をさかのぼれる上限
+    max_rate_per_sec: Optional[float] = None    # 取得元の利用制限（None なら rate_per_sec のまま）
+    burst: Optional[int] = None                 # トークンバケットの容量（None なら workers）
+
+    @abstractmethod
+    def fetch_list(self, page: int, limiter: RateLimiter, cache: Optional[ResponseCache]) -> Optional[List[ListItem]]:
+        ...
+
+    @abstractmethod
+    def fetch_detail(self, item: ListItem, limiter: RateLimiter, cache: Optional[ResponseCache],
+                     stream: bool = False) -> dict:
+        ...
+
+    def cutoff(self, now: datetime) -> datetime:
+        return now - timedelta(days=RETENTION_DAYS)
+
+    def make_limiter(self, rate_per_sec: float, workers: int) -> RateLimiter:
+        rate = rate_per_sec
+        if self.max_rate_per_sec is not None:
+            rate = self.max_rate_per_sec if rate <= 0 else min(rate, self.max_rate_per_sec)
+        return RateLimiter(rate, burst=self.burst or workers)
+
+class ZennAdapter(SourceAdapter):
+    """Zenn: 一覧APIには公開日時・タグが無い前提で、記事HTMLから補う"""
+
+    name = "zenn"
+    needs_detail = True
+
+    def fetch_list(self, page, limiter, cache):
+        data = _fetch_latest_list_api(page, limiter, cache)
+        if not data:
+            return None
+        items = []
+        for it in data.get("articles") or []:
+            path = it.get("path") or ""
+            if not path.startswith("/"):
+                continue
+            items.append(ListItem(
+                url=f"{ZENN_BASE_URL}{path}",
+                title=it.get("title") or "",
+                likes=int(it["liked_count"]) if it.get("liked_count") is not None else None,
+                published_at=it.get("published_at"),
+                tags=[t.get("id") for t in (it.get("topics") or []) if isinstance(t, dict) and t.get("id")],
+            ))
+        return items
+
+    def fetch_detail(self, item, limiter, cache, stream=False):
+        return _fetch_article_detail(item.url, limiter, cache, stream)
+
+class QiitaAdapter(SourceAdapter):
+    """Qiita: API v2 の一覧（/api/v2/items）に公開日時・タグ・いいねが揃っているので詳細は取らない"""
+
+    name = "qiita"
+    max_pages = QIITA_MAX_PAGES
+    max_rate_per_sec = QIITA_RATE_PER_SEC
+    burst = 1
+
+    def fetch_list(self, page, limiter, cache):
+        headers = {"User-Agent": USER_AGENT, "Accept": "application/json"}
+        if QIITA_TOKEN:
+            headers["Authorization"] = f"Bearer {QIITA_TOKEN}"
+        try:
+            limiter.acquire(QIITA_ITEMS_API)
+            status, data = fetch_cached(
+                QIITA_ITEMS_API,
+                json.loads,
+                cache=cache,
+                params={"page": page, "per_page": QIITA_PER_PAGE},
+                headers=headers,
+                timeout=15,
+                kind="qiita_list",
+            )
+        except Exception as e:
+            _log(f"[qiita] EXC page={page} -> {e}")
+            return None
+        if not isinstance(data, list):
+            _log(f"[qiita] page={page} -> HTTP {status}")
+            return None
+        return [ListItem(
+            url=it["url"],
+            title=it.get("title") or "",
+            likes=int(it["likes_count"]) if it.get("likes_count") is not None else None,
+            published_at=_to_jst_iso(it.get("created_at") or ""),
+            tags=[_qiita_tag(t["name"]) for t in (it.get("tags") or []) if isinstance(t, dict) and t.get("name")],
+        ) for it in data if isinstance(it, dict) and it.get("url")]
+
+    def fetch_detail(self, item, limiter, cache, stream=False):
+        return {}   # needs_detail = False なので呼ばれない（一覧の値だけで足りる）
+
+def _qiita_tag(name: str) -> str:
+    """
+    Qiita のタグ名（"Ruby on Rails" / "Ｐｙｔｈｏｎ" など）を NFKC + 小文字にし、空白を "-" にする。
+    日本語タグなど TAG_SLUG_RE に合わないものは、tag_aliases.csv で slug に寄せない限り _crawl_source で捨てる。
+    """
+    return re.sub(r"\s+", "-", unicodedata.normalize("NFKC", str(name)).strip().lower())
+
+SOURCE_ADAPTERS: Dict[str, SourceAdapter] = {a.name: a for a in (ZennAdapter(), QiitaAdapter())}
+
+def get_adapters(sources: Optional[Sequence[str]] = None) -> List[SourceAdapter]:
+    """"zenn,qiita" / ["zenn", "qiita"] から取得元アダプタの一覧を作る（未指定なら CRAWL_SOURCES）。不明な名前は ValueError"""
+    if sources is None:
+        sources = CRAWL_SOURCES
+    if isinstance(sources, str):
+        sources = sources.split(",")
+    names = list(dict.fromkeys(s.strip().lower() for s in sources if s.strip()))
+    unknown = [n for n in names if n not in SOURCE_ADAPTERS]
+    if unknown or not names:
+        raise ValueError(f"unknown source: {', '.join(unknown) or '(empty)'} "
+                         f"(choose from {', '.join(SOURCE_ADAPTERS)})")
+    return [SOURCE_ADAPTERS[n] for n in names]
+
+# ===========================
+# 取得元ごとのクロール（別スレッドで回し、書き込みは呼び出し元スレッドにまとめる）
+# ===========================
+@dataclass
+class CrawlPage:
+    """取得元1つの一覧1ページ分の成果（呼び出し元スレッドが ArticleWriter で書き込む）"""
+    page: int
+    records: List[ArticleRecord]
+    likes: List[Tuple[int, str]]   # 既存記事: (likes, url)
+    complete: bool = False         # watermark / 保持期間 / 一覧の末尾まで取りこぼしなく走査できた
+
+def _crawl_source(
+    adapter: SourceAdapter,
+    *,
+    known_urls: Dict[str, str],
+    watermark: Optional[datetime],
+    max_pages: int,
+    workers: int,
+    limiter: RateLimiter,
+    cache: Optional[ResponseCache],
+    stream_detail: bool = False,
+    canon: TagCanonicalizer = NO_TAG_ALIASES,
+) -> Iterator[CrawlPage]:
+    """
+    取得元1つの一覧を新しい順にページングし、1ページごとに CrawlPage を返すジェネレーター。
+    詳細（needs_detail の取得元だけ）は workers 本のスレッドで取得し、次ページの一覧も先読みする。
+    タグは canon で正規 slug にそろえ、TAG_SLUG_RE に合わないもの（日本語のタグなど）は捨てる。
+    DB には触らない（known_urls は読むだけ）。
+    """
+    retention_cut = adapter.cutoff(_now_jst())
+    seen_urls: set[str] = set()
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"crawl-{adapter.name}") as pool:
+        next_list = pool.submit(adapter.fetch_list, 1, limiter, cache) if max_pages >= 1 else None
+        try:
+            for page in range(1, max_pages + 1):
+                items = next_list.result()
+                next_list = None
+                if items is None:
+                    return
+                if not items:
+                    yield CrawlPage(page, [], [], complete=True)
+                    return
+
+                # 次ページの一覧を先読み（詳細の取得と並行）
+                if page < max_pages:
+                    next_list = pool.submit(adapter.fetch_list, page + 1, limiter, cache)
+
+                candidates: List[ListItem] = []
+                known_likes = []
+                page_older = watermark is not None
+                for it in items:
+                    # 公開日時は一覧の値 → DB の値の順に参照（無ければ watermark より新しい扱い）
+                    pub_dt = _parse_iso(it.published_at or known_urls.get(it.url) or "")
+                    if (pub_dt is None or watermark is None or pub_dt > watermark
+                            or (pub_dt == watermark and it.url not in known_urls)):
+                        page_older = False
+
+                    if it.url in seen_urls:
+                        continue
+                    seen_urls.add(it.url)
+                    if it.url in known_urls:
+                        if it.likes is not None:
+                            known_likes.append((it.likes, it.url))
+                        continue
+                    candidates.append(it)
+
+                if page_older:
+                    _log(f"[watermark] {adapter.name} page={page} older than {watermark.isoformat()} -> stop")
+                    yield CrawlPage(page, [], known_likes, complete=True)
+                    return
+
+                # 詳細を並列取得。結果は一覧の順に消費する
+                futures = [pool.submit(adapter.fetch_detail, it, limiter, cache, stream_detail)
+                           if adapter.needs_detail else None for it in candidates]
+
+                records: List[ArticleRecord] = []
+                reached_cutoff = False
+                for it, fut in zip(candidates, futures):
+                    if reached_cutoff:
+                        if fut is not None:
+                            fut.cancel()
+                        continue
+                    detail = fut.result() if fut is not None else {}
+
+                    # 公開日時（詳細を取る取得元は詳細の値だけを使う）。取れない記事はスキップ
+                    pub_iso = detail.get("published_at") if adapter.needs_detail else it.published_at
+                    pub_dt = _parse_iso(pub_iso or "")
+                    if not pub_dt:
+                        continue
+
+                    # 保持期間より古いものが出始めたら終了
+                    if pub_dt < retention_cut:
+                        _log(f"[cutoff] {adapter.name} page={page} pub={pub_dt.isoformat()} "
+                             f"< retention({RETENTION_DAYS}d) -> stop")
+                        reached_cutoff = True
+                        continue
+
+                    title = (detail.get("title") or it.title or "").strip()
+                    likes = int(detail.get("likes") or 0) or int(it.likes or 0)
+                    tags = detail.get("tags") or it.tags or []
+                    # 別名をそろえた上で、Zenn の topics と同じ文字種（TAG_SLUG_RE）のタグだけ残す
+                    slugs = [slug for slug in canon.apply(tags) if TAG_SLUG_RE.fullmatch(slug)]
+                    if not title or not slugs:
+                        continue
+                    records.append(ArticleRecord(title, it.url, likes, pub_dt.isoformat(), slugs, adapter.name))
+
+                yield CrawlPage(page, records, known_likes, complete=reached_cutoff)
+                if reached_cutoff or (not records and not known_likes):
+                    # 1件も処理できないページの先も無いと判断して終了
+                    return
+        finally:
+            if next_list is not None:
+                next_list.cancel()
+
+def _interleave(gens: Dict[str, Generator]) -> Iterator[Tuple[str, object]]:
+    """
+    取得元ごとのジェネレーターをそれぞれ別スレッドで回し、出てきた順に (取得元, 値) を返す。
+    キューは SOURCE_QUEUE_SIZE で頭打ち（書き込みが詰まったらクロール側が待つ）。
+    例外はその取得元だけ打ち切ってログに残す。
+    呼び出し側が途中でやめた（書き込みの例外など）ら、close() されたところで停止を合図し、各スレッドは
+    自分のジェネレーターを close して（クロールのスレッドプールを畳んで）終わる。その完了を待ってから戻る。
+    """
+    q: "queue.Queue[Tuple[str, object]]" = queue.Queue(maxsize=SOURCE_QUEUE_SIZE)
+    done = object()
+    stop = threading.Event()
+
+    def put(entry: Tuple[str, object]) -> bool:
+        """キューに入れる。入れる前に停止が合図されたら False"""
+        while not stop.is_set():
+            try:
+                q.put(entry, timeout=SOURCE_PUT_TIMEOUT)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def pump(name: str, gen: Generator) -> None:
+        try:
+            for item in gen:
+                if not put((name, item)):
+                    break
+        except Exception as e:
+            _log(f"[{name}] EXC {type(e).__name__}: {e}")
+        finally:
+            # 実行中のジェネレーターは他のスレッドから close できないので、回しているこのスレッドで閉じる
+            gen.close()
+            put((name, done))
+
+    threads = [threading.Thread(target=pump, args=(name, gen), name=f"source-{name}", daemon=True)
+               for name, gen in gens.items()]
+    for t in threads:
+        t.start()
+    try:
+        remaining = len(gens)
+        while remaining:
+            name, item = q.get()
+            if item is done:
+                remaining -= 1
+                continue
+            yield name, item
+    finally:
+        stop.set()
+        for t in threads:
+            t.join(SOURCE_STOP_TIMEOUT)
+            if t.is_alive():
+                _log(f"[{t.name}] still running after {SOURCE_STOP_TIMEOUT}s stop timeout")
+
 # ===========================
 # 期間集計（DB内データで再計算）
 # ===========================
-def _compute_metrics_for_slug(conn: sqlite3.Connection, slug: str, days: int) -> Metric:
-    since_iso = (_now_jst() - timedelta(days=days)).isoformat(timespec="seconds")
-    row = conn.execute(
-        "SELECT COUNT(*) AS c, COALESCE(SUM(likes),0) AS s "
-        "FROM articles WHERE slug=? AND published_at >= ?",
-        (slug, since_iso),
-    ).fetchone()
-    articles = int(row["c"])
-    likes_sum = int(row["s"])
-    score = likes_sum
-    return Metric(slug=slug, days=days, date=_date_str(_now_jst()),
-                  articles=articles, likes_sum=likes_sum, score=score)
+def _source_metrics_sql(buckets: Tuple[int, ...]) -> str:
+    """取得元 × タグごとに、全バケットの記事数・いいね合計を idx_article_tags_source の1回の走査で数える"""
+    cols = ", ".join(
+        f"SUM(published_at >= :since{d}), SUM(CASE WHEN published_at >= :since{d} THEN likes ELSE 0 END)"
+        for d in buckets
+    )
+    return (f"SELECT source, slug, {cols} FROM article_tags "
+            f"WHERE published_at >= :since{max(buckets)} GROUP BY source, slug")
+
+# articles に入っている取得元の一覧（idx_articles_source_pub を取得元の数だけ seek する）
+ARTICLE_SOURCES_SQL = """
+WITH RECURSIVE s(source) AS (
+  SELECT MIN(source) FROM articles
+  UNION ALL
+  SELECT (SELECT MIN(source) FROM articles WHERE source > s.source) FROM s WHERE s.source IS NOT NULL
+)
+SELECT source FROM s WHERE source IS NOT NULL
+"""
+
+def _recompute_source_metrics(conn: sqlite3.Connection, now: datetime, today: str) -> int:
+    """
+    metrics_sources（取得元別の内訳）を today の日付で保存し直し、書いた行数を返す。
+    取得元が1つだけなら内訳は metrics と同じなので、article_tags を読まずに metrics から写す。
+    """
+    conn.execute("DELETE FROM metrics_sources WHERE date=?", (today,))
+    sources = [r[0] for r in conn.execute(ARTICLE_SOURCES_SQL)]
+    if len(sources) <= 1:
+        cur = conn.execute(
+            "INSERT INTO metrics_sources(date, days, slug, source, articles, likes_sum) "
+            "SELECT date, days, slug, ?, articles, likes_sum FROM metrics WHERE date=? AND articles > 0",
+            (sources[0] if sources else CRAWL_SOURCE, today),
+        )
+        return cur.rowcount
+
+    params = {f"since{d}": (now - timedelta(days=d)).isoformat(timespec="seconds") for d in DAYS_BUCKETS}
+    rows = []
+    for r in conn.execute(_source_metrics_sql(DAYS_BUCKETS), params):
+        source, slug = r[0], r[1]
+        for i, d in enumerate(DAYS_BUCKETS):
+            if r[2 + 2 * i]:
+                rows.append((today, d, slug, source, r[2 + 2 * i], r[3 + 2 * i]))
+    conn.executemany(
+        "INSERT INTO metrics_sources(date, days, slug, source, articles, likes_sum) VALUES (?, ?, ?, ?, ?, ?)",
+        rows,
+    )
+    return len(rows)
+
+# score = likes_sum（既定）のバケット1つ分。行を Python に持ち出さず、被覆インデックスの範囲走査1回で書く
+METRICS_BUCKET_SQL = """
+INSERT OR REPLACE INTO metrics(date, days, slug, articles, likes_sum, score)
+SELECT ?, ?, t.slug, COUNT(at.article_id), COALESCE(SUM(at.likes), 0), COALESCE(SUM(at.likes), 0)
+FROM tools t
+LEFT JOIN article_tags at ON at.slug = t.slug AND at.published_at >= ?
+GROUP BY t.slug
+"""
+
+def _write_metrics(conn: sqlite3.Connection, now: datetime, today: str, scoring: ScoringConfig) -> int:
+    """
+    全タグ × 全バケットの metrics を today の日付で書き、書いた行数を返す。
+    likes_sum はバケットごとに METRICS_BUCKET_SQL を1回流すだけ。それ以外の式は scoring で
+    記事数・いいね合計を配列に読み、score を配列演算で計算してから executemany する。
+    """
+    if scoring.formula == "likes_sum":
+        n = 0
+        for d in DAYS_BUCKETS:
+            since_iso = (now - timedelta(days=d)).isoformat(timespec="seconds")
+            n += conn.execute(METRICS_BUCKET_SQL, (today, d, since_iso)).rowcount
+        return n
+    rows = compute_bucket_metrics(conn, now, DAYS_BUCKETS, scoring)
+    conn.executemany(
+        "INSERT OR REPLACE INTO metrics(date, days, slug, articles, likes_sum, score) VALUES (?, ?, ?, ?, ?, ?)",
+        [(today, *r) for r in rows],
+    )
+    return len(rows)
+
+def _recompute_metrics(
+    conn: sqlite3.Connection,
+    tag_display_map: Dict[str, str],
+    scoring: Optional[ScoringConfig] = None,
+    tool_aliases: Optional[Dict[str, str]] = None,
+):
+    """
+    DB に存在する全タグの 1/7/30 metrics を今日の日付で保存し直す。
+    （ランキングは最新日のスナップショットだけを見るため、今回触れていないタグも対象にする）
+    score は scoring の式で計算する（未指定なら SCORING 環境変数）。既定の score = likes_sum は
+    バケットごとの INSERT ... SELECT ... GROUP BY だけで書き、他の式は全タグ × 全バケットを配列演算でまとめて計算する
+    （_write_metrics）。使った式は snapshot_state に記録。
+    保存したスナップショットは順位を付けて metrics_history にも書く。
+    取得元（zenn / qiita など）ごとの記事数・いいね合計の内訳は metrics_sources に書く。
+    """
+    with SQL_SECONDS.time(op="recompute"):
+        _recompute_rows(conn, tag_display_map, scoring or parse_scoring(SCORING_SPEC), tool_aliases or {})
+
+def _recompute_rows(
+    conn: sqlite3.Connection,
+    tag_display_map: Dict[str, str],
+    scoring: ScoringConfig,
+    tool_aliases: Dict[str, str],
+):
+    # 表示名・別名の同期（CSVに追記・削除された場合に反映）。変わる行だけ更新して検索索引の書き換えを抑える
+    listed = sorted(set(tag_display_map) | set(tool_aliases))
+    conn.execute(
+        "UPDATE tools SET name = slug, aliases = '' WHERE (name <> slug OR aliases <> '') "
+        "AND slug NOT IN (SELECT value FROM json_each(?))",
+        (json.dumps(listed),),
+    )
+    conn.executemany(
+        "UPDATE tools SET name=?, aliases=? WHERE slug=? AND (name<>? OR aliases<>?)",
+        [(name, aliases, slug, name, aliases)
+         for slug in listed
+         for name, aliases in [(tag_display_map.get(slug, slug), tool_aliases.get(slug, ""))]],
+    )
+
+    now = _now_jst()
+    today = _date_str(now)
+    written = _write_metrics(conn, now, today, scoring)
+    ROWS_WRITTEN.observe(written, table="metrics")
+    ROWS_WRITTEN.observe(_recompute_source_metrics(conn, now, today), table="metrics_sources")
+    conn.execute(HISTORY_SNAPSHOT_SQL, (today, today))
+
+    conn.execute(
+        "INSERT INTO snapshot_state(id, version, date, updated_at, scoring) VALUES (1, 1, ?, ?, ?) "
+        "ON CONFLICT(id) DO UPDATE SET version=version+1, date=excluded.date, updated_at=excluded.updated_at, "
+        "scoring=excluded.scoring",
+        (today, now.isoformat(timespec="seconds"), scoring.to_json()),
+    )
+
+    _log(f"[metrics] {written // len(DAYS_BUCKETS)} slugs -> updated for {DAYS_BUCKETS} (scoring={scoring.formula})")
+
+def _update_likes(conn: sqlite3.Connection, pairs: List[Tuple[int, str]]) -> int:
+    """(likes, url) の組で既存記事の likes を一括更新し、変わった行数を返す（article_tags はトリガーで同期）"""
+    if not pairs:
+        return 0
+    with SQL_SECONDS.time(op="likes"):
+        cur = conn.executemany(
+            "UPDATE articles SET likes=? WHERE url=? AND likes<>?",
+            [(likes, url, likes) for likes, url in pairs],
+        )
+    ROWS_WRITTEN.observe(cur.rowcount, table="likes")
+    return cur.rowcount
+
+# ===========================
+# 新着記事の書き込みバッファ
+# ===========================
+class ArticleWriter:
+    """
+    新着記事をメモリに溜め、flush() でまとめて書き込んでコミットする。
+    - articles / tools / article_tags はそれぞれ executemany 1回
+    - 1ページ分ごとに flush() する想定（メモリは1ページ分で頭打ち、途中で落ちてもそこまでは残る）
+    - tools の name は tools.csv にあればそれ、無ければ slug
+    """
+
+    def __init__(self, conn: sqlite3.Connection, tag_display_map: Dict[str, str]):
+        self.conn = conn
+        self.tag_display_map = tag_display_map
+        self.records: List[ArticleRecord] = []
+        self.likes: List[Tuple[int, str]] = []   # 既存記事: (likes, url)
+        self.slugs: set[str] = set()             # これまでに書き込んだタグ
+
+    def add(self, rec: ArticleRecord) -> None:
+        self.records.append(rec)
+
+    def add_likes(self, pairs: List[Tuple[int, str]]) -> None:
+        self.likes.extend(pairs)
+
+    def flush(self) -> int:
+        """溜めた分を1トランザクションで書き込み、追加した記事数を返す（所要秒・行数は telemetry へ）"""
+        records, self.records = self.records, []
+        likes, self.likes = self.likes, []
+        conn = self.conn
+
+        _update_likes(conn, likes)
+        added = 0
+        with SQL_SECONDS.time(op="flush"):
+            if records:
+                before = conn.total_changes
+                conn.executemany(
+                    "INSERT OR IGNORE INTO articles(title, url, likes, published_at, source) VALUES(?,?,?,?,?)",
+                    [(r.title, r.url, r.likes, r.published_at, r.source) for r in records],
+                )
+                added = conn.total_changes - before
+
+                urls = [r.url for r in records]
+                ids = dict(conn.execute(
+                    f"SELECT url, id FROM articles WHERE url IN ({','.join('?' * len(urls))})", urls
+                ).fetchall())
+
+                slugs = {t for r in records for t in r.tags}
+                before = conn.total_changes
+                conn.executemany(
+                    "INSERT INTO tools(slug, name) VALUES(?, ?) "
+                    "ON CONFLICT(slug) DO UPDATE SET name=excluded.name WHERE name<>excluded.name",
+                    [(slug, self.tag_display_map.get(slug) or slug) for slug in sorted(slugs)],
+                )
+                tools = conn.total_changes - before
+                cur = conn.executemany(
+                    "INSERT OR IGNORE INTO article_tags(article_id, slug, published_at, likes, source) "
+                    "VALUES(?,?,?,?,?)",
+                    [(ids[r.url], t, r.published_at, r.likes, r.source) for r in records for t in r.tags],
+                )
+                ROWS_WRITTEN.observe(added, table="articles")
+                ROWS_WRITTEN.observe(tools, table="tools")
+                ROWS_WRITTEN.observe(cur.rowcount, table="article_tags")
+                self.slugs |= slugs
+
+            conn.commit()
+        return added
 
 # ===========================
 # 集計（クロール→新着追加→1/7/30再計算→古いデータ削除）
@@ -256,263 +1522,731 @@ def _compute_metrics_for_slug(conn: sqlite3.Connection, slug: str, days: int) ->
 def aggregate(
     *, 
     days: int, 
-    tools_csv: str = "tools.csv", 
+    tools_csv: str = TOOLS_CSV, 
+    tag_aliases_csv: str = TAG_ALIASES_CSV,
     db_path: str = DB_PATH, 
     max_pages: int = 1, 
-    sleep_sec: float = 0.3
+    sleep_sec: float = 0.3,
+    workers: int = 1,
+    rate_per_sec: Optional[float] = None,
+    http_cache_path: Optional[str] = HTTP_CACHE_PATH,
+    stream_detail: bool = False,
+    scoring: Optional[str] = None,
+    sources: Optional[Sequence[str]] = None,
+    progress: Optional[RunProgress] = None,
 ):
     """
-    1. Zenn新着をページングし、31日内の記事だけを処理（それ以上古いページに到達したら打ち切り）
-    2. 各記事HTMLから tags / liked_count を抽出（APIの meta も併用）
-    3. 記事は INSERT OR IGNORE（url UNIQUE）で新着だけ追加
-    4. 発見したタグを tools に upsert（name は tools.csv にあればそれを使用）
-    5. 1/7/30日の metrics を DB から再計算し、INSERT OR REPLACE
-    6. 31日超の古い articles / metrics を削除
+    1. 取得元（sources、既定は CRAWL_SOURCES）ごとに新着一覧をページングし、31日内の記事だけを処理
+       （それ以上古いページに到達したら打ち切り）。前回の watermark より古い記事だけのページに到達した場合も打ち切り
+    2. DB に無い記事だけ詳細を取得（Zenn は HTML から tags / liked_count を抽出、一覧の meta も併用）
+       既にある記事は一覧の liked_count で likes だけ更新
+    3. 記事は INSERT OR IGNORE（url UNIQUE）で新着だけ追加し、全タグを article_tags に登録
+       （ArticleWriter に溜め、一覧1ページごとに executemany で書き込んでコミット）。
+       タグは tag_aliases_csv の別名表で正規 slug にそろえる（golang -> go など）
+    4. 発見したタグを tools に upsert（name は tools.csv にあればそれを使用）。
+       別名表に新しく載った別名が DB に残っていれば、既存の記事・metrics も正規 slug に付け替える（_retag）
+    5. 1/7/30日の metrics を DB から再計算し、INSERT OR REPLACE（取得元別の内訳は metrics_sources）
+    6. コミット後、31日超の古い articles / metrics を PRUNE_BATCH_ROWS 行ずつ削除し、空きページが多ければ
+       incremental_vacuum、WAL をチェックポイントして、テーブル・インデックスのサイズを返す（"maintenance"）
+
+    並列化: 取得元ごとに別スレッドでクロールし（所要時間は取得元の合計ではなく最も遅いもの）、
+    詳細は取得元ごとに workers 本のスレッドで取得、次ページの一覧も先読みする。
+    流量は rate_per_sec（未指定なら 1/sleep_sec）のホスト単位トークンバケットで制限
+    （Qiita のように利用制限のある取得元はその値が上限）。max_pages も取得元ごとの上限で頭打ち。
+    DB への書き込みはすべてこの関数を呼んだスレッドで行う。
+    途中で落ちてもコミット済みのページは残り、watermark は取得元ごとに走査を終えた回にしか進めないため、
+    次回は既知URLを詳細の取得なしで読み飛ばして続きから取り直せる。
+    HTTP は共有 Session（keep-alive）で行い、http_cache_path のキャッシュで条件付きリクエストを送る
+    （None でキャッシュ無効）。
+    stream_detail=True なら記事HTMLを必要な項目が揃うところまでしか読まない。
+    scoring はスコア式の指定（"decay:half_life_days=3" など。scoring.parse_scoring 参照、未指定なら SCORING 環境変数）。
+    progress を渡すとフェーズ（crawl / retag / metrics / commit / maintenance）ごとの時間と
+    pages / articles_added / articles_known（と取得元別の "<カウンタ>.<取得元>"）を記録する。
     """
+    scoring_cfg = parse_scoring(scoring or SCORING_SPEC)
+    adapters = get_adapters(sources)
+    progress = progress or RunProgress()
+    if rate_per_sec is None:
+        rate_per_sec = (1.0 / sleep_sec) if sleep_sec > 0 else 0.0
+    workers = max(1, int(workers))
+    cache = ResponseCache(http_cache_path) if http_cache_path else None
+
     init_db(db_path)
     conn = sqlite3.connect(db_path)
     conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA synchronous=NORMAL")  # WAL ではページごとのコミットでも fsync はチェックポイント時のみ
     try:
         tag_display_map = load_tools_csv(tools_csv)
+        canon = load_tag_aliases(tag_aliases_csv)
         today = _date_str(_now_jst())
-        seen_urls: set[str] = set()
-        touched_slugs: set[str] = set()  # 今回見つかったタグ集合
-
-        retention_cut = _now_jst() - timedelta(days=RETENTION_DAYS)
-
-        # ===== 新着クロール =====
-        for page in range(1, max_pages + 1):
-            data = _fetch_latest_list_api(page)
-            if not data:
-                break
-
-            items = data.get("articles") or []
-            if not items:
-                break
-
-            added_in_page = 0
-            for it in items:
-                path = it.get("path") or ""
-                if not path.startswith("/"):
-                    continue
-                url = f"https://zenn.dev{path}"
-                if url in seen_urls:
-                    continue
-
-                # API側のメタ（likes / title / topics など）
-                api_likes = int(it.get("liked_count") or 0)
-                api_title = it.get("title") or ""
-                api_topics = [t.get("id") for t in (it.get("topics") or []) if isinstance(t, dict) and t.get("id")]
-
-                # 記事ページから詳細抽出
-                detail = _fetch_article_detail(url)
-
-                # 公開日時（APIにない想定のため、HTML優先）
-                pub_iso = detail.get("published_at")
-                if not pub_iso:
-                    # 取れない記事はスキップ
-                    seen_urls.add(url)
-                    continue
-
-                pub_dt = _parse_iso(pub_iso)
-                if not pub_dt:
-                    seen_urls.add(url)
-                    continue
-
-                # 保持期間より古いものが出始めたら終了
-                if pub_dt < retention_cut:
-                    _log(f"[cutoff] page={page} pub={pub_dt.isoformat()} < retention({RETENTION_DAYS}d) -> stop")
-                    page = max_pages + 1
-                    break
-
-                title = (detail.get("title") or api_title or "").strip()
-                likes = int(detail.get("likes") or 0)
-                if likes == 0:
-                    likes = api_likes  # 補完
+        writer = ArticleWriter(conn, tag_display_map)
+        known_urls = _load_known_urls(conn)
+        crawls = {
+            a.name: _crawl_source(
+                a,
+                known_urls=known_urls,
+                watermark=_load_watermark(conn, a.name),
+                max_pages=min(max_pages, a.max_pages),
+                workers=workers,
+                limiter=a.make_limiter(rate_per_sec, workers),
+                cache=cache,
+                stream_detail=stream_detail,
+                canon=canon,
+            )
+            for a in adapters
+        }
 
-                tags = detail.get("tags") or api_topics or []
-                if not title or not tags:
-                    seen_urls.add(url)
-                    continue
+        # ===== 新着クロール（取得元ごとに並行。書き込みはここで1ページずつ） =====
+        progress.enter("crawl")
+        complete: set[str] = set()
+        # 書き込みで例外が出ても、抜けるときに取得元スレッドを止めてから cache / conn を閉じる
+        with closing(_interleave(crawls)) as stream:
+            for source, cp in stream:
+                writer.add_likes(cp.likes)
+                for rec in cp.records:
+                    writer.add(rec)
+                writer.flush()
+                if cp.complete:
+                    complete.add(source)
+                _log(f"[list] {source} page={cp.page} processed={len(cp.records)} known={len(cp.likes)}")
+                for key, n in (("pages", 1), ("articles_added", len(cp.records)), ("articles_known", len(cp.likes))):
+                    progress.add(key, n)
+                    progress.add(f"{key}.{source}", n)
+
+        for source in sorted(complete):
+            _save_watermark(conn, source)
+
+        # ===== 既存データの別名タグの付け替え（別名表に新しく載った分だけ） =====
+        progress.enter("retag")
+        retagged = _retag(conn, canon)
+        progress.add("tags_retagged", retagged.get("aliases", 0))
+        progress.add("tags_dropped", _drop_invalid_tags(conn))
+
+        # ===== 1/7/30 の metrics 再計算 =====
+        progress.enter("metrics")
+        _recompute_metrics(conn, tag_display_map, scoring_cfg, load_tool_aliases(tools_csv, canon))
+
+        progress.enter("commit")
+        conn.commit()
 
-                # 新着記事の登録（タグごとに複製して保持する方針）
-                for tag in tags:
-                    slug = str(tag).lower().strip()
-                    if not slug:
-                        continue
+        # ===== 古いデータの削除・空き領域の回収・WAL チェックポイント（コミット後に小分けで） =====
+        progress.enter("maintenance")
+        maintenance = _maintain(conn, db_path, cache)
+        return {"ok": True, "date": today, "tags": len(writer.slugs), "scoring": scoring_cfg.formula,
+                "sources": [a.name for a in adapters], "maintenance": maintenance}
+    finally:
+        progress.enter(None)
+        conn.close()
+        if cache is not None:
+            cache.close()
 
-                    # tools に表示名登録（tools.csv にあれば使用、無ければslug）
-                    _upsert_tool(conn, slug, tag_display_map.get(slug))
-
-                    # 記事 INSERT（url UNIQUE なので1回目のみ入る）
-                    conn.execute(
-                        "INSERT OR IGNORE INTO articles(slug, title, url, likes, published_at) "
-                        "VALUES(?,?,?,?,?)",
-                        (slug, title, url, likes, pub_dt.isoformat())
-                    )
-
-                    touched_slugs.add(slug)
-
-                added_in_page += 1
-                seen_urls.add(url)
-                time.sleep(sleep_sec)
-
-            _log(f"[list] page={page} processed={added_in_page}")
-            if added_in_page == 0:
-                # このページで新規が無ければ、以降も無いと判断して終了
-                break
-
-        # ===== 古いデータの削除 =====
-        _prune_old(conn)
-
-        # ===== 1/7/30 の metrics 再計算（今回触れたタグのみで十分だが、
-        #      初回などを考慮して“DBに存在する全タグ”を対象にする）
-        if not touched_slugs:
-            # DBに存在する全スラッグ
-            rows = conn.execute("SELECT slug FROM tools").fetchall()
-            touched_slugs = {r["slug"] for r in rows}
-
-        for slug in touched_slugs:
-            # 表示名の同期（CSVに追記された場合に反映）
-            _upsert_tool(conn, slug, tag_display_map.get(slug))
-
-            # 各バケットをDBから算出
-            for d in DAYS_BUCKETS:
-                m = _compute_metrics_for_slug(conn, slug, d)
-                conn.execute(
-                    "INSERT OR REPLACE INTO metrics(date, days, slug, articles, likes_sum, score) "
-                    "VALUES (?, ?, ?, ?, ?, ?)",
-                    (m.date, m.days, m.slug, m.articles, m.likes_sum, m.score),
-                )
-            _log(f"[metrics] slug={slug} -> updated for {DAYS_BUCKETS}")
+# ===========================
+# いいね数だけの軽量更新（詳細は取得しない）
+# ===========================
+def _likes_pages(
+    adapter: SourceAdapter,
+    known_urls: Dict[str, str],
+    max_pages: int,
+    limiter: RateLimiter,
+    cache: Optional[ResponseCache],
+) -> Iterator[Tuple[int, List[Tuple[int, str]], int]]:
+    """
+    取得元1つの一覧をページングし、(page, DB にある記事の (likes, url), ここまでに見つけた件数) を返す。
+    DB の記事をすべて見つけた / 保持期間より古いページに達した / 一覧が尽きたら打ち切り。
+    """
+    retention_cut = adapter.cutoff(_now_jst())
+    matched: set[str] = set()
+    for page in range(1, max_pages + 1):
+        if len(matched) >= len(known_urls):
+            return
+        items = adapter.fetch_list(page, limiter, cache)
+        if not items:
+            return
+
+        pairs = []
+        page_expired = True
+        for it in items:
+            pub_dt = _parse_iso(it.published_at or known_urls.get(it.url) or "")
+            if pub_dt is None or pub_dt >= retention_cut:
+                page_expired = False
+            if it.url in known_urls and it.url not in matched and it.likes is not None:
+                matched.add(it.url)
+                pairs.append((it.likes, it.url))
+        yield page, pairs, len(matched)
+        if page_expired:
+            return
+
+def refresh_likes(
+    *,
+    tools_csv: str = TOOLS_CSV,
+    tag_aliases_csv: str = TAG_ALIASES_CSV,
+    db_path: str = DB_PATH,
+    max_pages: int = MAX_PAGES,
+    sleep_sec: float = 0.3,
+    rate_per_sec: Optional[float] = None,
+    http_cache_path: Optional[str] = HTTP_CACHE_PATH,
+    scoring: Optional[str] = None,
+    sources: Optional[Sequence[str]] = None,
+    progress: Optional[RunProgress] = None,
+):
+    """
+    取得元ごとに新着一覧だけをページングし、DB にある記事の liked_count で likes を一括更新する。
+    記事の追加は行わない（aggregate とは別スケジュールで回す想定）。取得元は aggregate と同じく並行に回す。
+    - その取得元の DB の記事をすべて見つけた / 保持期間より古いページに達した / 一覧が尽きたら打ち切り
+    - likes が変わった場合だけ 1/7/30 の metrics を再計算（scoring は aggregate と同じ）
+    - 最後に aggregate と同じ保守（保持期間外の分割削除・空き領域の回収・WAL チェックポイント）を行う
+    """
+    scoring_cfg = parse_scoring(scoring or SCORING_SPEC)
+    adapters = get_adapters(sources)
+    progress = progress or RunProgress()
+    if rate_per_sec is None:
+        rate_per_sec = (1.0 / sleep_sec) if sleep_sec > 0 else 0.0
+    cache = ResponseCache(http_cache_path) if http_cache_path else None
 
+    init_db(db_path)
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    try:
+        today = _date_str(_now_jst())
+        known = {a.name: _load_known_urls(conn, a.name) for a in adapters}
+        matched: Dict[str, int] = {a.name: 0 for a in adapters}
+        updated = 0
+
+        progress.enter("list")
+        pages = {
+            a.name: _likes_pages(a, known[a.name], min(max_pages, a.max_pages), a.make_limiter(rate_per_sec, 1), cache)
+            for a in adapters
+        }
+        with closing(_interleave(pages)) as stream:
+            for source, (page, pairs, total) in stream:
+                n = _update_likes(conn, pairs)
+                updated += n
+                matched[source] = total
+                _log(f"[likes] {source} page={page} matched={len(pairs)} total={total}/{len(known[source])}")
+                progress.add("pages")
+                progress.add("likes_updated", n)
+                progress.add(f"likes_updated.{source}", n)
+
+        if updated:
+            progress.enter("metrics")
+            _recompute_metrics(conn, load_tools_csv(tools_csv), scoring_cfg,
+                               load_tool_aliases(tools_csv, load_tag_aliases(tag_aliases_csv)))
+        progress.enter("commit")
         conn.commit()
-        return {"ok": True, "date": today, "tags": len(touched_slugs)}
+        progress.enter("maintenance")
+        maintenance = _maintain(conn, db_path, cache)
+        return {"ok": True, "date": today, "matched": sum(matched.values()), "updated": updated,
+                "sources": matched, "maintenance": maintenance}
     finally:
+        progress.enter(None)
         conn.close()
+        if cache is not None:
+            cache.close()
 
 # ===========================
-# 読み出し API
+# 別名タグの一括付け替え（クロールなし）
 # ===========================
-def get_rankings(days: int, limit: int = 100, db_path: str = DB_PATH) -> List[Dict]:
+def retag(
+    *,
+    tools_csv: str = TOOLS_CSV,
+    tag_aliases_csv: str = TAG_ALIASES_CSV,
+    db_path: str = DB_PATH,
+    scoring: Optional[str] = None,
+):
     """
-    最新保存日のメトリクスからランキングを返す + 各タグTop5記事（該当期間で抽出）
+    tag_aliases_csv の別名表で既存の article_tags / metrics / metrics_history / tools を正規 slug に付け替え、
+    付け替えがあれば今日の metrics を再計算する（aggregate も毎回同じことをするので、クロールせずに
+    別名表の変更だけ先に反映したいとき用）。
     """
+    scoring_cfg = parse_scoring(scoring or SCORING_SPEC)
+    canon = load_tag_aliases(tag_aliases_csv)
+    init_db(db_path)
+    conn = sqlite3.connect(db_path)
+    try:
+        counts = _retag(conn, canon)
+        dropped = _drop_invalid_tags(conn)
+        if dropped:
+            counts["invalid_tags"] = dropped
+        if counts:
+            _recompute_metrics(conn, load_tools_csv(tools_csv), scoring_cfg, load_tool_aliases(tools_csv, canon))
+        conn.commit()
+        return {"ok": True, "date": _date_str(_now_jst()), "aliases": 0, **counts}
+    finally:
+        conn.close()
+
+# ===========================
+# 読み出し API
+# ===========================
+# タグの順位は ROW_NUMBER() で確定し、各タグの TopN は相関サブクエリの ORDER BY ... LIMIT で選ぶ。
+# （PARTITION BY slug の ROW_NUMBER は期間内の全記事に番号を振ってから絞るため、SQLite ではこちらが速い）
+# 上位タグ（{where} でページング位置・絞り込みを足す）。並びは score 降順、同点は slug 昇順
+RANKINGS_TOP_SQL = """
+SELECT m.slug, t.name, m.articles, m.likes_sum, m.score
+FROM metrics m
+JOIN tools  t ON t.slug = m.slug
+WHERE m.days=:days AND m.date=:date{where}
+ORDER BY m.score DESC, m.slug
+LIMIT :limit
+"""
+# 上位タグ + 各タグの TopN 記事を1クエリで
+RANKINGS_SQL = """
+WITH top AS MATERIALIZED (
+  SELECT top0.*, ROW_NUMBER() OVER (ORDER BY top0.score DESC, top0.slug) AS pos
+  FROM ({top}) top0
+)
+SELECT top.slug, top.name, top.articles, top.likes_sum, top.score,
+       a.title, a.url, at.likes, at.published_at
+FROM top
+LEFT JOIN article_tags at ON at.slug = top.slug AND at.article_id IN (
+  SELECT x.article_id FROM article_tags x
+  WHERE x.slug = top.slug AND x.published_at >= :since
+  ORDER BY x.likes DESC, x.published_at DESC
+  LIMIT :top_n
+)
+LEFT JOIN articles a ON a.id = at.article_id
+ORDER BY top.pos, at.likes DESC, at.published_at DESC
+"""
+# keyset: 直前ページ最後の (score, slug) より後ろ。score <= で索引を seek してから同点を slug で切る
+RANKINGS_AFTER_SQL = " AND m.score <= :after_score AND (m.score < :after_score OR m.slug > :after_slug)"
+RANKINGS_MIN_ARTICLES_SQL = " AND m.articles >= :min_articles"
+RANKINGS_TAGS_SQL = " AND m.slug IN (SELECT value FROM json_each(:tags))"
+
+def _connect_read(db_path: str) -> sqlite3.Connection:
     conn = sqlite3.connect(db_path)
     conn.row_factory = sqlite3.Row
+    return conn
+
+def _latest_date(conn: sqlite3.Connection, days: int) -> Optional[str]:
+    row = conn.execute(
+        "SELECT date FROM metrics WHERE days=? ORDER BY date DESC LIMIT 1",
+        (days,)
+    ).fetchone()
+    return row[0] if row else None
+
+def _article_json(a) -> Dict:
+    return {
+        "title": a["title"],
+        "url": a["url"],
+        "likes": int(a["likes"]) if a["likes"] is not None else 0,
+        "published_at": a["published_at"],
+    }
+
+def encode_cursor(score: float, slug: str) -> str:
+    """ページング位置（最後に返した行の score, slug）を URL に載せられる文字列にする"""
+    raw = json.dumps([score, slug], ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[float, str]:
+    """encode_cursor の逆。壊れていれば ValueError"""
     try:
-        row = conn.execute(
-            "SELECT date FROM metrics WHERE days=? ORDER BY date DESC LIMIT 1",
-            (days,)
-        ).fetchone()
-        if not row:
-            return []
-        latest = row["date"]
-
-        rows = conn.execute(
-            """
-            SELECT m.slug, t.name, m.articles, m.likes_sum, m.score
-            FROM metrics m
-            JOIN tools  t ON t.slug = m.slug
-            WHERE m.days=? AND m.date=?
-            ORDER BY m.score DESC
-            LIMIT ?
-            """,
-            (days, latest, limit)
-        ).fetchall()
-
-        # 期間境界
-        try:
-            latest_dt = dt.datetime.fromisoformat(str(latest))
-        except Exception:
-            latest_dt = dt.datetime.utcnow()
-        since_iso = (latest_dt - dt.timedelta(days=days)).isoformat(timespec="seconds")
-
-        results = []
-        for r in rows:
-            slug = r["slug"]
-            top5 = conn.execute(
-                """
-                SELECT title, url, likes, published_at
-                FROM articles
-                WHERE slug=? AND published_at >= ?
-                ORDER BY likes DESC, published_at DESC
-                LIMIT 5
-                """,
-                (slug, since_iso)
-            ).fetchall()
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        score, slug = json.loads(raw)
+        return float(score), str(slug)
+    except Exception as e:
+        raise ValueError(f"invalid cursor: {cursor!r}") from e
+
+def _rankings_rows(
+    conn: sqlite3.Connection,
+    days: int,
+    latest: str,
+    limit: int,
+    top_n: int,
+    after: Optional[Tuple[float, str]] = None,
+    min_articles: int = 0,
+    tags: Optional[List[str]] = None,
+    include_articles: bool = True,
+) -> List[Dict]:
+    where = ""
+    params = {"days": days, "date": latest, "limit": limit}
+    if after is not None:
+        where += RANKINGS_AFTER_SQL
+        params.update(after_score=after[0], after_slug=after[1])
+    if min_articles > 0:
+        where += RANKINGS_MIN_ARTICLES_SQL
+        params["min_articles"] = min_articles
+    if tags is not None:
+        where += RANKINGS_TAGS_SQL
+        params["tags"] = json.dumps(list(tags))
+    top_sql = RANKINGS_TOP_SQL.format(where=where)
+
+    if not include_articles or top_n <= 0:
+        return [
+            {"slug": r["slug"], "name": r["name"], "articles": r["articles"],
+             "likes_sum": r["likes_sum"], "score": float(r["score"])}
+            for r in conn.execute(top_sql, params).fetchall()
+        ]
+
+    # 期間境界
+    try:
+        latest_dt = dt.datetime.fromisoformat(str(latest))
+    except Exception:
+        latest_dt = dt.datetime.utcnow()
+    params["since"] = (latest_dt - dt.timedelta(days=days)).isoformat(timespec="seconds")
+    params["top_n"] = top_n
 
+    results = []
+    for r in conn.execute(RANKINGS_SQL.format(top=top_sql), params).fetchall():
+        if not results or results[-1]["slug"] != r["slug"]:
             results.append({
-                "slug": slug,
+                "slug": r["slug"],
                 "name": r["name"],
                 "articles": r["articles"],
                 "likes_sum": r["likes_sum"],
                 "score": float(r["score"]),
-                "articles_top5": [
-                    {
-                        "title": a["title"],
-                        "url": a["url"],
-                        "likes": int(a["likes"]) if a["likes"] is not None else 0,
-                        "published_at": a["published_at"],
-                    } for a in top5
-                ],
+                "articles_top5": [],
             })
-        return results
+        if r["url"] is None:
+            continue
+        results[-1]["articles_top5"].append(_article_json(r))
+    return results
+
+def query_rankings(conn: sqlite3.Connection, days: int, limit: int = 100, top_n: int = 5) -> List[Dict]:
+    """get_rankings の本体（接続は呼び出し側が管理。row_factory=sqlite3.Row 前提）"""
+    latest = _latest_date(conn, days)
+    if not latest:
+        return []
+    return _rankings_rows(conn, days, latest, limit, top_n)
+
+def query_rankings_page(
+    conn: sqlite3.Connection,
+    days: int,
+    limit: int = 50,
+    after: Optional[Tuple[float, str]] = None,
+    min_articles: int = 0,
+    tags: Optional[List[str]] = None,
+    top_n: int = 5,
+    include_articles: bool = True,
+) -> Dict:
+    """
+    ランキングの1ページ分（keyset ページング）。after は前ページの next_cursor を decode_cursor した (score, slug)。
+    カーソルの検証は呼び出し側で、接続を取る前に済ませておく（ここでは DB の読み出しだけを行う）。
+    min_articles で記事数の下限、tags で対象タグを絞る。include_articles=False なら articles_top5 を付けない。
+    next_cursor が None なら最後のページ。
+    """
+    latest = _latest_date(conn, days)
+    if not latest:
+        return {"date": None, "items": [], "next_cursor": None}
+    items = _rankings_rows(conn, days, latest, limit + 1, top_n, after, min_articles, tags, include_articles)
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        next_cursor = encode_cursor(items[-1]["score"], items[-1]["slug"])
+    return {"date": latest, "items": items, "next_cursor": next_cursor}
+
+def count_rankings(conn: sqlite3.Connection, days: int, min_articles: int = 0) -> int:
+    """最新スナップショットで min_articles 以上の記事があるタグ数"""
+    latest = _latest_date(conn, days)
+    if not latest:
+        return 0
+    return conn.execute(
+        "SELECT COUNT(*) FROM metrics WHERE days=? AND date=? AND articles >= ?", (days, latest, min_articles)
+    ).fetchone()[0]
+
+SOURCES_BY_SLUG_SQL = """
+SELECT slug, source, articles, likes_sum FROM metrics_sources
+WHERE date=? AND days=? {where}
+ORDER BY slug, likes_sum DESC, source
+"""
+
+def query_sources_by_slug(conn: sqlite3.Connection, days: int, date: Optional[str],
+                          slug: Optional[str] = None) -> Dict[str, List[Dict]]:
+    """date のスナップショットの取得元別内訳（slug -> [{source, articles, likes_sum}]）。slug 未指定なら全タグ分を1クエリで"""
+    if date is None:
+        return {}
+    sql = SOURCES_BY_SLUG_SQL.format(where="AND slug=?" if slug is not None else "")
+    out: Dict[str, List[Dict]] = {}
+    for r in conn.execute(sql, (date, days) + ((slug,) if slug is not None else ())):
+        out.setdefault(r[0], []).append({"source": r[1], "articles": r[2], "likes_sum": r[3]})
+    return out
+
+def tool_detail_json(tool: Dict, metric: Dict, sources: List[Dict], articles_top: List[Dict]) -> Dict:
+    """タグ詳細の形（/tool/{slug} と静的な tools/{slug}-{d}.json で共通）"""
+    return {"tool": tool, "metric": metric, "sources": sources, "articles_top": articles_top}
+
+def query_tool_detail(conn: sqlite3.Connection, slug: str, days: int) -> Dict:
+    """get_tool_detail の本体（接続は呼び出し側が管理。row_factory=sqlite3.Row 前提）"""
+    tool = conn.execute("SELECT slug, name FROM tools WHERE slug=?", (slug,)).fetchone()
+    if not tool:
+        return {}
+
+    row = conn.execute(
+        "SELECT date, articles, likes_sum, score FROM metrics "
+        "WHERE slug=? AND days=? ORDER BY date DESC LIMIT 1",
+        (slug, days)
+    ).fetchone()
+    if not row:
+        metric = {"articles": 0, "likes_sum": 0, "score": 0.0, "date": None}
+        latest_dt = _now_jst()
+    else:
+        metric = {
+            "date": row["date"],
+            "articles": row["articles"],
+            "likes_sum": row["likes_sum"],
+            "score": float(row["score"]),
+        }
+        try:
+            latest_dt = dt.datetime.fromisoformat(metric["date"])
+        except Exception:
+            latest_dt = _now_jst()
+
+    since_iso = (latest_dt - dt.timedelta(days=days)).isoformat(timespec="seconds")
+
+    arts = conn.execute(
+        "SELECT a.title, a.url, at.likes, at.published_at "
+        "FROM article_tags at JOIN articles a ON a.id = at.article_id "
+        "WHERE at.slug=? AND at.published_at >= ? "
+        "ORDER BY at.likes DESC, at.published_at DESC LIMIT 10",
+        (slug, since_iso)
+    ).fetchall()
+
+    sources = query_sources_by_slug(conn, days, metric["date"], slug).get(slug, [])
+    return tool_detail_json({"slug": tool["slug"], "name": tool["name"]}, metric, sources,
+                            [_article_json(a) for a in arts])
+
+def query_stats(conn: sqlite3.Connection, days: int) -> Dict:
+    """get_stats の本体（scoring は最新スナップショットのスコア式）"""
+    row = conn.execute("SELECT scoring FROM snapshot_state WHERE id=1").fetchone()
+    return {
+        "last_updated": _latest_date(conn, days),
+        "scoring": json.loads(row[0]) if row and row[0] else None,
+    }
+
+TREND_SORTS = ("rank", "rank_change", "growth")
+
+def _history_date(conn: sqlite3.Connection, days: int, on_or_before: str) -> Optional[str]:
+    row = conn.execute(
+        "SELECT MAX(date) FROM metrics_history WHERE days=? AND date<=?", (days, on_or_before)
+    ).fetchone()
+    return row[0] if row else None
+
+def query_trends(
+    conn: sqlite3.Connection,
+    days: int,
+    window: int = TREND_WINDOW_DAYS,
+    limit: int = 100,
+    sort: str = "rank",
+) -> Dict:
+    """
+    最新スナップショットと window 日前（その日が無ければそれ以前で最も近い日）を比べ、
+    タグごとの順位・順位変化（正なら上昇）・score の伸び率を返す。metrics_history だけを読む。
+    sort: rank（現在の順位）/ rank_change（順位の上昇幅）/ growth（伸び率。比較元が 0 のタグは末尾）
+    """
+    latest = _history_date(conn, days, "9999-12-31")
+    if not latest:
+        return {"date": None, "compare_date": None, "items": []}
+    target = _date_str(datetime.strptime(latest, "%Y-%m-%d") - timedelta(days=window))
+    prev = _history_date(conn, days, target)
+
+    rows = conn.execute(
+        """
+        SELECT cur.slug, t.name, cur.rank, cur.articles, cur.likes_sum, cur.score,
+               prev.rank AS prev_rank, prev.score AS prev_score
+        FROM metrics_history cur
+        JOIN tools t ON t.slug = cur.slug
+        LEFT JOIN metrics_history prev ON prev.slug = cur.slug AND prev.days = cur.days AND prev.date = ?
+        WHERE cur.days = ? AND cur.date = ?
+        ORDER BY cur.rank
+        """,
+        (prev, days, latest),
+    ).fetchall()
+
+    items = []
+    for r in rows:
+        prev_score = r["prev_score"]
+        items.append({
+            "slug": r["slug"],
+            "name": r["name"],
+            "rank": r["rank"],
+            "prev_rank": r["prev_rank"],
+            "rank_change": (r["prev_rank"] - r["rank"]) if r["prev_rank"] is not None else None,
+            "articles": r["articles"],
+            "likes_sum": r["likes_sum"],
+            "score": float(r["score"]),
+            "prev_score": float(prev_score) if prev_score is not None else None,
+            "growth": ((r["score"] - prev_score) / prev_score) if prev_score else None,
+        })
+
+    if sort in ("rank_change", "growth"):
+        items.sort(key=lambda x: (x[sort] is None, -(x[sort] or 0), x["rank"]))
+    return {"date": latest, "compare_date": prev, "items": items[:limit]}
+
+def query_history(conn: sqlite3.Connection, slug: str, days: int, range_days: int = HISTORY_RETENTION_DAYS) -> Dict:
+    """タグの順位・score の推移（metrics_history の主キー範囲スキャン1回）"""
+    since = _date_str(_now_jst() - timedelta(days=range_days))
+    rows = conn.execute(
+        "SELECT date, rank, articles, likes_sum, score FROM metrics_history "
+        "WHERE slug=? AND days=? AND date>=? ORDER BY date",
+        (slug, days, since),
+    ).fetchall()
+    return {
+        "slug": slug,
+        "days": days,
+        "points": [
+            {"date": r["date"], "rank": r["rank"], "articles": r["articles"],
+             "likes_sum": r["likes_sum"], "score": float(r["score"])}
+            for r in rows
+        ],
+    }
+
+SEARCH_LIMIT = 20
+SEARCH_CANDIDATES = 100   # 部分一致の候補をこの件数で打ち切ってから並べ替える
+SEARCH_DAYS = 30          # 並び順に使う score のバケット
+
+def normalize_query(s: str) -> str:
+    """検索語・別名の正規化（NFKC + 小文字 + 前後空白除去）"""
+    return unicodedata.normalize("NFKC", s or "").strip().lower()
+
+def _fts_phrase(q: str) -> str:
+    return '"' + q.replace('"', '""') + '"'
+
+def _like_escape(q: str) -> str:
+    return q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+# 候補（tools の rowid）を SEARCH_CANDIDATES 件まで索引で集め、最新 score と一緒に引く
+SEARCH_SQL = """
+SELECT t.slug, t.name, COALESCE(m.score, 0) AS score,
+       CASE
+         WHEN t.slug = :q OR lower(t.name) = :q OR instr('|' || t.aliases || '|', '|' || :q || '|') > 0 THEN 0
+         WHEN (t.slug >= :q AND t.slug < :hi) OR (t.name >= :q COLLATE NOCASE AND t.name < :hi COLLATE NOCASE)
+              OR instr('|' || t.aliases, '|' || :q) > 0 THEN 1
+         ELSE 2
+       END AS match
+FROM tools t
+LEFT JOIN metrics m ON m.slug = t.slug AND m.days = :days AND m.date = :date
+WHERE t.rowid IN ({candidates})
+ORDER BY match, score DESC, t.slug
+LIMIT :limit
+"""
+# 3文字以上: trigram で部分一致
+SEARCH_FTS_SQL = "SELECT rowid FROM tools_fts WHERE tools_fts MATCH :match LIMIT :n"
+# 3文字未満（trigram では引けない）: slug は主キー、表示名は NOCASE 索引の範囲、別名は別名付きの行だけ
+SEARCH_PREFIX_SQL = """
+SELECT rowid FROM (SELECT rowid FROM tools WHERE slug >= :q AND slug < :hi LIMIT :n)
+UNION
+SELECT rowid FROM (SELECT rowid FROM tools WHERE name >= :q COLLATE NOCASE AND name < :hi COLLATE NOCASE LIMIT :n)
+UNION
+SELECT rowid FROM tools WHERE aliases <> '' AND instr('|' || aliases, '|' || :q) > 0
+"""
+# FTS5 trigram が無い SQLite 向け（全件走査）
+SEARCH_LIKE_SQL = """
+SELECT rowid FROM tools
+WHERE slug LIKE :match ESCAPE '\\' OR name LIKE :match ESCAPE '\\' OR aliases LIKE :match ESCAPE '\\'
+LIMIT :n
+"""
+
+def _search_rows(conn: sqlite3.Connection, q: str, latest: Optional[str], limit: int) -> List[sqlite3.Row]:
+    params = {"days": SEARCH_DAYS, "date": latest, "q": q, "hi": q + "\U0010ffff",
+              "n": SEARCH_CANDIDATES, "limit": limit}
+    if len(q) < 3:
+        return conn.execute(SEARCH_SQL.format(candidates=SEARCH_PREFIX_SQL), params).fetchall()
+    try:
+        return conn.execute(SEARCH_SQL.format(candidates=SEARCH_FTS_SQL),
+                            dict(params, match=_fts_phrase(q))).fetchall()
+    except sqlite3.OperationalError:
+        # tools_fts が無い（FTS5 trigram 非対応）
+        return conn.execute(SEARCH_SQL.format(candidates=SEARCH_LIKE_SQL),
+                            dict(params, match="%" + _like_escape(q) + "%")).fetchall()
+
+def query_search(conn: sqlite3.Connection, q: str, limit: int = SEARCH_LIMIT) -> Dict:
+    """
+    slug / 表示名 / 別名でタグを探す（完全一致 → 前方一致 → 部分一致、同順位は直近 SEARCH_DAYS 日の score 順）。
+    3文字以上は tools_fts（trigram）で部分一致、それ未満は前方一致のみ。
+    候補は索引順に SEARCH_CANDIDATES 件で打ち切るため、それ以上ヒットする短い語では漏れることがある。
+    """
+    q = normalize_query(q)
+    if not q:
+        return {"q": q, "items": []}
+    rows = _search_rows(conn, q, _latest_date(conn, SEARCH_DAYS), limit)
+    return {
+        "q": q,
+        "items": [
+            {"slug": r["slug"], "name": r["name"], "score": float(r["score"]),
+             "match": ("exact", "prefix", "substring")[r["match"]]}
+            for r in rows
+        ],
+    }
+
+def query_search_index(conn: sqlite3.Connection) -> Dict:
+    """
+    フロント用の検索インデックス（静的 JSON）。直近 SEARCH_DAYS 日に記事があるタグと、
+    tools.csv で表示名・別名を付けたタグを score 順に [slug, name, score, aliases] で並べる
+    （name が slug と同じなら ""、別名が無ければ3要素）。
+    """
+    latest = _latest_date(conn, SEARCH_DAYS)
+    rows = conn.execute(
+        "SELECT t.slug, t.name, t.aliases, COALESCE(m.score, 0) AS score FROM tools t "
+        "LEFT JOIN metrics m ON m.slug = t.slug AND m.days = ? AND m.date = ? "
+        "WHERE m.articles > 0 OR t.name <> t.slug OR t.aliases <> '' "
+        "ORDER BY score DESC, t.slug",
+        (SEARCH_DAYS, latest),
+    ).fetchall()
+    items = []
+    for r in rows:
+        item = [r["slug"], "" if r["name"] == r["slug"] else r["name"], round(float(r["score"]), 3)]
+        if r["aliases"]:
+            item.append(r["aliases"])
+        items.append(item)
+    return {"date": latest, "days": SEARCH_DAYS, "items": items}
+
+def get_rankings(days: int, limit: int = 100, db_path: str = DB_PATH, top_n: int = 5) -> List[Dict]:
+    """
+    最新保存日のメトリクスからランキングを返す + 各タグTopN記事（該当期間で抽出）
+    タグと TopN 記事は1クエリにまとめて取得する（RANKINGS_SQL）。続きは query_rankings_page で辿る。
+    （互換のためキー名は top_n に関わらず "articles_top5"）
+    """
+    conn = _connect_read(db_path)
+    try:
+        return query_rankings(conn, days, limit, top_n)
     finally:
         conn.close()
 
 def get_tool_detail(slug: str, days: int, db_path: str = DB_PATH) -> Dict:
     """
-    タグ詳細（最新スナップショット＋該当期間の人気Top10記事）
+    タグ詳細（最新スナップショット＋取得元別の内訳＋該当期間の人気Top10記事）
     """
+    conn = _connect_read(db_path)
+    try:
+        return query_tool_detail(conn, slug, days)
+    finally:
+        conn.close()
+
+def query_snapshot_version(conn: sqlite3.Connection) -> Optional[int]:
+    """metrics スナップショットの版数（未集計なら None）"""
+    try:
+        row = conn.execute("SELECT version FROM snapshot_state WHERE id=1").fetchone()
+        return row[0] if row else None
+    except sqlite3.OperationalError:
+        return None
+
+def get_snapshot_version(db_path: str = DB_PATH) -> Optional[int]:
     conn = sqlite3.connect(db_path)
-    conn.row_factory = sqlite3.Row
     try:
-        tool = conn.execute("SELECT slug, name FROM tools WHERE slug=?", (slug,)).fetchone()
-        if not tool:
-            return {}
-
-        row = conn.execute(
-            "SELECT date, articles, likes_sum, score FROM metrics "
-            "WHERE slug=? AND days=? ORDER BY date DESC LIMIT 1",
-            (slug, days)
-        ).fetchone()
-        if not row:
-            metric = {"articles": 0, "likes_sum": 0, "score": 0.0, "date": None}
-            latest_dt = _now_jst()
-        else:
-            metric = {
-                "date": row["date"],
-                "articles": row["articles"],
-                "likes_sum": row["likes_sum"],
-                "score": float(row["score"]),
-            }
-            try:
-                latest_dt = dt.datetime.fromisoformat(metric["date"])
-            except Exception:
-                latest_dt = _now_jst()
-
-        since_iso = (latest_dt - dt.timedelta(days=days)).isoformat(timespec="seconds")
-
-        arts = conn.execute(
-            "SELECT title, url, likes, published_at FROM articles "
-            "WHERE slug=? AND published_at >= ? "
-            "ORDER BY likes DESC, published_at DESC LIMIT 10",
-            (slug, since_iso)
-        ).fetchall()
-
-        return {
-            "tool": {"slug": tool["slug"], "name": tool["name"]},
-            "metric": metric,
-            "articles_top": [
-                {
-                    "title": a["title"],
-                    "url": a["url"],
-                    "likes": int(a["likes"]) if a["likes"] is not None else 0,
-                    "published_at": a["published_at"],
-                } for a in arts
-            ],
-        }
+        return query_snapshot_version(conn)
+    finally:
+        conn.close()
+
+def get_trends(days: int, window: int = TREND_WINDOW_DAYS, limit: int = 100,
+               sort: str = "rank", db_path: str = DB_PATH) -> Dict:
+    """順位変化・伸び率つきのランキング（metrics_history のみ参照）"""
+    conn = _connect_read(db_path)
+    try:
+        return query_trends(conn, days, window, limit, sort)
+    finally:
+        conn.close()
+
+def get_history(slug: str, days: int, range_days: int = HISTORY_RETENTION_DAYS, db_path: str = DB_PATH) -> Dict:
+    """タグの推移（トレンドグラフ用）"""
+    conn = _connect_read(db_path)
+    try:
+        return query_history(conn, slug, days, range_days)
+    finally:
+        conn.close()
+
+def search_tools(q: str, limit: int = SEARCH_LIMIT, db_path: str = DB_PATH) -> Dict:
+    """タグ検索（オートコンプリート用）"""
+    conn = _connect_read(db_path)
+    try:
+        return query_search(conn, q, limit)
     finally:
         conn.close()
 
@@ -520,12 +2254,8 @@ def get_stats(days: int, db_path: str = DB_PATH) -> Dict:
     """
     そのdaysで最後に保存した日付を返す（フロントの“更新日”表示用）
     """
-    conn = sqlite3.connect(db_path)
+    conn = _connect_read(db_path)
     try:
-        row = conn.execute(
-            "SELECT date FROM metrics WHERE days=? ORDER BY date DESC LIMIT 1",
-            (days,)
-        ).fetchone()
-        return {"last_updated": row[0] if row else None}
+        return query_stats(conn, days)
     finally:
-        conn.close()
\ No newline at end of file
+        conn.close()
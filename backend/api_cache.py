@@ -0,0 +1,82 @@
+# api_cache.py — FastAPI 読み出しエンドポイント用のレスポンスキャッシュ
+# - キー (endpoint, slug, days, limit, ...) ごとにエンコード済み JSON と ETag を保持（LRU・TTL 付き）
+# - metrics スナップショットの版数（snapshot_state.version）が変わったら全消去
+#   版数の確認は check_interval 秒に1回だけ（それ以外のリクエストは dict 参照のみ）
+# - If-None-Match が ETag と一致すれば 304
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional, Tuple
+
+from exporter import encode
+
+CACHE_MAXSIZE = int(os.getenv("API_CACHE_SIZE", "1024"))  # 保持するレスポンス数（0 で無効）
+CACHE_TTL_SEC = 600.0       # 1件あたりの最長保持時間（版数チェックの保険）
+CACHE_CHECK_SEC = 5.0       # スナップショット版数を確認する間隔
+CACHE_MAX_AGE = 60          # Cache-Control: max-age
+
+class SnapshotCache:
+    def __init__(
+        self,
+        version_fn: Callable[[], Any],
+        maxsize: int = CACHE_MAXSIZE,
+        ttl: float = CACHE_TTL_SEC,
+        check_interval: float = CACHE_CHECK_SEC,
+    ):
+        self.version_fn = version_fn
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, Tuple[float, str, bytes]]" = OrderedDict()
+        self._version: Any = None
+        self._checked_at = float("-inf")
+        self.hits = 0
+        self.misses = 0
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._checked_at = float("-inf")
+
+    def _sync_version(self, now: float) -> None:
+        if now - self._checked_at < self.check_interval:
+            return
+        version = self.version_fn()
+        with self._lock:
+            self._checked_at = now
+            if version != self._version:
+                self._version = version
+                self._entries.clear()
+
+    def get(self, key: Hashable, compute: Callable[[], Any]) -> Tuple[str, bytes]:
+        """(ETag, JSON バイト列) を返す。無ければ compute() してエンコード・保存"""
+        now = time.monotonic()
+        self._sync_version(now)
+        with self._lock:
+            hit = self._entries.get(key)
+            if hit is not None and now - hit[0] < self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return hit[1], hit[2]
+
+        body = encode(compute())
+        etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        with self._lock:
+            self.misses += 1
+            self._entries[key] = (now, etag, body)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return etag, body
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    tags = [t.strip() for t in if_none_match.split(",")]
+    return etag in tags or f"W/{etag}" in tags
@@ -0,0 +1,117 @@
+# bench/bench_extract.py — 記事HTMLからの抽出ベンチマーク
+# __NEXT_DATA__ 抽出（_parse_article_html）と正規表現のみ（_parse_article_html_regex）を比べ、
+# 1ページあたりの解析時間と抽出精度（title / published_at / likes / tags の一致率）を出す。
+#
+#   python backend/bench/bench_extract.py                     # 合成コーパス（200ページ）
+#   python backend/bench/bench_extract.py --corpus DIR        # 保存済み HTML（*.html + *.expected.json）
+#
+# expected.json は {"title", "published_at", "likes", "tags"}（published_at は JST の ISO 文字列）。
+
+import argparse
+import glob
+import html as html_lib
+import json
+import os
+import random
+import sys
+import time
+from datetime import timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from aggregator import _now_jst, _parse_article_html, _parse_article_html_regex  # noqa: E402
+
+FIELDS = ("title", "published_at", "likes", "tags")
+TOPICS = ["python", "typescript", "react", "go", "rust", "aws", "docker", "ai", "llm", "nextjs",
+          "githubactions", "flutter", "claude", "terraform", "kubernetes", "zenn", "css", "vue"]
+
+def make_article_html(rnd: random.Random, i: int):
+    """Zenn の記事ページに似せた HTML と正解データ（本文・サイドバーの関連トピックリンク付き）"""
+    title = f'記事タイトル {i} で "{rnd.choice(TOPICS)}" を使う & 比べる'
+    pub = (_now_jst() - timedelta(minutes=rnd.randint(0, 60 * 24 * 30))).replace(microsecond=0)
+    likes = rnd.randint(0, 500)
+    tags = rnd.sample(TOPICS, rnd.randint(1, 5))
+    body = "".join(
+        f"<p>{'本文テキスト' * rnd.randint(5, 40)}</p><pre><code>print({j})</code></pre>"
+        for j in range(rnd.randint(50, 300))
+    )
+    related = "".join(f'<a href="/topics/{t}">{t}</a>' for t in rnd.sample(TOPICS, 4))
+    next_data = {
+        "props": {"pageProps": {"article": {
+            "id": i, "postType": "Article", "title": title,
+            "publishedAt": pub.isoformat(), "likedCount": likes,
+            "topics": [{"id": 1000 + k, "name": t, "displayName": t.title()} for k, t in enumerate(tags)],
+            "bodyHtml": body,
+        }}},
+        "page": "/[username]/articles/[slug]",
+    }
+    page = (
+        "<!DOCTYPE html><html><head><title>" + html_lib.escape(title) + "</title>"
+        + "<style>" + ".c{color:red}" * 500 + "</style></head><body>"
+        + f'<article><h1 class="View_title">{html_lib.escape(title)}</h1>'
+        + f'<time datetime="{pub.isoformat()}">{pub:%Y/%m/%d}</time>'
+        + "".join(f'<a href="/topics/{t}">{t}</a>' for t in tags)
+        + body + "</article>"
+        + f'<aside>{related}</aside>'
+        + '<script id="__NEXT_DATA__" type="application/json">'
+        + json.dumps(next_data, ensure_ascii=False) + "</script></body></html>"
+    )
+    expected = {"title": title, "published_at": pub.isoformat(), "likes": likes, "tags": sorted(tags)}
+    return page, expected
+
+def load_corpus(path: str):
+    for f in sorted(glob.glob(os.path.join(path, "*.html"))):
+        with open(f, encoding="utf-8") as fh:
+            page = fh.read()
+        with open(f[:-len(".html")] + ".expected.json", encoding="utf-8") as fh:
+            expected = json.load(fh)
+        expected["tags"] = sorted(expected.get("tags") or [])
+        yield page, expected
+
+def _normalize(d: dict) -> dict:
+    return {"title": d.get("title"), "published_at": d.get("published_at"),
+            "likes": d.get("likes"), "tags": sorted(d.get("tags") or [])}
+
+def run(name: str, parse, corpus):
+    times, hits = [], {f: 0 for f in FIELDS}
+    for page, expected in corpus:
+        t0 = time.perf_counter()
+        got = parse(page)
+        times.append(time.perf_counter() - t0)
+        got = _normalize(got)
+        for f in FIELDS:
+            hits[f] += got[f] == expected[f]
+    times.sort()
+    n = len(corpus)
+    res = {
+        "extractor": name,
+        "pages": n,
+        "mean_us": sum(times) / n * 1e6,
+        "p50_us": times[n // 2] * 1e6,
+        "accuracy": {f: hits[f] / n for f in FIELDS},
+    }
+    acc = " ".join(f"{f}={v:.0%}" for f, v in res["accuracy"].items())
+    print(f"[extract] {name:10s} mean={res['mean_us']:.0f}us p50={res['p50_us']:.0f}us  {acc}")
+    return res
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="記事HTML抽出のベンチマーク")
+    parser.add_argument("--corpus", help="保存済み HTML のディレクトリ（*.html と *.expected.json）")
+    parser.add_argument("--pages", type=int, default=200, help="合成コーパスのページ数")
+    parser.add_argument("--json", help="結果を JSON で保存するパス")
+    args = parser.parse_args(argv)
+
+    if args.corpus:
+        corpus = list(load_corpus(args.corpus))
+    else:
+        rnd = random.Random(0)
+        corpus = [make_article_html(rnd, i) for i in range(args.pages)]
+    avg_kb = sum(len(p.encode("utf-8")) for p, _ in corpus) / len(corpus) / 1024
+    print(f"[extract] {len(corpus)} pages, avg {avg_kb:.0f} KiB")
+
+    results = [run("next_data", _parse_article_html, corpus), run("regex", _parse_article_html_regex, corpus)]
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+# bench/bench_metrics.py — metrics 再計算のベンチマーク
+# 合成DB（既定 10万記事）で、全タグ × 全バケットの metrics 行を書くところだけを比べる（どれも metrics への書き込み込み）:
+#   per-slug : 旧方式（タグ×バケットごとに COUNT/SUM と INSERT を1本ずつ）
+#   likes_sum: 現行の既定（_write_metrics。バケットごとに INSERT ... SELECT ... GROUP BY を1回）
+#   like_rate / bayes / decay: 現行の他の式（_write_metrics。バケットごとに範囲走査1回 → NumPy → executemany）
+# 表示名の同期・metrics_sources・metrics_history の書き込みはどちらにも無いので含めない。
+# --scoring を付けると、その式での上位タグも表示する。
+#
+#   python backend/bench/bench_metrics.py --articles 100000 --tags 5000
+
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import aggregator  # noqa: E402
+from aggregator import DAYS_BUCKETS, _date_str, _now_jst  # noqa: E402
+from scoring import SCORING_FORMULAS, parse_scoring  # noqa: E402
+from synth_db import build_db  # noqa: E402
+
+def legacy_recompute(conn: sqlite3.Connection):
+    """旧方式: タグごと・バケットごとに COUNT/SUM を1本ずつ"""
+    now = _now_jst()
+    today = _date_str(now)
+    slugs = [r[0] for r in conn.execute("SELECT slug FROM tools")]
+    for slug in slugs:
+        for d in DAYS_BUCKETS:
+            since_iso = (now - timedelta(days=d)).isoformat(timespec="seconds")
+            c, s = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(likes),0) FROM article_tags WHERE slug=? AND published_at >= ?",
+                (slug, since_iso),
+            ).fetchone()
+            conn.execute(
+                "INSERT OR REPLACE INTO metrics(date, days, slug, articles, likes_sum, score) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (today, d, slug, c, s, s),
+            )
+
+def current_recompute(formula: str):
+    """現行の metrics 書き込み（_write_metrics）を formula の式で"""
+    config = parse_scoring(formula)
+
+    def run(conn: sqlite3.Connection):
+        now = _now_jst()
+        aggregator._write_metrics(conn, now, _date_str(now), config)
+    return run
+
+def _timed(fn, conn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(conn)
+        conn.commit()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="metrics 再計算のベンチマーク")
+    parser.add_argument("--articles", type=int, default=100_000)
+    parser.add_argument("--tags", type=int, default=5_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--scoring", help='上位タグを表示するスコア式（例: "bayes:prior_weight=10"）')
+    args = parser.parse_args(argv)
+
+    aggregator._log = lambda *s: None  # 計測中のログを抑制
+    # 計測中に窓の境界を記事がまたがないよう、現在時刻を固定する
+    global _now_jst
+    frozen = _now_jst().replace(microsecond=0)
+    _now_jst = aggregator._now_jst = lambda: frozen
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        t0 = time.perf_counter()
+        build_db(path, args.articles, args.tags)
+        print(f"[bench] built {args.articles} articles / {args.tags} tags in {time.perf_counter() - t0:.2f}s")
+
+        conn = sqlite3.connect(path)
+        query = "SELECT slug, days, articles, likes_sum, score FROM metrics ORDER BY 1, 2"
+        legacy = _timed(legacy_recompute, conn, args.repeat)
+        expected = conn.execute(query).fetchall()
+        timings = {}
+        results = {}
+        for formula in SCORING_FORMULAS:
+            conn.execute("DELETE FROM metrics")
+            timings[formula] = _timed(current_recompute(formula), conn, args.repeat)
+            results[formula] = conn.execute(query).fetchall()
+
+        if args.scoring:
+            aggregator._recompute_metrics(conn, {}, parse_scoring(args.scoring))
+            top = conn.execute(
+                "SELECT slug, articles, likes_sum, score FROM metrics WHERE days=7 AND date=? "
+                "ORDER BY score DESC LIMIT 5", (_date_str(_now_jst()),)
+            ).fetchall()
+        conn.close()
+
+    assert results["likes_sum"] == expected, "likes_sum recompute differs from per-slug recompute"
+    for formula, rows in results.items():
+        assert [r[:4] for r in rows] == [r[:4] for r in expected], f"{formula}: articles / likes_sum differ"
+    print(f"[bench] per-slug:  {legacy * 1000:.1f} ms")
+    for formula, sec in timings.items():
+        print(f"[bench] {formula + ':':<10} {sec * 1000:.1f} ms  (x{legacy / sec:.1f})")
+    if args.scoring:
+        for r in top:
+            print(f"[bench] {args.scoring} 7d: {r}")
+
+if __name__ == "__main__":
+    main()
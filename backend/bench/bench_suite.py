@@ -0,0 +1,280 @@
+# bench/bench_suite.py — バックエンドの主要経路をまとめて計測するベンチマーク
+# ネットワークにも本物の Zenn にも依存せず、同じ入力なら同じ条件で何度でも回せる。
+#   crawl     : フィクスチャサーバー（fixture_server.py、遅延付き）に aggregate を当てる
+#               （キャッシュなし = cold と、同じ HTTP キャッシュで取り直す warm の2回）
+#   recompute : 合成DB（synth_db.py）で _recompute_metrics
+#   rankings  : 合成DBで get_rankings / get_tool_detail / query_rankings_page
+#   export    : 合成DBで build_payloads + write_payloads（dump_json.main の書き出し部分）
+# 結果は JSON に保存でき、--compare で前回の JSON と比べられる。
+#
+#   python backend/bench/bench_suite.py --articles 100000 --json /tmp/bench.json
+#   python backend/bench/bench_suite.py --db /tmp/trend_1m.db --only rankings,export --compare /tmp/bench.json
+#   python backend/bench/bench_suite.py --fixture DIR --latency-ms 80 --only crawl
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import aggregator  # noqa: E402
+from aggregator import (CRAWL_WORKERS, DAYS_BUCKETS, JST, TOOLS_CSV, RunProgress, _recompute_metrics,  # noqa: E402
+                        decode_cursor, get_rankings, get_tool_detail, query_rankings_page)
+from exporter import build_payloads, write_payloads  # noqa: E402
+from fixture_server import FixtureServer, load_manifest, recorded_at, synthesize  # noqa: E402
+from synth_db import build_db  # noqa: E402
+from telemetry import REGISTRY  # noqa: E402
+
+BENCHES = ("crawl", "recompute", "rankings", "export")
+
+def _freeze_clock(now: datetime) -> None:
+    aggregator._now_jst = lambda: now
+
+def _stats(samples: List[float]) -> Dict:
+    s = sorted(samples)
+    n = len(s)
+    return {
+        "n": n,
+        "mean_ms": round(sum(s) / n * 1000, 3),
+        "p50_ms": round(s[n // 2] * 1000, 3),
+        "p90_ms": round(s[min(n - 1, int(n * 0.9))] * 1000, 3),
+        "max_ms": round(s[-1] * 1000, 3),
+    }
+
+def _timed(fn, repeat: int) -> List[float]:
+    out = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        out.append(time.perf_counter() - t0)
+    return out
+
+# ===========================
+# crawl
+# ===========================
+def bench_crawl(fixture: str, latency_ms: float, jitter_ms: float, workers: int, stream: bool) -> Dict:
+    manifest = load_manifest(fixture)
+    _freeze_clock(recorded_at(fixture))
+    srv = FixtureServer(fixture, latency_ms=latency_ms, jitter_ms=jitter_ms).start()
+    aggregator.ZENN_BASE_URL = srv.base_url
+    aggregator.ZENN_ARTICLES_API = f"{srv.base_url}/api/articles"
+    out: Dict = {"fixture": manifest, "latency_ms": latency_ms, "jitter_ms": jitter_ms,
+                 "workers": workers, "stream_detail": stream}
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            cache_path = os.path.join(tmp, "http_cache.db")
+            for run in ("cold", "warm"):
+                progress = RunProgress()
+                since = REGISTRY.snapshot()
+                t0 = time.perf_counter()
+                aggregator.aggregate(
+                    days=30, tools_csv=TOOLS_CSV, db_path=os.path.join(tmp, f"{run}.db"),
+                    max_pages=manifest["pages"] + 1, workers=workers, rate_per_sec=0,
+                    http_cache_path=cache_path, stream_detail=stream, progress=progress,
+                )
+                elapsed = time.perf_counter() - t0
+                snap = progress.snapshot()
+                added = snap["counters"].get("articles_added", 0)
+                out[run] = {
+                    "elapsed_sec": round(elapsed, 3),
+                    "articles_added": added,
+                    "articles_per_sec": round(added / elapsed, 2) if elapsed else 0.0,
+                    "server": srv.reset_counts(),
+                    "phases_sec": snap["phases_sec"],
+                    "telemetry": REGISTRY.report(since),
+                }
+                print(f"[suite] crawl {run}: {added} articles in {elapsed:.2f}s "
+                      f"({out[run]['articles_per_sec']:.1f}/s, requests={out[run]['server']['requests']})")
+    finally:
+        srv.stop()
+    return out
+
+# ===========================
+# 合成DB上のベンチ
+# ===========================
+def _freeze_to_db(db_path: str) -> None:
+    """合成DBを作った時刻（最新記事の公開日時）に固定し、作ってからの経過で窓がずれないようにする"""
+    conn = sqlite3.connect(db_path)
+    try:
+        latest = conn.execute("SELECT MAX(published_at) FROM articles").fetchone()[0]
+        has_metrics = conn.execute("SELECT 1 FROM metrics LIMIT 1").fetchone() is not None
+    finally:
+        conn.close()
+    _freeze_clock(datetime.fromisoformat(latest) if latest else datetime.now(JST))
+    if not has_metrics:
+        _recompute(db_path)
+
+def _recompute(db_path: str) -> None:
+    conn = sqlite3.connect(db_path)
+    try:
+        _recompute_metrics(conn, {})
+        conn.commit()
+    finally:
+        conn.close()
+
+def bench_recompute(db_path: str, repeat: int) -> Dict:
+    res = _stats(_timed(lambda: _recompute(db_path), repeat))
+    print(f"[suite] recompute: p50={res['p50_ms']:.1f}ms")
+    return res
+
+def bench_rankings(db_path: str, repeat: int) -> Dict:
+    out: Dict = {}
+    for d in DAYS_BUCKETS:
+        out[f"rankings_{d}"] = _stats(_timed(lambda: get_rankings(d, db_path=db_path), repeat))
+    slugs = [r["slug"] for r in get_rankings(30, limit=20, db_path=db_path, top_n=0)]
+    samples = []
+    for slug in slugs:
+        samples += _timed(lambda: get_tool_detail(slug, 30, db_path=db_path), repeat)
+    out["tool_detail_30"] = _stats(samples or [0.0])
+
+    conn = aggregator._connect_read(db_path)
+    try:
+        def walk():
+            after = None
+            while True:
+                page = query_rankings_page(conn, 30, limit=100, after=after, include_articles=False)
+                if not page["next_cursor"]:
+                    return
+                after = decode_cursor(page["next_cursor"])
+        out["rankings_page_walk_30"] = _stats(_timed(walk, repeat))
+    finally:
+        conn.close()
+    for k, v in out.items():
+        print(f"[suite] {k}: p50={v['p50_ms']:.2f}ms p90={v['p90_ms']:.2f}ms")
+    return out
+
+def bench_export(db_path: str, repeat: int, precompress: bool) -> Dict:
+    build, write, rewrite = [], [], []
+    files = size = 0
+    for _ in range(repeat):
+        with tempfile.TemporaryDirectory() as out_dir:
+            t0 = time.perf_counter()
+            payloads = build_payloads(db_path)
+            t1 = time.perf_counter()
+            res = write_payloads(out_dir, payloads, precompress=precompress)
+            t2 = time.perf_counter()
+            write_payloads(out_dir, payloads, precompress=precompress)   # 内容が同じ2回目（差分書き出し）
+            t3 = time.perf_counter()
+        build.append(t1 - t0)
+        write.append(t2 - t1)
+        rewrite.append(t3 - t2)
+        files = len(payloads)
+        size = sum(e.get("size", 0) for e in res["sizes"].values())
+    out = {"files": files, "bytes": size, "precompress": precompress,
+           "build": _stats(build), "write": _stats(write), "rewrite_unchanged": _stats(rewrite)}
+    print(f"[suite] export: {files} files / {size / 1024:.0f} KiB, build p50={out['build']['p50_ms']:.1f}ms "
+          f"write p50={out['write']['p50_ms']:.1f}ms unchanged p50={out['rewrite_unchanged']['p50_ms']:.1f}ms")
+    return out
+
+# ===========================
+# 比較
+# ===========================
+def _flatten(d: Dict, prefix: str = "") -> Dict[str, float]:
+    out: Dict[str, float] = {}
+    for k, v in d.items():
+        key = f"{prefix}{k}"
+        if isinstance(v, dict) and k not in ("telemetry", "fixture", "server"):
+            out.update(_flatten(v, key + "."))
+        elif (isinstance(v, (int, float)) and not isinstance(v, bool) and k.endswith(("_ms", "_sec"))
+              and k not in ("latency_ms", "jitter_ms")):
+            out[key] = float(v)
+    return out
+
+def compare(base: Dict, cur: Dict) -> None:
+    """時間の項目（*_ms / *_sec）を並べ、前回比（cur / base）を表示する"""
+    b, c = _flatten(base.get("results", {})), _flatten(cur.get("results", {}))
+    for key in sorted(set(b) & set(c)):
+        if b[key] > 0:
+            print(f"[compare] {key}: {b[key]:.3f} -> {c[key]:.3f} (x{c[key] / b[key]:.2f})")
+
+def _git_rev() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except Exception:
+        return None
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="バックエンドのベンチマーク一式")
+    parser.add_argument("--only", default=",".join(BENCHES), help=f"実行するベンチ（カンマ区切り: {','.join(BENCHES)}）")
+    parser.add_argument("--db", help="既存の合成DB（synth_db.py で作ったもの）。計測中に metrics を書き換える")
+    parser.add_argument("--articles", type=int, default=100_000, help="--db 無しのとき作る合成DBの記事数")
+    parser.add_argument("--tags", type=int, default=5_000)
+    parser.add_argument("--skew", type=float, default=1.0)
+    parser.add_argument("--fixture", help="フィクスチャのディレクトリ（無ければ合成して使う）")
+    parser.add_argument("--fixture-pages", type=int, default=3, help="合成フィクスチャのページ数")
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--jitter-ms", type=float, default=20.0)
+    parser.add_argument("--workers", type=int, default=CRAWL_WORKERS)
+    parser.add_argument("--full-html", action="store_true", help="記事HTMLを最後まで読む")
+    parser.add_argument("--precompress", action="store_true", help="書き出しで .gz / .br も作る")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", help="結果を JSON で保存するパス")
+    parser.add_argument("--compare", help="比較する前回の JSON")
+    args = parser.parse_args(argv)
+
+    only = [b.strip() for b in args.only.split(",") if b.strip()]
+    unknown = set(only) - set(BENCHES)
+    if unknown:
+        parser.error(f"unknown bench: {', '.join(sorted(unknown))}")
+
+    aggregator._log = lambda *s: None  # 計測中のログを抑制
+    real_now = aggregator._now_jst
+    results: Dict = {}
+    tmp = tempfile.mkdtemp(prefix="bench_suite_")
+    try:
+        if "crawl" in only:
+            fixture = args.fixture
+            if not fixture:
+                fixture = os.path.join(tmp, "fixture")
+                synthesize(fixture, args.fixture_pages)
+            results["crawl"] = bench_crawl(fixture, args.latency_ms, args.jitter_ms, args.workers,
+                                           stream=not args.full_html)
+
+        db_benches = [b for b in only if b != "crawl"]
+        if db_benches:
+            db_path = args.db
+            if not db_path:
+                aggregator._now_jst = real_now
+                db_path = os.path.join(tmp, "trend.db")
+                t0 = time.perf_counter()
+                build_db(db_path, args.articles, args.tags, skew=args.skew)
+                print(f"[suite] built {args.articles} articles / {args.tags} tags in {time.perf_counter() - t0:.1f}s")
+            _freeze_to_db(db_path)
+            if "recompute" in db_benches:
+                results["recompute"] = bench_recompute(db_path, args.repeat)
+            if "rankings" in db_benches:
+                results["rankings"] = bench_rankings(db_path, args.repeat)
+            if "export" in db_benches:
+                results["export"] = bench_export(db_path, args.repeat, args.precompress)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    doc = {
+        "meta": {
+            "git": _git_rev(),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "at": real_now().isoformat(timespec="seconds"),
+            "args": vars(args),
+        },
+        "results": results,
+    }
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(doc, f, ensure_ascii=False, indent=2)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(json.load(f), doc)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+# bench/fixture_server.py — Zenn の一覧API・記事HTMLを保存済みフィクスチャから返すスタブサーバー
+# クロールのベンチマークを本物の Zenn に当てずに、同じ応答・指定した遅延で何度でも再現するためのもの。
+#
+#   python backend/bench/fixture_server.py record DIR --pages 3        # 本物（ZENN_BASE_URL）から保存
+#   python backend/bench/fixture_server.py synth DIR --pages 5         # 合成（bench_extract の記事HTML）
+#   python backend/bench/fixture_server.py serve DIR --port 8765 --latency-ms 80 --jitter-ms 40
+#   ZENN_BASE_URL=http://127.0.0.1:8765 python backend/dump_json.py ...
+#
+# フィクスチャの構成:
+#   DIR/manifest.json              {"recorded_at", "source", "pages", "articles"}
+#   DIR/api/articles/page-N.json   /api/articles?order=latest&page=N の本文そのまま
+#   DIR/html/<記事パス>.html        /<user>/articles/<slug> の本文そのまま
+# 保存時点の記事は時間が経つと保持期間（31日）から外れるため、再生側は recorded_at に時刻を固定して使う。
+
+import argparse
+import hashlib
+import json
+import os
+import random
+import sys
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from aggregator import USER_AGENT, ZENN_ARTICLES_API, ZENN_BASE_URL, _now_jst  # noqa: E402
+
+EMPTY_PAGE = b'{"articles":[],"next_page":null}'
+
+def _list_path(root: str, page: int) -> str:
+    return os.path.join(root, "api", "articles", f"page-{page}.json")
+
+def _html_path(root: str, article_path: str) -> str:
+    return os.path.join(root, "html", *article_path.strip("/").split("/")) + ".html"
+
+def _write(path: str, data: bytes) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+
+def _write_manifest(root: str, source: str, pages: int, articles: int, recorded_at: Optional[str] = None) -> None:
+    manifest = {
+        "recorded_at": recorded_at or _now_jst().isoformat(timespec="seconds"),
+        "source": source,
+        "pages": pages,
+        "articles": articles,
+    }
+    _write(os.path.join(root, "manifest.json"), json.dumps(manifest, ensure_ascii=False, indent=2).encode("utf-8"))
+
+def load_manifest(root: str) -> Dict:
+    with open(os.path.join(root, "manifest.json"), encoding="utf-8") as f:
+        return json.load(f)
+
+def recorded_at(root: str) -> datetime:
+    """フィクスチャを保存した時刻（再生時に aggregator の現在時刻をこれに固定する）"""
+    return datetime.fromisoformat(load_manifest(root)["recorded_at"])
+
+# ===========================
+# 保存（本物から / 合成）
+# ===========================
+def record(root: str, pages: int, sleep_sec: float = 0.5) -> int:
+    """ZENN_BASE_URL の一覧API pages ページ分と、載っている記事の HTML を保存する"""
+    import requests
+
+    headers = {"User-Agent": USER_AGENT}
+    n = 0
+    for page in range(1, pages + 1):
+        r = requests.get(ZENN_ARTICLES_API, params={"order": "latest", "page": page}, headers=headers, timeout=15)
+        r.raise_for_status()
+        _write(_list_path(root, page), r.content)
+        for it in r.json().get("articles") or []:
+            path = it.get("path") or ""
+            if not path.startswith("/"):
+                continue
+            time.sleep(sleep_sec)
+            a = requests.get(f"{ZENN_BASE_URL}{path}", headers=headers, timeout=15)
+            if a.status_code == 200:
+                _write(_html_path(root, path), a.content)
+                n += 1
+        print(f"[fixture] page={page} articles={n}")
+        time.sleep(sleep_sec)
+    _write_manifest(root, ZENN_BASE_URL, pages, n)
+    return n
+
+def synthesize(root: str, pages: int, per_page: int = 48, seed: int = 0) -> int:
+    """bench_extract.make_article_html の記事で、新しい順に並んだ一覧と記事HTMLを作る"""
+    from bench_extract import make_article_html
+
+    rnd = random.Random(seed)
+    arts = []
+    for i in range(pages * per_page):
+        html, expected = make_article_html(rnd, i)
+        arts.append((expected, f"/user{i % 97}/articles/synth{i}", html))
+    arts.sort(key=lambda a: a[0]["published_at"], reverse=True)
+
+    for page in range(1, pages + 1):
+        chunk = arts[(page - 1) * per_page:page * per_page]
+        items = [{
+            "id": int(path.rsplit("synth", 1)[1]),
+            "path": path,
+            "title": expected["title"],
+            "liked_count": expected["likes"],
+            "published_at": expected["published_at"],
+            "topics": [{"id": t, "name": t} for t in expected["tags"]],
+        } for expected, path, _ in chunk]
+        body = {"articles": items, "next_page": page + 1 if page < pages else None}
+        _write(_list_path(root, page), json.dumps(body, ensure_ascii=False).encode("utf-8"))
+        for _, path, html in chunk:
+            _write(_html_path(root, path), html.encode("utf-8"))
+    _write_manifest(root, "synthetic", pages, len(arts))
+    return len(arts)
+
+# ===========================
+# 再生
+# ===========================
+class FixtureServer:
+    """
+    フィクスチャを返す HTTP サーバー（別スレッドで起動）。
+    - 応答ごとに latency_ms ± jitter_ms だけ待つ（同じ seed なら同じ遅延列）
+    - ETag を付け、If-None-Match が一致すれば 304
+    - 保存していないページは空の一覧、記事は 404
+    counts にリクエスト数・304 の数・返したバイト数を数える。
+    """
+
+    def __init__(self, root: str, port: int = 0, latency_ms: float = 0.0, jitter_ms: float = 0.0, seed: int = 0):
+        self.root = root
+        self.latency = latency_ms / 1000.0
+        self.jitter = jitter_ms / 1000.0
+        self._rnd = random.Random(seed)
+        self._lock = threading.Lock()
+        self._cache: Dict[str, Optional[bytes]] = {}
+        self.counts = {"requests": 0, "not_modified": 0, "bytes": 0}
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self._httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _delay(self) -> float:
+        with self._lock:
+            return max(0.0, self.latency + self._rnd.uniform(-self.jitter, self.jitter))
+
+    def _body(self, path: str) -> Optional[bytes]:
+        with self._lock:
+            if path in self._cache:
+                return self._cache[path]
+        try:
+            with open(path, "rb") as f:
+                data: Optional[bytes] = f.read()
+        except FileNotFoundError:
+            data = None
+        with self._lock:
+            self._cache[path] = data
+        return data
+
+    def resolve(self, url_path: str, query: str) -> Tuple[Optional[bytes], str]:
+        if url_path == "/api/articles":
+            page = int((parse_qs(query).get("page") or ["1"])[0])
+            return self._body(_list_path(self.root, page)) or EMPTY_PAGE, "application/json"
+        return self._body(_html_path(self.root, url_path)), "text/html; charset=utf-8"
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"   # keep-alive（クローラーの接続プールを効かせる）
+
+            def log_message(self, *args):
+                pass
+
+            def handle(self):
+                try:
+                    super().handle()
+                except (BrokenPipeError, ConnectionResetError):
+                    pass   # ストリーミング取得は必要な所まで読んだら切る
+
+            def do_GET(self):
+                u = urlsplit(self.path)
+                body, ctype = server.resolve(u.path, u.query)
+                time.sleep(server._delay())
+                if body is None:
+                    self._send(404, b"not found", "text/plain", None)
+                    return
+                etag = '"' + hashlib.md5(body).hexdigest() + '"'
+                if self.headers.get("If-None-Match") == etag:
+                    self._send(304, b"", None, etag)
+                    return
+                self._send(200, body, ctype, etag)
+
+            def _send(self, status: int, body: bytes, ctype: Optional[str], etag: Optional[str]):
+                with server._lock:
+                    server.counts["requests"] += 1
+                    server.counts["not_modified"] += status == 304
+                    server.counts["bytes"] += len(body)
+                self.send_response(status)
+                if ctype:
+                    self.send_header("Content-Type", ctype)
+                if etag:
+                    self.send_header("ETag", etag)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
+
+    def start(self) -> "FixtureServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def reset_counts(self) -> Dict[str, int]:
+        with self._lock:
+            counts, self.counts = self.counts, {"requests": 0, "not_modified": 0, "bytes": 0}
+        return counts
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Zenn フィクスチャの保存・再生")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("record", help="ZENN_BASE_URL から保存する")
+    p.add_argument("dir")
+    p.add_argument("--pages", type=int, default=3)
+    p.add_argument("--sleep", type=float, default=0.5, help="リクエスト間隔（秒）")
+    p = sub.add_parser("synth", help="合成フィクスチャを作る")
+    p.add_argument("dir")
+    p.add_argument("--pages", type=int, default=5)
+    p.add_argument("--per-page", type=int, default=48)
+    p.add_argument("--seed", type=int, default=0)
+    p = sub.add_parser("serve", help="フィクスチャを返すサーバーを起動する")
+    p.add_argument("dir")
+    p.add_argument("--port", type=int, default=8765)
+    p.add_argument("--latency-ms", type=float, default=0.0)
+    p.add_argument("--jitter-ms", type=float, default=0.0)
+    args = parser.parse_args(argv)
+
+    if args.cmd == "record":
+        record(args.dir, args.pages, args.sleep)
+    elif args.cmd == "synth":
+        n = synthesize(args.dir, args.pages, args.per_page, args.seed)
+        print(f"[fixture] {args.dir}: {args.pages} pages / {n} articles")
+    else:
+        srv = FixtureServer(args.dir, args.port, args.latency_ms, args.jitter_ms).start()
+        print(f"[fixture] serving {args.dir} at {srv.base_url} (recorded_at={recorded_at(args.dir).isoformat()})")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            srv.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+# bench/load_test.py — 読み出しAPIの簡易負荷試験（標準ライブラリのみ）
+# 起動済みのサーバーに対し、並列スレッドから keep-alive で GET を投げ続け、
+# p50 / p99 レイテンシと RPS を表示する。
+#
+#   uvicorn main:app --port 8000                                  # プール + キャッシュ（現行）
+#   READ_POOL_SIZE=0 API_CACHE_SIZE=0 uvicorn main:app --port 8001  # 毎回接続・キャッシュ無し（従来相当）
+#   python backend/bench/load_test.py --url http://127.0.0.1:8000 --duration 10 --concurrency 16
+
+import argparse
+import http.client
+import json
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+DEFAULT_PATHS = (
+    "/rankings?days=30", "/rankings?days=7", "/rankings?days=1",
+    "/stats?days=30", "/stats?days=7",
+)
+
+def _percentile(sorted_vals, q: float) -> float:
+    if not sorted_vals:
+        return 0.0
+    i = min(len(sorted_vals) - 1, int(round(q * (len(sorted_vals) - 1))))
+    return sorted_vals[i]
+
+def _discover_tool_paths(url: str, days: int = 30, n: int = 20):
+    """ランキング上位のタグ詳細パスを追加する"""
+    u = urlsplit(url)
+    conn = http.client.HTTPConnection(u.hostname, u.port or 80, timeout=30)
+    try:
+        conn.request("GET", f"/rankings?days={days}")
+        rows = json.loads(conn.getresponse().read() or b"[]")
+        return [f"/tool/{r['slug']}?days={days}" for r in rows[:n]]
+    except Exception:
+        return []
+    finally:
+        conn.close()
+
+def run(url: str, paths, duration: float, concurrency: int):
+    u = urlsplit(url)
+    deadline = time.perf_counter() + duration
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+
+    def worker(seed: int):
+        rnd = random.Random(seed)
+        conn = http.client.HTTPConnection(u.hostname, u.port or 80, timeout=30)
+        local, errs = [], 0
+        while time.perf_counter() < deadline:
+            path = rnd.choice(paths)
+            t0 = time.perf_counter()
+            try:
+                conn.request("GET", path)
+                resp = conn.getresponse()
+                resp.read()
+                if resp.status != 200:
+                    errs += 1
+            except Exception:
+                errs += 1
+                conn.close()
+                conn = http.client.HTTPConnection(u.hostname, u.port or 80, timeout=30)
+                continue
+            local.append(time.perf_counter() - t0)
+        conn.close()
+        with lock:
+            latencies.extend(local)
+            errors[0] += errs
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - t0
+
+    latencies.sort()
+    return {
+        "url": url,
+        "requests": len(latencies),
+        "errors": errors[0],
+        "rps": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": _percentile(latencies, 0.50) * 1000,
+        "p99_ms": _percentile(latencies, 0.99) * 1000,
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="読み出しAPIの簡易負荷試験")
+    parser.add_argument("--url", action="append", required=True,
+                        help="対象サーバー（複数指定で順に計測して比較）")
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--json", help="結果を JSON で保存するパス")
+    args = parser.parse_args(argv)
+
+    results = []
+    for url in args.url:
+        paths = list(DEFAULT_PATHS) + _discover_tool_paths(url)
+        res = run(url, paths, args.duration, args.concurrency)
+        results.append(res)
+        print(f"[load] {url}: {res['requests']} req, {res['rps']:.0f} rps, "
+              f"p50={res['p50_ms']:.2f}ms p99={res['p99_ms']:.2f}ms errors={res['errors']}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+# bench/synth_db.py — ベンチマーク用の合成 trend.db を作る
+# 直近31日に n 記事（1万〜100万程度）を一様に散らし、タグは Zipf 分布（上位タグほど多い）、
+# 1記事あたりのタグ数は 1〜5（2〜3 が多い）、いいねはパレート分布（大半が 0〜数件、まれに大きい）。
+# 同じ seed なら同じ DB になる。--recompute を付けると metrics も作る（ランキング・書き出しのベンチ用）。
+#
+#   python backend/bench/synth_db.py --out /tmp/trend_1m.db --articles 1000000 --tags 20000 --recompute
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import time
+from datetime import timedelta
+from itertools import accumulate
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import aggregator  # noqa: E402
+from aggregator import RETENTION_DAYS, init_db  # noqa: E402
+
+BATCH = 50_000                               # executemany 1回あたりの記事数
+TAGS_PER_ARTICLE = (1, 2, 3, 4, 5)
+TAGS_PER_ARTICLE_WEIGHTS = (20, 30, 27, 15, 8)
+
+def build_db(path: str, n_articles: int, n_tags: int, seed: int = 0, skew: float = 1.0):
+    """
+    直近31日に n_articles 記事、1記事1〜5タグ（i 番目のタグの重み 1/(i+1)^skew）の合成DBを作る。
+    既存の path には追記する（空のファイルか存在しないパスを渡す想定）。
+    """
+    rnd = random.Random(seed)
+    init_db(path)
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA synchronous=OFF")
+    now = aggregator._now_jst()   # 呼び出し側で時刻を固定していればそれに合わせる
+    span = RETENTION_DAYS * 86400
+    slugs = [f"tag{i}" for i in range(n_tags)]
+    cum_weights = list(accumulate(1.0 / (i + 1) ** skew for i in range(n_tags)))
+    conn.executemany("INSERT INTO tools(slug, name) VALUES (?, ?)", [(s, s) for s in slugs])
+
+    for start in range(1, n_articles + 1, BATCH):
+        articles, tags = [], []
+        for i in range(start, min(start + BATCH, n_articles + 1)):
+            pub = (now - timedelta(seconds=rnd.randint(0, span))).isoformat(timespec="seconds")
+            likes = int(rnd.paretovariate(1.2)) - 1
+            articles.append((i, f"title {i}", f"https://zenn.dev/u/articles/{i}", likes, pub))
+            k = rnd.choices(TAGS_PER_ARTICLE, TAGS_PER_ARTICLE_WEIGHTS)[0]
+            for slug in set(rnd.choices(slugs, cum_weights=cum_weights, k=k)):
+                tags.append((i, slug, pub, likes))
+        conn.executemany("INSERT INTO articles(id, title, url, likes, published_at) VALUES (?,?,?,?,?)", articles)
+        conn.executemany("INSERT INTO article_tags(article_id, slug, published_at, likes) VALUES (?,?,?,?)", tags)
+        conn.commit()
+    conn.close()
+
+def recompute(path: str) -> None:
+    """metrics（と metrics_history）を現行の _recompute_metrics で作る"""
+    conn = sqlite3.connect(path)
+    try:
+        aggregator._recompute_metrics(conn, {})
+        conn.commit()
+    finally:
+        conn.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="ベンチマーク用の合成 trend.db を作る")
+    parser.add_argument("--out", required=True, help="出力先（既存なら上書き）")
+    parser.add_argument("--articles", type=int, default=100_000)
+    parser.add_argument("--tags", type=int, default=5_000)
+    parser.add_argument("--skew", type=float, default=1.0, help="タグの Zipf 指数（大きいほど上位に偏る）")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--recompute", action="store_true", help="metrics も作る")
+    args = parser.parse_args(argv)
+
+    aggregator._log = lambda *s: None
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(args.out + suffix):
+            os.remove(args.out + suffix)
+    t0 = time.perf_counter()
+    build_db(args.out, args.articles, args.tags, seed=args.seed, skew=args.skew)
+    if args.recompute:
+        recompute(args.out)
+    size_mb = os.path.getsize(args.out) / 1024 / 1024
+    print(f"[synth] {args.out}: {args.articles} articles / {args.tags} tags, "
+          f"{size_mb:.1f} MiB in {time.perf_counter() - t0:.1f}s")
+
+if __name__ == "__main__":
+    main()
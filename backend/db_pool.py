@@ -0,0 +1,88 @@
+# db_pool.py — 読み出し専用 SQLite 接続のプール（FastAPI の読み出し系で共有）
+# - file:...?mode=ro で開き、PRAGMA query_only / mmap_size を設定
+# - WAL（SCHEMA_SQL で有効化済み）なので、集計中の書き込みと並行して読める
+# - size=0 ならプールせず毎回接続する（比較計測用）
+
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Iterator
+
+from aggregator import DB_PATH
+
+READ_POOL_SIZE = int(os.getenv("READ_POOL_SIZE", "8"))
+READ_MMAP_SIZE = int(os.getenv("READ_MMAP_SIZE", str(256 * 1024 * 1024)))
+
+def connect_readonly(db_path: str = DB_PATH, mmap_size: int = READ_MMAP_SIZE) -> sqlite3.Connection:
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA query_only=ON")
+    conn.execute(f"PRAGMA mmap_size={int(mmap_size)}")
+    return conn
+
+class ReadPool:
+    """
+    最大 size 本の読み出し専用接続を使い回す。
+    connection() は空きが無ければ返却を待つ（接続は必要になった時点で作る）。
+    """
+
+    def __init__(self, db_path: str = DB_PATH, size: int = READ_POOL_SIZE, mmap_size: int = READ_MMAP_SIZE):
+        self.db_path = db_path
+        self.size = size
+        self.mmap_size = mmap_size
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _acquire(self) -> sqlite3.Connection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                try:
+                    return connect_readonly(self.db_path, self.mmap_size)
+                except Exception:
+                    self._created -= 1
+                    raise
+        return self._idle.get()
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        if self.size <= 0:
+            conn = connect_readonly(self.db_path, self.mmap_size)
+            try:
+                yield conn
+            finally:
+                conn.close()
+            return
+
+        conn = self._acquire()
+        broken = False
+        try:
+            yield conn
+        except sqlite3.DatabaseError:
+            broken = True
+            raise
+        finally:
+            # 本体がどんな例外で抜けても必ず返す（返さないと空き待ちの _acquire() が永久に止まる）
+            if broken:
+                # 壊れた可能性のある接続は捨てる
+                conn.close()
+                with self._lock:
+                    self._created -= 1
+            else:
+                self._idle.put(conn)
+
+    def close(self) -> None:
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+            with self._lock:
+                self._created -= 1
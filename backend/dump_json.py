@@ -1,44 +1,106 @@
 # backend/dump_json.py
-import os, json
-from aggregator import aggregate, get_rankings, get_stats, get_tool_detail
+import os, argparse, json, time
+from aggregator import aggregate, refresh_likes, retag, CRAWL_WORKERS, RATE_PER_SEC, RunProgress, _now_jst
+from exporter import build_payloads, write_payloads
+from telemetry import EXPORT_SECONDS, REGISTRY
 
 ROOT = os.path.dirname(os.path.dirname(__file__))
 OUT_DIR   = os.path.join(ROOT, "frontend", "web", "api")
-TOOLS_DIR = os.path.join(OUT_DIR, "tools")
 
-def dump(path, obj):
-    os.makedirs(os.path.dirname(path), exist_ok=True)
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(obj, f, ensure_ascii=False, indent=2)
-
-def _sanitize_slug(s: str) -> str:
-    import re
-    return re.sub(r"[^a-z0-9\-_]", "-", (s or "").lower())
-
-def main():
-    # 集計（必要に応じて max_pages を増やす）
-    aggregate(days=30, max_pages=100)
-
-    # ランキング & 統計
-    for d in (30, 7, 1):
-        dump(os.path.join(OUT_DIR, f"rankings_{d}.json"), get_rankings(d))
-        dump(os.path.join(OUT_DIR, f"stats_{d}.json"),    get_stats(d))
-
-    # ここから “詳細ページ用 JSON” を静的化 ーーーーーーーーーーー
-    total = 0
-    for d in (30, 7, 1):
-        top = get_rankings(d, limit=200)          # 期間ごとの上位から生成
-        if not top:
+def _print_size_report(sizes, verbose=False):
+    """ファイルごとのサイズ（raw / gz / br）。tools/ は verbose 時以外は合計のみ"""
+    def fmt(e):
+        return " ".join(f"{k}={e[k]}" for k in ("size", "gz_size", "br_size") if k in e)
+    totals = {}
+    for rel, e in sorted(sizes.items()):
+        if rel.startswith("tools/") and not verbose:
+            for k in ("size", "gz_size", "br_size"):
+                if k in e:
+                    totals[k] = totals.get(k, 0) + e[k]
             continue
-        for r in top:
-            slug = _sanitize_slug(r.get("slug", ""))
-            if not slug:
-                continue
-            detail = get_tool_detail(slug, d)
-            dump(os.path.join(TOOLS_DIR, f"{slug}-{d}.json"), detail)
-            total += 1
-    print(f"[dump_json] wrote {total} tool detail files under /api/tools")
-    # ーーーーーーーーーーーーーーーーーーーーーーーーーーーーーーー
+        print(f"[size] {rel}: {fmt(e)}")
+    if totals:
+        print(f"[size] tools/*: {fmt(totals)}")
+
+def _write_run_report(path, args, started_at, t0, since, progress, result, export):
+    """この実行1回分の計測（フェーズ時間・カウンタ・各ヒストグラムの分布）を JSON で保存する"""
+    report = {
+        "started_at": started_at,
+        "finished_at": _now_jst().isoformat(timespec="seconds"),
+        "elapsed_sec": round(time.perf_counter() - t0, 3),
+        "args": vars(args),
+        "result": result,
+        "progress": progress.snapshot(),
+        "export": export,
+        "metrics": REGISTRY.report(since),
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"[dump_json] run report -> {path}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="集計して frontend/web/api に静的JSONを書き出す")
+    parser.add_argument("--refresh-likes", action="store_true",
+                        help="記事HTMLは取得せず、既存記事のいいね数だけ一覧APIで更新する")
+    parser.add_argument("--pretty", action="store_true",
+                        help="indent=2 で書き出す（既定はコンパクト）")
+    parser.add_argument("--skip-aggregate", action="store_true",
+                        help="集計せず、現在のDBから書き出しだけ行う")
+    parser.add_argument("--retag", action="store_true",
+                        help="クロールせず、tag_aliases.csv の別名タグを既存データで正規 slug に付け替えてから書き出す")
+    parser.add_argument("--out-dir", default=OUT_DIR, help="出力先（既定: frontend/web/api）")
+    parser.add_argument("--precompress", action="store_true",
+                        help="minify した JSON に加え .gz / .br を併置する")
+    parser.add_argument("--size-report", action="store_true",
+                        help="tools/ 配下も含め全ファイルのサイズを表示する")
+    parser.add_argument("--scoring", default=None,
+                        help='スコア式（likes_sum / decay / like_rate / bayes。例: "decay:half_life_days=3"）')
+    parser.add_argument("--full-html", action="store_true",
+                        help="記事HTMLを最後まで読む（既定は必要な項目が揃った時点で打ち切る）")
+    parser.add_argument("--sources", default=None,
+                        help='取得元（カンマ区切り。例: "zenn,qiita"。既定は CRAWL_SOURCES 環境変数 / zenn）')
+    parser.add_argument("--run-report", default=None, metavar="PATH",
+                        help="取得・解析・SQL・書き出しの所要時間と件数の分布を JSON で書き出す")
+    args = parser.parse_args(argv)
+
+    started_at = _now_jst().isoformat(timespec="seconds")
+    t_run = time.perf_counter()
+    since = REGISTRY.snapshot()
+    progress = RunProgress()
+    result = None
+
+    if args.refresh_likes:
+        # 軽量更新（一覧APIのみ）
+        result = refresh_likes(max_pages=100, rate_per_sec=RATE_PER_SEC, scoring=args.scoring,
+                               sources=args.sources, progress=progress)
+    elif args.retag:
+        # 別名表の変更だけ反映（aggregate も毎回付け替えるので、クロールを待たずに反映したいとき用）
+        result = retag(scoring=args.scoring)
+        print(f"[dump_json] retag: {result}")
+    elif not args.skip_aggregate:
+        # 集計（必要に応じて max_pages を増やす）
+        result = aggregate(days=30, max_pages=100, workers=CRAWL_WORKERS, rate_per_sec=RATE_PER_SEC,
+                           stream_detail=not args.full_html, scoring=args.scoring, sources=args.sources,
+                           progress=progress)
+
+    # ランキング & 統計 & “詳細ページ用 JSON” を1接続でまとめて生成して静的化
+    t0 = time.perf_counter()
+    with EXPORT_SECONDS.time(stage="build"):
+        payloads = build_payloads()
+    with EXPORT_SECONDS.time(stage="write"):
+        res = write_payloads(args.out_dir, payloads, pretty=args.pretty and not args.precompress,
+                             precompress=args.precompress)
+    total = sum(1 for rel in payloads if rel.startswith("tools/"))
+    print(f"[dump_json] {total} tool detail files under /api/tools "
+          f"(written={res['written']} unchanged={res['unchanged']} removed={res['removed']}, "
+          f"{time.perf_counter() - t0:.2f}s)")
+    _print_size_report(res["sizes"], verbose=args.size_report)
+
+    if args.run_report:
+        export = {"files": len(payloads), "written": res["written"], "unchanged": res["unchanged"],
+                  "removed": res["removed"], "bytes": sum(e.get("size", 0) for e in res["sizes"].values())}
+        _write_run_report(args.run_report, args, started_at, t_run, since, progress, result, export)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,232 @@
+# exporter.py — frontend/web/api 用の静的JSONを1接続でまとめて組み立てる
+# - バケットごとに上位 DETAIL_LIMIT タグ × Top10 記事を1クエリで取得し、
+#   rankings_{d}.json / stats_{d}.json / tools/{slug}-{d}.json の中身をすべてメモリ上で生成
+# - search_index.json（タグ検索用。slug / 表示名 / score / 別名）
+# - trends_{d}.json（順位変化・伸び率）と tools/{slug}-{d}-history.json（推移）は metrics_history だけから作る
+# - rankings は上位 RANKINGS_LIMIT 件・Top5 に切り詰める（get_rankings と同じ内容）
+# - 記事のあるタグ全件は rankings_{d}_page{n}.json に PAGE_SIZE 件ずつ分割（keyset で順に取得）
+# - エンコードは既定でコンパクト。pretty=True なら従来の indent=2 と同じバイト列
+# - 書き出しは内容ハッシュが変わったファイルだけ（一時ファイル→rename で原子的に置換）
+#   ランキング外に落ちたタグの詳細ファイルは削除し、manifest.json にハッシュとサイズを記録
+# - precompress=True で各ファイルの .gz / .br（最大圧縮）も併置
+
+import gzip
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+from typing import Any, Dict, Tuple
+from urllib.parse import quote
+
+from aggregator import (DB_PATH, count_rankings, decode_cursor, query_history, query_rankings, query_rankings_page,
+                        query_search_index, query_sources_by_slug, query_stats, query_trends, tool_detail_json)
+
+try:
+    import brotli
+except ImportError:  # brotli は任意（無ければ .br は作らない）
+    brotli = None
+
+MANIFEST_NAME = "manifest.json"
+
+def _default_file_mode() -> int:
+    """open() で新規作成したときと同じパーミッション（0666 から umask を引いたもの）"""
+    # umask は設定しないと読めないので、読んだらすぐ戻す（import 時に1回だけ）
+    mask = os.umask(0)
+    os.umask(mask)
+    return 0o666 & ~mask
+
+FILE_MODE = _default_file_mode()   # mkstemp は 0600 で作るので、置換前にこれに揃える
+PRECOMPRESS_SUFFIXES = (".gz", ".br")
+
+EXPORT_BUCKETS = (30, 7, 1)
+RANKINGS_LIMIT = 100   # rankings_{d}.json のタグ数
+RANKINGS_TOP_N = 5     # rankings_{d}.json の各タグ記事数
+DETAIL_LIMIT = 200     # tools/{slug}-{d}.json を作るタグ数
+DETAIL_TOP_N = 10      # tools/{slug}-{d}.json の記事数
+HISTORY_RANGE_DAYS = 365  # tools/{slug}-{d}-history.json に載せる期間
+PAGE_SIZE = 50         # rankings_{d}_page{n}.json の1ファイルあたりのタグ数
+
+_COMPACT = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+_PRETTY = json.JSONEncoder(ensure_ascii=False, indent=2)
+
+def encode(obj: Any, pretty: bool = False) -> bytes:
+    return (_PRETTY if pretty else _COMPACT).encode(obj).encode("utf-8")
+
+def slug_filename(slug: str) -> str:
+    """
+    tools/{slug}-{d}.json のファイル名部分。Dart の Uri.encodeComponent と同じく英数字と -_.!~*'() 以外を
+    パーセントエンコードする（unquote で元の slug に戻せるので、別のタグ同士で同じ名前にならない）。
+    保存されるタグは TAG_SLUG_RE の文字だけなので、通常は slug そのもの。
+    """
+    return quote(slug, safe="-_.!~*'()")
+
+def build_payloads(db_path: str = DB_PATH, buckets: Tuple[int, ...] = EXPORT_BUCKETS) -> Dict[str, Any]:
+    """
+    出力ディレクトリからの相対パス -> JSON オブジェクト の dict を返す。
+    タグ詳細はランキング行（metrics スナップショット + Top10）とバケットごとに1回まとめて引いた取得元別内訳から
+    get_tool_detail と同じ形（tool_detail_json）で組み立てるため、タグごとに問い合わせる必要はない。
+    """
+    payloads: Dict[str, Any] = {}
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    try:
+        payloads["search_index.json"] = query_search_index(conn)
+        for d in buckets:
+            top = query_rankings(conn, d, limit=DETAIL_LIMIT, top_n=DETAIL_TOP_N)
+            stats = query_stats(conn, d)
+
+            payloads[f"rankings_{d}.json"] = [
+                dict(r, articles_top5=r["articles_top5"][:RANKINGS_TOP_N])
+                for r in top[:RANKINGS_LIMIT]
+            ]
+            payloads[f"stats_{d}.json"] = stats
+            payloads[f"trends_{d}.json"] = query_trends(conn, d, limit=RANKINGS_LIMIT)
+            payloads.update(_ranking_pages(conn, d))
+
+            sources = query_sources_by_slug(conn, d, stats["last_updated"])
+            for r in top:
+                name = slug_filename(r["slug"])
+                payloads[f"tools/{name}-{d}.json"] = tool_detail_json(
+                    {"slug": r["slug"], "name": r["name"]},
+                    {"date": stats["last_updated"], "articles": r["articles"],
+                     "likes_sum": r["likes_sum"], "score": r["score"]},
+                    sources.get(r["slug"], []),
+                    r["articles_top5"],
+                )
+                payloads[f"tools/{name}-{d}-history.json"] = query_history(conn, r["slug"], d, HISTORY_RANGE_DAYS)
+        return payloads
+    finally:
+        conn.close()
+
+def _ranking_pages(conn: sqlite3.Connection, days: int) -> Dict[str, Any]:
+    """記事のあるタグ全件を PAGE_SIZE 件ずつ rankings_{d}_page{n}.json に分ける（n は 1 始まり）"""
+    total = count_rankings(conn, days, min_articles=1)
+    pages = max(1, -(-total // PAGE_SIZE))
+    out: Dict[str, Any] = {}
+    after = None
+    for n in range(1, pages + 1):
+        page = query_rankings_page(conn, days, limit=PAGE_SIZE, after=after, min_articles=1, top_n=RANKINGS_TOP_N)
+        after = decode_cursor(page["next_cursor"]) if page["next_cursor"] else None
+        out[f"rankings_{days}_page{n}.json"] = {
+            "date": page["date"],
+            "page": n,
+            "pages": pages,
+            "total": total,
+            "items": page["items"],
+            "next": f"rankings_{days}_page{n + 1}.json" if n < pages else None,
+        }
+        if after is None:
+            break
+    return out
+
+# ===========================
+# 書き出し（差分のみ・原子的）
+# ===========================
+def write_if_changed(path: str, data: bytes) -> bool:
+    """内容が既存ファイルと同じなら何もしない。変わった場合だけ一時ファイル経由で置換し True"""
+    try:
+        with open(path, "rb") as f:
+            if f.read() == data:
+                return False
+    except FileNotFoundError:
+        pass
+
+    d = os.path.dirname(path)
+    os.makedirs(d, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=d, prefix=".tmp-", suffix=os.path.basename(path))
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.chmod(tmp, FILE_MODE)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    return True
+
+def compress_variants(data: bytes) -> Dict[str, bytes]:
+    """事前圧縮版（拡張子 -> バイト列）。gzip は mtime=0 で毎回同じバイト列になる"""
+    variants = {".gz": gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants[".br"] = brotli.compress(data, quality=11)
+    return variants
+
+def _prune_stale(out_dir: str, keep: set) -> int:
+    """out_dir 直下と tools/ 配下で、今回の出力（圧縮版を含む）に無い JSON を削除する"""
+    removed = 0
+    for sub in ("", "tools"):
+        d = os.path.join(out_dir, sub)
+        if not os.path.isdir(d):
+            continue
+        for name in os.listdir(d):
+            rel = f"{sub}/{name}" if sub else name
+            if rel == MANIFEST_NAME or rel in keep:
+                continue
+            if name.endswith(".json") or name.endswith(PRECOMPRESS_SUFFIXES):
+                os.remove(os.path.join(d, name))
+                removed += 1
+    return removed
+
+def _load_manifest(out_dir: str) -> Dict[str, Dict]:
+    try:
+        with open(os.path.join(out_dir, MANIFEST_NAME), encoding="utf-8") as f:
+            return json.load(f).get("files") or {}
+    except (FileNotFoundError, ValueError, AttributeError):
+        return {}
+
+def write_payloads(
+    out_dir: str,
+    payloads: Dict[str, Any],
+    pretty: bool = False,
+    prune: bool = True,
+    precompress: bool = False,
+) -> Dict[str, Any]:
+    """
+    payloads（相対パス -> JSON）を out_dir に書き出し、manifest.json を更新する。
+    manifest: {"files": {相対パス: {"sha256": ..., "size": ..., ["gz_size", "br_size"]}}}
+    （キー順固定で、変化がなければ書き換えない）
+    前回の manifest とハッシュ・サイズが一致するファイルは読み比べずにスキップする。
+    precompress=True なら各ファイルの隣に .gz / .br（brotli があれば）も置く。
+    戻り値の "sizes" はファイルごとのサイズ（圧縮版を含む）。
+    """
+    prev = _load_manifest(out_dir)
+    files = {}
+    keep = set()
+    written = 0
+    exts = [ext for ext in PRECOMPRESS_SUFFIXES if ext != ".br" or brotli is not None] if precompress else []
+    for rel, obj in payloads.items():
+        data = encode(obj, pretty=pretty)
+        entry = {"sha256": hashlib.sha256(data).hexdigest(), "size": len(data)}
+        keep.add(rel)
+        keep.update(rel + ext for ext in exts)
+
+        # 前回と同じ内容で、圧縮版も揃っていれば圧縮もしない
+        path = os.path.join(out_dir, rel)
+        old = prev.get(rel) or {}
+        if (old.get("sha256") == entry["sha256"] and old.get("size") == entry["size"]
+                and all(f"{ext[1:]}_size" in old for ext in exts)
+                and os.path.isfile(path) and os.path.getsize(path) == entry["size"]
+                and all(os.path.isfile(path + ext) for ext in exts)):
+            files[rel] = {k: old[k] for k in ["sha256", "size"] + [f"{ext[1:]}_size" for ext in exts]}
+            continue
+
+        variants = compress_variants(data) if precompress else {}
+        for ext, blob in variants.items():
+            entry[f"{ext[1:]}_size"] = len(blob)
+        files[rel] = entry
+        changed = write_if_changed(path, data)
+        for ext, blob in variants.items():
+            write_if_changed(path + ext, blob)
+        if changed:
+            written += 1
+
+    removed = _prune_stale(out_dir, keep) if prune else 0
+
+    manifest = {"files": dict(sorted(files.items()))}
+    write_if_changed(os.path.join(out_dir, MANIFEST_NAME), encode(manifest, pretty=pretty))
+    return {
+        "files": len(payloads), "written": written, "unchanged": len(payloads) - written,
+        "removed": removed, "sizes": files,
+    }
@@ -0,0 +1,278 @@
+# http_client.py — クローラー共通の HTTP 層
+# - keep-alive の共有 Session（スレッド間で接続プールを共有）
+# - URL をキーにしたディスクキャッシュ（ETag / Last-Modified / 本文ハッシュ / 解析結果）。最後に取得・検証した時刻で古い分を削除
+# - 条件付きリクエスト（If-None-Match / If-Modified-Since）: 304 や本文不変なら解析をスキップ
+# - ストリーミング取得: 必要な項目が揃った時点 / 上限バイト数で読み込みを打ち切る
+# - 取得秒・読み込みバイト数・解析秒を kind（list / detail など）ごとに telemetry へ記録
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional, Protocol, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from maintenance import PruneRule, checkpoint, delete_batched, reclaim_space
+from telemetry import FETCH_BYTES, FETCH_SECONDS, PARSE_SECONDS
+
+# ===========================
+# 定数・設定
+# ===========================
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "16"))   # ホストあたりの keep-alive 接続数
+HTTP_CACHE_PATH = os.getenv("HTTP_CACHE_PATH", os.path.abspath("http_cache.db"))
+
+# ===========================
+# 共有 Session
+# ===========================
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+def get_session() -> requests.Session:
+    """プロセス共有の Session（初回呼び出し時に生成）"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            s = requests.Session()
+            adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+            s.mount("https://", adapter)
+            s.mount("http://", adapter)
+            _session = s
+        return _session
+
+# ===========================
+# ディスクキャッシュ
+# ===========================
+CACHE_SCHEMA_SQL = """
+PRAGMA journal_mode=WAL;
+
+CREATE TABLE IF NOT EXISTS http_cache (
+  url TEXT PRIMARY KEY,
+  etag TEXT,
+  last_modified TEXT,
+  body_hash TEXT NOT NULL,
+  data TEXT NOT NULL,
+  fetched_at INTEGER NOT NULL DEFAULT 0   -- 最後に 200 / 304 を受けた時刻（UNIX 秒）
+);
+"""
+
+# 取得も検証もされなくなった URL（保持期間を過ぎて巡回しなくなった記事など）を消す
+CACHE_PRUNE_RULE = PruneRule("http_cache", "rowid", "fetched_at < :cut")
+
+@dataclass
+class CacheEntry:
+    etag: Optional[str]
+    last_modified: Optional[str]
+    body_hash: str
+    data: Any           # parse() の戻り値（JSON 化可能なもの）
+
+class ResponseCache:
+    """
+    URL ごとに検証子（ETag / Last-Modified）・本文ハッシュ・解析結果を保存する。
+    複数スレッドから使えるよう、接続は1本を Lock で保護する。
+    """
+
+    def __init__(self, path: str = HTTP_CACHE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(CACHE_SCHEMA_SQL)
+        self._migrate_fetched_at()
+
+    def _migrate_fetched_at(self) -> None:
+        """fetched_at の無い既存キャッシュに列と索引を足す（既存行は今取得したものとみなす）"""
+        cols = [r[1] for r in self._conn.execute("PRAGMA table_info(http_cache)")]
+        if "fetched_at" not in cols:
+            self._conn.execute("ALTER TABLE http_cache ADD COLUMN fetched_at INTEGER NOT NULL DEFAULT 0")
+            self._conn.execute("UPDATE http_cache SET fetched_at = ?", (int(time.time()),))
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_http_cache_fetched_at ON http_cache(fetched_at)")
+        self._conn.commit()
+
+    def get(self, url: str) -> Optional[CacheEntry]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT etag, last_modified, body_hash, data FROM http_cache WHERE url=?",
+                (url,)
+            ).fetchone()
+        if not row:
+            return None
+        return CacheEntry(etag=row[0], last_modified=row[1], body_hash=row[2], data=json.loads(row[3]))
+
+    def put(self, url: str, entry: CacheEntry) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO http_cache(url, etag, last_modified, body_hash, data, fetched_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (url, entry.etag, entry.last_modified, entry.body_hash,
+                 json.dumps(entry.data, ensure_ascii=False), int(time.time())),
+            )
+            self._conn.commit()
+
+    def touch(self, url: str) -> None:
+        """304 で検証できた行の fetched_at だけを更新する"""
+        with self._lock:
+            self._conn.execute("UPDATE http_cache SET fetched_at=? WHERE url=?", (int(time.time()), url))
+            self._conn.commit()
+
+    def prune(self, max_age_sec: float) -> Dict:
+        """
+        max_age_sec より前から取得・検証されていない行を分割削除し、空き領域の回収と WAL のチェックポイントをする。
+        クロール中の put() と同じ Lock の中で動くので、クロールが終わってから呼ぶこと。
+        """
+        with self._lock:
+            deleted = delete_batched(self._conn, CACHE_PRUNE_RULE, {"cut": int(time.time() - max_age_sec)})
+            vacuum = reclaim_space(self._conn)
+            wal = checkpoint(self._conn)
+        return {"deleted": deleted, "vacuum": vacuum, "checkpoint": wal}
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+def _body_hash(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()
+
+# ===========================
+# 条件付き GET
+# ===========================
+def _cache_key(url: str, params: Optional[Dict]) -> str:
+    return requests.Request("GET", url, params=params).prepare().url
+
+def _conditional_headers(cached: Optional[CacheEntry], headers: Optional[Dict]) -> Dict:
+    req_headers = dict(headers or {})
+    if cached is not None:
+        if cached.etag:
+            req_headers["If-None-Match"] = cached.etag
+        if cached.last_modified:
+            req_headers["If-Modified-Since"] = cached.last_modified
+    return req_headers
+
+def _store(cache: Optional[ResponseCache], key: str, r: requests.Response, digest: str, data: Any) -> None:
+    if cache is not None:
+        cache.put(key, CacheEntry(
+            etag=r.headers.get("ETag"),
+            last_modified=r.headers.get("Last-Modified"),
+            body_hash=digest,
+            data=data,
+        ))
+
+def fetch_cached(
+    url: str,
+    parse: Callable[[str], Any],
+    *,
+    cache: Optional[ResponseCache] = None,
+    params: Optional[Dict] = None,
+    headers: Optional[Dict] = None,
+    timeout: float = 15,
+    kind: str = "http",
+) -> Tuple[int, Any]:
+    """
+    共有 Session で GET し、(HTTPステータス, 解析結果) を返す。
+    - cache があれば検証子を付けて条件付きリクエストを送る
+    - 304、または 200 でも本文ハッシュが前回と同じなら parse を呼ばずに前回の解析結果を返す
+    - 200 以外（304 を除く）は (status, None)
+    例外は呼び出し元に送出する。kind は計測のラベル。
+    """
+    key = _cache_key(url, params)
+    cached = cache.get(key) if cache is not None else None
+
+    t0 = time.perf_counter()
+    try:
+        r = get_session().get(url, params=params, headers=_conditional_headers(cached, headers), timeout=timeout)
+        content = r.content
+    except Exception:
+        FETCH_SECONDS.observe(time.perf_counter() - t0, kind=kind, status="error")
+        raise
+    FETCH_SECONDS.observe(time.perf_counter() - t0, kind=kind, status=r.status_code)
+    FETCH_BYTES.observe(len(content), kind=kind)
+
+    if r.status_code == 304 and cached is not None:
+        cache.touch(key)
+        return 304, cached.data
+    if r.status_code != 200:
+        return r.status_code, None
+
+    digest = _body_hash(content)
+    if cached is not None and cached.body_hash == digest:
+        data = cached.data
+    else:
+        with PARSE_SECONDS.time(kind=kind):
+            data = parse(r.text)
+    _store(cache, key, r, digest, data)
+    return 200, data
+
+class StreamParser(Protocol):
+    def feed(self, chunk: bytes) -> bool: ...   # 必要な項目が揃ったら True
+    def result(self) -> Any: ...                # 途中まで（上限・EOF）の内容でも結果を返す
+
+def fetch_cached_stream(
+    url: str,
+    parser: StreamParser,
+    *,
+    cache: Optional[ResponseCache] = None,
+    headers: Optional[Dict] = None,
+    timeout: float = 15,
+    max_bytes: int = 2 * 1024 * 1024,
+    chunk_size: int = 16 * 1024,
+    kind: str = "http",
+) -> Tuple[int, Any]:
+    """
+    fetch_cached のストリーミング版。本文を chunk_size ずつ parser.feed() に渡し、
+    必要な項目が揃った時点か max_bytes を読んだ時点で接続を閉じる。
+    本文ハッシュは読んだ部分だけで計算する（先頭が前回と同じなら前回の解析結果を使う）。
+    取得秒は feed() に掛かった時間を除いて記録する（feed() と result() は解析秒の側）。
+    """
+    key = _cache_key(url, None)
+    cached = cache.get(key) if cache is not None else None
+
+    t0 = time.perf_counter()
+    status = "error"
+    read = 0
+    feed_sec = 0.0
+    try:
+        r = get_session().get(url, headers=_conditional_headers(cached, headers), timeout=timeout, stream=True)
+    except Exception:
+        FETCH_SECONDS.observe(time.perf_counter() - t0, kind=kind, status=status)
+        raise
+    try:
+        status = r.status_code
+        if r.status_code == 304 and cached is not None:
+            cache.touch(key)
+            return 304, cached.data
+        if r.status_code != 200:
+            return r.status_code, None
+
+        h = hashlib.sha256()
+        status = "error"   # 本文の途中で落ちた場合
+        for chunk in r.iter_content(chunk_size=chunk_size):
+            if not chunk:
+                continue
+            chunk = chunk[:max_bytes - read]
+            h.update(chunk)
+            read += len(chunk)
+            t1 = time.perf_counter()
+            done = parser.feed(chunk)
+            feed_sec += time.perf_counter() - t1
+            if done or read >= max_bytes:
+                break
+        status = 200
+        FETCH_SECONDS.observe(time.perf_counter() - t0 - feed_sec, kind=kind, status=status)
+
+        digest = h.hexdigest()
+        if cached is not None and cached.body_hash == digest:
+            data = cached.data
+        else:
+            t1 = time.perf_counter()
+            data = parser.result()
+            PARSE_SECONDS.observe(feed_sec + time.perf_counter() - t1, kind=kind)
+        _store(cache, key, r, digest, data)
+        return 200, data
+    finally:
+        r.close()
+        if status != 200:
+            FETCH_SECONDS.observe(time.perf_counter() - t0 - feed_sec, kind=kind, status=status)
+        FETCH_BYTES.observe(read, kind=kind)
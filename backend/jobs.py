@@ -0,0 +1,120 @@
+# jobs.py — 集計ジョブのバックグラウンド実行
+# - 書き込みジョブは1本のワーカースレッドで順に実行（SQLite の writer は常に1つ）
+# - 同じ種類・同じパラメータのジョブが待機中/実行中なら新規に積まず、そのジョブに合流（single-flight）。
+#   パラメータが違えば JobConflict（頼んでいない内容のジョブに合流させない）
+# - 進捗は aggregator.RunProgress（フェーズ別経過時間・ページ数・追加記事数など）
+# - 完了したジョブには実行中に記録された telemetry の差分（取得・解析・SQL の分布）を report として付ける
+
+import itertools
+import threading
+import time
+import traceback
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from aggregator import RunProgress, _now_jst
+from telemetry import REGISTRY
+
+JOB_HISTORY = 50   # 保持する完了済みジョブ数
+
+class Job:
+    def __init__(self, job_id: str, kind: str, params: Dict[str, Any]):
+        self.id = job_id
+        self.kind = kind
+        self.params = params
+        self.status = "queued"        # queued / running / succeeded / failed
+        self.progress = RunProgress()
+        self.result: Any = None
+        self.report: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.created_at = _now_jst().isoformat(timespec="seconds")
+        self.started_at: Optional[str] = None
+        self.finished_at: Optional[str] = None
+        self._t0: Optional[float] = None
+        self._t1: Optional[float] = None
+
+    @property
+    def active(self) -> bool:
+        return self.status in ("queued", "running")
+
+    def to_dict(self) -> Dict[str, Any]:
+        elapsed = None
+        if self._t0 is not None:
+            elapsed = round((self._t1 or time.monotonic()) - self._t0, 3)
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "params": self.params,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "elapsed_sec": elapsed,
+            "progress": self.progress.snapshot(),
+            "result": self.result,
+            "report": self.report,
+            "error": self.error,
+        }
+
+class JobConflict(Exception):
+    """同じ種類のジョブが別のパラメータで待機中/実行中"""
+
+    def __init__(self, job: Job):
+        super().__init__(f"{job.kind} job {job.id} is already {job.status} with different params")
+        self.job = job
+
+class JobRunner:
+    def __init__(self, on_finish: Optional[Callable[[Job], None]] = None, history: int = JOB_HISTORY):
+        self.on_finish = on_finish
+        self.history = history
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="job")
+        self._lock = threading.Lock()
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._seq = itertools.count(1)
+
+    def submit(self, kind: str, fn: Callable[..., Any], **params) -> Tuple[Job, bool]:
+        """
+        fn(progress=..., **params) をワーカーに積む。
+        同じ kind・同じ params のジョブが待機中/実行中ならそれを返す（戻り値の2つ目が True）。
+        同じ kind でも params が違えば JobConflict（終わってから出し直してもらう）。
+        """
+        with self._lock:
+            for job in self._jobs.values():
+                if job.kind == kind and job.active:
+                    if job.params != params:
+                        raise JobConflict(job)
+                    return job, True
+            job = Job(f"{kind}-{next(self._seq)}-{int(time.time())}", kind, params)
+            self._jobs[job.id] = job
+            self._trim()
+        self._executor.submit(self._run, job, fn)
+        return job, False
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _trim(self) -> None:
+        done = [j.id for j in self._jobs.values() if not j.active]
+        for job_id in done[:max(0, len(done) - self.history)]:
+            del self._jobs[job_id]
+
+    def _run(self, job: Job, fn: Callable[..., Any]) -> None:
+        job.status = "running"
+        job.started_at = _now_jst().isoformat(timespec="seconds")
+        job._t0 = time.monotonic()
+        since = REGISTRY.snapshot()   # ワーカーは1本なので、差分はこのジョブの分だけになる
+        try:
+            job.result = fn(progress=job.progress, **job.params)
+            job.status = "succeeded"
+        except Exception as e:
+            job.error = f"{type(e).__name__}: {e}"
+            job.status = "failed"
+            traceback.print_exc()
+        finally:
+            job._t1 = time.monotonic()
+            job.report = REGISTRY.report(since)
+            job.finished_at = _now_jst().isoformat(timespec="seconds")
+            if self.on_finish is not None:
+                self.on_finish(job)
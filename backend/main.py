@@ -1,27 +1,190 @@
 # main.py の例（抜粋）
-from fastapi import FastAPI, Query
+from contextlib import asynccontextmanager
+from typing import Optional
+
+from fastapi import FastAPI, HTTPException, Query, Request, Response
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
-from aggregator import aggregate, get_rankings, get_tool_detail, get_stats
+from aggregator import (DB_PATH, HISTORY_RETENTION_DAYS, TREND_SORTS, TREND_WINDOW_DAYS, aggregate, get_adapters, init_db,
+                        refresh_likes, query_rankings, query_tool_detail, query_stats, query_snapshot_version,
+                        query_trends, query_history, query_search, query_rankings_page, decode_cursor, SEARCH_LIMIT)
+from api_cache import CACHE_MAX_AGE, SnapshotCache, etag_matches
+from db_pool import READ_MMAP_SIZE, READ_POOL_SIZE, ReadPool
+from jobs import JobConflict, JobRunner
+from scoring import parse_scoring
+from telemetry import REGISTRY
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    起動時に読み出し専用接続のプールを用意し、終了時に閉じる（import しただけでは DB に触れない）。
+    プールは読み出し専用で開くため、先にスキーマだけ作っておく。
+    """
+    init_db(DB_PATH)
+    app.state.pool = ReadPool(DB_PATH, size=READ_POOL_SIZE, mmap_size=READ_MMAP_SIZE)
+    try:
+        yield
+    finally:
+        app.state.pool.close()
 
-app = FastAPI(title="DevToolsRank API")
+app = FastAPI(title="DevToolsRank API", lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"], allow_credentials=True,
     allow_methods=["*"], allow_headers=["*"],
 )
 
+def _read(fn, *args, **kwargs):
+    with app.state.pool.connection() as conn:
+        return fn(conn, *args, **kwargs)
+
+# 読み出し系のレスポンスキャッシュ（metrics スナップショットが変わると無効化）
+cache = SnapshotCache(lambda: _read(query_snapshot_version))
+
+def _cached_json(request: Request, key, compute) -> Response:
+    etag, body = cache.get(key, compute)
+    headers = {"ETag": etag, "Cache-Control": f"public, max-age={CACHE_MAX_AGE}"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+# 集計ジョブ（1本のワーカーで順に実行。完了したらレスポンスキャッシュを捨てる）
+jobs = JobRunner(on_finish=lambda job: cache.clear())
+
+def _submit_job(response: Response, kind: str, fn, **params):
+    """ジョブを積むか同じジョブに合流して 202。同じ種類が別のパラメータで動いていれば 409"""
+    try:
+        job, joined = jobs.submit(kind, fn, **params)
+    except JobConflict as e:
+        raise HTTPException(status_code=409, detail={
+            "message": str(e), "job_id": e.job.id, "status": e.job.status, "params": e.job.params,
+        })
+    response.status_code = 202
+    return {"job_id": job.id, "status": job.status, "joined": joined}
+
+def _check_scoring(spec: Optional[str]):
+    if spec:
+        try:
+            parse_scoring(spec)
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+
+def _check_sources(sources: Optional[str]):
+    if sources is not None:
+        try:
+            get_adapters(sources)
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+
+def _job_status(job_id: str, kind: str):
+    job = jobs.get(job_id)
+    if job is None or job.kind != kind:
+        raise HTTPException(status_code=404, detail="job not found")
+    return job.to_dict()
+
 @app.post("/aggregate")
-def run_aggregate(days: int = Query(90, ge=1, le=3650)):
-    return aggregate(days=days, tools_csv="tools.csv")
+def run_aggregate(
+    response: Response,
+    days: int = Query(90, ge=1, le=3650),
+    scoring: Optional[str] = None,
+    sources: Optional[str] = Query(None, description="カンマ区切りの取得元（zenn,qiita）"),
+):
+    _check_scoring(scoring)
+    _check_sources(sources)
+    return _submit_job(response, "aggregate", aggregate, days=days, scoring=scoring, sources=sources)
+
+@app.get("/aggregate/{job_id}")
+def aggregate_status(job_id: str):
+    return _job_status(job_id, "aggregate")
+
+@app.post("/refresh_likes")
+def run_refresh_likes(
+    response: Response,
+    scoring: Optional[str] = None,
+    sources: Optional[str] = Query(None, description="カンマ区切りの取得元（zenn,qiita）"),
+):
+    _check_scoring(scoring)
+    _check_sources(sources)
+    return _submit_job(response, "refresh_likes", refresh_likes, scoring=scoring, sources=sources)
+
+@app.get("/refresh_likes/{job_id}")
+def refresh_likes_status(job_id: str):
+    return _job_status(job_id, "refresh_likes")
 
 @app.get("/rankings")
-def rankings(days: int = Query(90, ge=1, le=3650)):
-    return get_rankings(days=days)
+def rankings(
+    request: Request,
+    days: int = Query(90, ge=1, le=3650),
+    limit: int = Query(100, ge=1, le=100),
+    top_n: int = Query(5, ge=0, le=50),
+):
+    return _cached_json(request, ("rankings", None, days, limit, top_n),
+                        lambda: _read(query_rankings, days, limit=limit, top_n=top_n))
+
+@app.get("/rankings/page")
+def rankings_page(
+    request: Request,
+    days: int = Query(90, ge=1, le=3650),
+    limit: int = Query(50, ge=1, le=100),
+    cursor: Optional[str] = Query(None, max_length=512),
+    min_articles: int = Query(0, ge=0),
+    tags: Optional[str] = Query(None, description="カンマ区切りの slug"),
+    top_n: int = Query(5, ge=0, le=50),
+    include_articles: bool = True,
+):
+    # カーソルは接続を取る前に検証する（壊れたカーソルで読み出しプールを使わない）
+    try:
+        after = decode_cursor(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    tag_list = sorted({t.strip().lower() for t in tags.split(",") if t.strip()}) if tags is not None else None
+    key = ("rankings_page", after, days, limit, top_n, min_articles,
+           tuple(tag_list) if tag_list is not None else None, include_articles)
+    return _cached_json(request, key,
+                        lambda: _read(query_rankings_page, days, limit=limit, after=after, min_articles=min_articles,
+                                      tags=tag_list, top_n=top_n, include_articles=include_articles))
 
 @app.get("/tool/{slug}")
-def tool_detail(slug: str, days: int = Query(90, ge=1, le=3650)):
-    return get_tool_detail(slug=slug, days=days)
+def tool_detail(request: Request, slug: str, days: int = Query(90, ge=1, le=3650)):
+    return _cached_json(request, ("tool", slug, days, None),
+                        lambda: _read(query_tool_detail, slug, days))
+
+@app.get("/tool/{slug}/history")
+def tool_history(
+    request: Request,
+    slug: str,
+    days: int = Query(30, ge=1, le=3650),
+    range_days: int = Query(HISTORY_RETENTION_DAYS, ge=1, le=HISTORY_RETENTION_DAYS),
+):
+    return _cached_json(request, ("history", slug, days, range_days),
+                        lambda: _read(query_history, slug, days, range_days))
+
+@app.get("/trends")
+def trends(
+    request: Request,
+    days: int = Query(30, ge=1, le=3650),
+    window: int = Query(TREND_WINDOW_DAYS, ge=1, le=HISTORY_RETENTION_DAYS),
+    limit: int = Query(100, ge=1, le=1000),
+    sort: str = Query("rank", pattern="^(" + "|".join(TREND_SORTS) + ")$"),
+):
+    return _cached_json(request, ("trends", sort, days, limit, window),
+                        lambda: _read(query_trends, days, window, limit, sort))
+
+@app.get("/search")
+def search(
+    request: Request,
+    q: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(SEARCH_LIMIT, ge=1, le=100),
+):
+    return _cached_json(request, ("search", q, None, limit),
+                        lambda: _read(query_search, q, limit))
 
 @app.get("/stats")
-def stats(days: int = Query(90, ge=1, le=3650)):
-    return get_stats(days=days)
\ No newline at end of file
+def stats(request: Request, days: int = Query(90, ge=1, le=3650)):
+    return _cached_json(request, ("stats", None, days, None),
+                        lambda: _read(query_stats, days))
+
+# 集計ジョブの計測値（Prometheus テキスト形式、プロセス起動からの累積）
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    return PlainTextResponse(REGISTRY.to_prometheus(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,154 @@
+# maintenance.py — trend.db の保守（保持期間外の削除・WAL チェックポイント・空き領域の回収・サイズ報告）
+# - 削除はクロールのトランザクションの外で、PRUNE_BATCH_ROWS 行ずつの短いトランザクションに分けて行う
+#   （書き込みロックを長く握らず、1回の大きな DELETE で WAL を膨らませない）
+# - 空きページの割合が VACUUM_FREE_RATIO を超えたら incremental_vacuum でファイルを縮める
+#   （auto_vacuum=INCREMENTAL でない既存DBは、その時に1回だけ VACUUM して切り替える）
+# - 最後に WAL をチェックポイントして -wal ファイルを切り詰める
+# - テーブル・インデックスごとのサイズ（dbstat が使えるビルドのみ）とファイルサイズを返す
+# 呼び出し側（aggregator）がトランザクションをコミットしてから使うこと（ここで都度コミットする）。
+
+import os
+import sqlite3
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence
+
+from telemetry import SQL_SECONDS
+
+PRUNE_BATCH_ROWS = int(os.getenv("PRUNE_BATCH_ROWS", "20000"))   # 小さいほどロックは短いが、索引ページの書き直しが増える
+VACUUM_FREE_RATIO = float(os.getenv("VACUUM_FREE_RATIO", "0.1"))   # 空きページがこの割合を超えたら回収
+VACUUM_MIN_FREE_PAGES = 256        # 空きがこれ未満なら割合によらず回収しない（小さいDBで毎回動かないように）
+SIZE_REPORT_TOP = 10               # ログに出す大きい順のオブジェクト数
+
+# ===========================
+# 分割削除
+# ===========================
+@dataclass(frozen=True)
+class PruneRule:
+    """1テーブル分の削除条件"""
+    table: str
+    keys: str     # 行を特定する列（rowid テーブルは "rowid"、WITHOUT ROWID は主キー列 "a, b"）
+    where: str    # 削除する行の条件（名前付きパラメータ可）
+
+def delete_batched(
+    conn: sqlite3.Connection,
+    rule: PruneRule,
+    params: Dict[str, object],
+    batch: int = PRUNE_BATCH_ROWS,
+) -> int:
+    """rule に合う行を batch 行ずつ削除してはコミットし、削除した行数を返す"""
+    sql = (f"DELETE FROM {rule.table} WHERE ({rule.keys}) IN "
+           f"(SELECT {rule.keys} FROM {rule.table} WHERE {rule.where} LIMIT :_batch)")
+    total = 0
+    while True:
+        with SQL_SECONDS.time(op="prune"):
+            n = conn.execute(sql, {**params, "_batch": max(1, batch)}).rowcount
+            conn.commit()
+        total += n
+        if n < batch:
+            return total
+
+def prune(
+    conn: sqlite3.Connection,
+    rules: Sequence[PruneRule],
+    params: Dict[str, object],
+    batch: int = PRUNE_BATCH_ROWS,
+) -> Dict[str, int]:
+    """rules を順に分割削除し、テーブルごとの削除行数を返す（削除の無いテーブルは含めない）"""
+    out: Dict[str, int] = {}
+    for rule in rules:
+        n = delete_batched(conn, rule, params, batch)
+        if n:
+            out[rule.table] = out.get(rule.table, 0) + n
+    return out
+
+# ===========================
+# 空き領域の回収・チェックポイント
+# ===========================
+def _pragma(conn: sqlite3.Connection, name: str) -> int:
+    return conn.execute(f"PRAGMA {name}").fetchone()[0]
+
+def reclaim_space(
+    conn: sqlite3.Connection,
+    free_ratio: float = VACUUM_FREE_RATIO,
+    min_free_pages: int = VACUUM_MIN_FREE_PAGES,
+) -> Dict:
+    """
+    空きページ（freelist）の割合が free_ratio を超えていれば回収し、前後のページ数を返す。
+    auto_vacuum=INCREMENTAL なら incremental_vacuum（空きページを末尾から切り詰めるだけ）、
+    そうでなければ auto_vacuum を INCREMENTAL にして VACUUM（全体の作り直しは初回だけ）。
+    """
+    pages, free = _pragma(conn, "page_count"), _pragma(conn, "freelist_count")
+    out = {"page_count": pages, "freelist_count": free, "mode": None}
+    if free < min_free_pages or free <= free_ratio * pages:
+        return out
+    conn.commit()
+    with SQL_SECONDS.time(op="vacuum"):
+        if _pragma(conn, "auto_vacuum") == 2:
+            # execute() だと1ページ分しか進まないため、最後まで回る executescript で流す
+            conn.executescript("PRAGMA incremental_vacuum")
+            out["mode"] = "incremental"
+        else:
+            conn.executescript("PRAGMA auto_vacuum=INCREMENTAL; VACUUM")
+            out["mode"] = "full"
+    out["page_count_after"] = _pragma(conn, "page_count")
+    out["freelist_count_after"] = _pragma(conn, "freelist_count")
+    return out
+
+def checkpoint(conn: sqlite3.Connection, mode: str = "TRUNCATE") -> Dict[str, int]:
+    """
+    WAL をデータベースに書き戻し、TRUNCATE なら -wal を 0 バイトにする。
+    読み出し中の接続があると途中までしか進まない（busy=1。次回また進める）。
+    """
+    conn.commit()
+    with SQL_SECONDS.time(op="checkpoint"):
+        busy, log, done = conn.execute(f"PRAGMA wal_checkpoint({mode})").fetchone()
+    return {"busy": busy, "wal_pages": log, "checkpointed": done}
+
+# ===========================
+# サイズ報告
+# ===========================
+DBSTAT_SQL = """
+SELECT s.name, COALESCE(m.tbl_name, s.name), COALESCE(m.type, 'table'), SUM(s.pgsize), COUNT(*)
+FROM dbstat s LEFT JOIN sqlite_master m ON m.name = s.name
+GROUP BY s.name
+ORDER BY SUM(s.pgsize) DESC, s.name
+"""
+
+def _file_size(path: str) -> int:
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+def size_report(conn: sqlite3.Connection, db_path: Optional[str] = None) -> Dict:
+    """
+    ファイルサイズ（本体・-wal）、ページ数・空きページ数と、テーブル・インデックスごとのバイト数（大きい順）。
+    objects は dbstat の無い SQLite では空。
+    """
+    page_size = _pragma(conn, "page_size")
+    pages, free = _pragma(conn, "page_count"), _pragma(conn, "freelist_count")
+    objects: List[Dict] = []
+    try:
+        objects = [{"name": r[0], "table": r[1], "type": r[2], "bytes": r[3], "pages": r[4]}
+                   for r in conn.execute(DBSTAT_SQL)]
+    except sqlite3.OperationalError:
+        pass
+    return {
+        "file_bytes": _file_size(db_path) if db_path else pages * page_size,
+        "wal_bytes": _file_size(db_path + "-wal") if db_path else 0,
+        "page_size": page_size,
+        "page_count": pages,
+        "freelist_count": free,
+        "free_ratio": round(free / pages, 4) if pages else 0.0,
+        "objects": objects,
+    }
+
+def format_size_report(report: Dict, top: int = SIZE_REPORT_TOP) -> List[str]:
+    """size_report() をログ用の行にする（オブジェクトは大きい順に top 件）"""
+    mib = 1024 * 1024
+    lines = [f"file={report['file_bytes'] / mib:.1f}MiB wal={report['wal_bytes'] / mib:.1f}MiB "
+             f"pages={report['page_count']} free={report['freelist_count']} ({report['free_ratio']:.1%})"]
+    for o in report["objects"][:top]:
+        label = o["name"] if o["name"] == o["table"] else f"{o['name']} ({o['table']})"
+        lines.append(f"  {o['bytes'] / mib:8.2f}MiB {o['type']:<5} {label}")
+    return lines
@@ -0,0 +1,146 @@
+# scoring.py — タグのスコア計算（metrics.score）
+# - 既定の likes_sum は score = likes_sum なので、aggregator がバケットごとの INSERT ... SELECT ... GROUP BY
+#   だけで書く（ここは通らない。行を Python に持ち出す分だけ遅くなるため）
+# - それ以外の式は、バケット（1/7/30日）ごとに article_tags の被覆インデックスを1回範囲走査し、全タグの
+#   記事数・いいね合計（decay なら減衰込みのいいね合計も）を NumPy 配列で受け取る
+#   （全バケットを CASE で1回の走査にまとめるより、窓ごとの範囲走査3回の方が読む行も式の評価も少なく速い）
+# - スコアは全タグ × 全バケットを配列演算でまとめて計算する
+# - スコア式は実行ごとに選べる（ScoringConfig）。使った式は snapshot_state.scoring に記録
+#   likes_sum  : いいね合計（従来どおり）
+#   decay      : いいねを公開からの経過日数で指数減衰（half_life_days で半減）させた合計
+#   like_rate  : 1記事あたりのいいね
+#   bayes      : 1記事あたりのいいねを全体平均へ prior_weight 記事分だけ寄せた値（少数記事のタグの暴れを抑える）
+
+import json
+import math
+import os
+import sqlite3
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+SCORING_FORMULAS = ("likes_sum", "decay", "like_rate", "bayes")
+SCORING_SPEC = os.getenv("SCORING", "likes_sum")   # 例: "decay:half_life_days=3"
+
+# ===========================
+# 設定
+# ===========================
+@dataclass(frozen=True)
+class ScoringConfig:
+    formula: str = "likes_sum"
+    half_life_days: float = 7.0   # decay 用
+    prior_weight: float = 5.0     # bayes 用（全体平均を何記事分として混ぜるか）
+
+    def to_json(self) -> str:
+        return json.dumps(asdict(self), sort_keys=True)
+
+def parse_scoring(spec: str) -> ScoringConfig:
+    """
+    "decay" / "bayes:prior_weight=10" / "decay:half_life_days=3" 形式の文字列を ScoringConfig にする。
+    不明な式・パラメータは ValueError。
+    """
+    name, _, params = (spec or "likes_sum").strip().partition(":")
+    name = name.strip() or "likes_sum"
+    if name not in SCORING_FORMULAS:
+        raise ValueError(f"unknown scoring formula: {name} (choose from {', '.join(SCORING_FORMULAS)})")
+    kwargs: Dict[str, float] = {}
+    for kv in filter(None, (p.strip() for p in params.split(","))):
+        k, _, v = kv.partition("=")
+        k = k.strip()
+        if k not in ("half_life_days", "prior_weight"):
+            raise ValueError(f"unknown scoring parameter: {k}")
+        kwargs[k] = float(v)
+    cfg = ScoringConfig(formula=name, **kwargs)
+    if cfg.half_life_days <= 0 or cfg.prior_weight < 0:
+        raise ValueError("half_life_days must be > 0 and prior_weight >= 0")
+    return cfg
+
+# ===========================
+# 読み込み（バケットごとに被覆インデックス1回）
+# ===========================
+BUCKET_SUMS_SQL = """
+SELECT t.slug, COUNT(at.article_id), COALESCE(SUM(at.likes), 0){decay}
+FROM tools t
+LEFT JOIN article_tags at ON at.slug = t.slug AND at.published_at >= ?
+GROUP BY t.slug
+ORDER BY t.slug
+"""
+# 経過日数 age に対する重み 2^(-age / half_life) = exp((julianday(公開) - julianday(今)) * ln2 / half_life)
+DECAY_SUM_SQL = ", COALESCE(SUM(at.likes * exp((julianday(at.published_at) - ?) * ?)), 0)"
+
+@dataclass
+class BucketSums:
+    articles: np.ndarray     # int64
+    likes_sum: np.ndarray    # float64
+    decayed: np.ndarray      # float64（decay 以外では likes_sum と同じ）
+
+def _julian_day(dt: datetime) -> float:
+    return dt.timestamp() / 86400.0 + 2440587.5
+
+def _ensure_exp(conn: sqlite3.Connection) -> None:
+    """SQLite が数学関数なしでビルドされていれば exp を Python 側で登録する"""
+    try:
+        conn.execute("SELECT exp(0)").fetchone()
+    except sqlite3.OperationalError:
+        conn.create_function("exp", 1, math.exp, deterministic=True)
+
+def load_bucket_sums(
+    conn: sqlite3.Connection,
+    now: datetime,
+    buckets: Sequence[int],
+    config: ScoringConfig,
+) -> Tuple[List[str], Dict[int, BucketSums]]:
+    """tools の全タグ（slug 順）と、バケットごとの記事数・いいね合計の配列を返す"""
+    decay = config.formula == "decay"
+    if decay:
+        _ensure_exp(conn)
+    sql = BUCKET_SUMS_SQL.format(decay=DECAY_SUM_SQL if decay else "")
+    rate = math.log(2) / config.half_life_days
+
+    slugs: List[str] = []
+    out: Dict[int, BucketSums] = {}
+    for d in buckets:
+        since_iso = (now - timedelta(days=d)).isoformat(timespec="seconds")
+        params = (_julian_day(now), rate, since_iso) if decay else (since_iso,)
+        rows = conn.execute(sql, params).fetchall()
+        slugs = [r[0] for r in rows]
+        articles = np.fromiter((r[1] for r in rows), dtype=np.int64, count=len(rows))
+        likes_sum = np.fromiter((r[2] for r in rows), dtype=np.float64, count=len(rows))
+        decayed = np.fromiter((r[3] for r in rows), dtype=np.float64, count=len(rows)) if decay else likes_sum
+        out[d] = BucketSums(articles, likes_sum, decayed)
+    return slugs, out
+
+# ===========================
+# スコア（全タグを配列演算で）
+# ===========================
+def compute_scores(sums: BucketSums, config: ScoringConfig) -> np.ndarray:
+    """1バケット分の全タグの score。articles = 0 のタグは式によらず 0"""
+    articles, likes_sum = sums.articles, sums.likes_sum
+    has = articles > 0
+    if config.formula == "decay":
+        return np.where(has, sums.decayed, 0.0)
+    if config.formula == "like_rate":
+        return np.divide(likes_sum, articles, out=np.zeros(len(articles)), where=has)
+    if config.formula == "bayes":
+        total = articles.sum()
+        prior = likes_sum.sum() / total if total else 0.0
+        return np.divide(likes_sum + config.prior_weight * prior, articles + config.prior_weight,
+                         out=np.zeros(len(articles)), where=has)
+    return likes_sum
+
+def compute_bucket_metrics(
+    conn: sqlite3.Connection,
+    now: datetime,
+    buckets: Sequence[int],
+    config: ScoringConfig,
+) -> List[tuple]:
+    """metrics に入れる (days, slug, articles, likes_sum, score) の行を全タグ × 全バケット分返す"""
+    slugs, sums = load_bucket_sums(conn, now, buckets, config)
+    rows: List[tuple] = []
+    for d, s in sums.items():
+        score = compute_scores(s, config)
+        rows.extend(zip([d] * len(slugs), slugs, s.articles.tolist(),
+                        s.likes_sum.astype(np.int64).tolist(), score.tolist()))
+    return rows
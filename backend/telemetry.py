@@ -0,0 +1,184 @@
+# telemetry.py — 集計・クロールの計測（ヒストグラム）
+# - プロセス共有の REGISTRY に、取得レイテンシ・取得バイト数・解析時間・書き込み行数・SQL時間・
+#   レート制限の待ち時間・書き出し時間・フェーズ時間をラベル付きヒストグラムで記録する
+# - GET /metrics 用に Prometheus テキスト形式で出す（累積値）
+# - 実行レポート（JSON）は開始時の snapshot() との差分から作る（同じプロセスで何度走らせても1回分になる）
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+METRIC_PREFIX = "ossrank_"
+
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 120.0)
+BYTES_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+ROWS_BUCKETS = (0, 1, 5, 10, 25, 50, 100, 250, 500, 1000, 5000, 20000)
+
+LabelKey = Tuple[str, ...]
+
+# ===========================
+# ヒストグラム
+# ===========================
+class Histogram:
+    """
+    上限（le）固定のバケットに観測値を数える。ラベルの組ごとに
+    [各バケットの件数..., +Inf の件数, 合計] を持つ（件数は累積ではなくバケット単位）。
+    """
+
+    def __init__(self, name: str, doc: str, buckets: Sequence[float], labelnames: Sequence[str] = ()):
+        self.name = name
+        self.doc = doc
+        self.buckets = tuple(buckets)
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._series: Dict[LabelKey, List[float]] = {}
+
+    def _key(self, labels: Dict[str, object]) -> LabelKey:
+        return tuple(str(labels.get(k, "")) for k in self.labelnames)
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        i = 0
+        while i < len(self.buckets) and value > self.buckets[i]:
+            i += 1
+        with self._lock:
+            s = self._series.get(key)
+            if s is None:
+                s = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            s[i] += 1
+            s[-1] += value
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        """with ブロックの経過秒を observe する（例外で抜けても記録）"""
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t0, **labels)
+
+    def snapshot(self) -> Dict[LabelKey, List[float]]:
+        with self._lock:
+            return {k: list(v) for k, v in self._series.items()}
+
+# ===========================
+# レジストリ
+# ===========================
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, Histogram] = {}
+
+    def histogram(self, name: str, doc: str, buckets: Sequence[float], labelnames: Sequence[str] = ()) -> Histogram:
+        """同名があればそれを返す（モジュールの再読み込みでも二重登録しない）"""
+        with self._lock:
+            h = self._metrics.get(name)
+            if h is None:
+                h = self._metrics[name] = Histogram(name, doc, buckets, labelnames)
+            return h
+
+    def snapshot(self) -> Dict[str, Dict[LabelKey, List[float]]]:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {h.name: h.snapshot() for h in metrics}
+
+    def to_prometheus(self) -> str:
+        """Prometheus テキスト形式（バケットは累積、+Inf・_sum・_count 付き）"""
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda h: h.name)
+        lines: List[str] = []
+        for h in metrics:
+            full = METRIC_PREFIX + h.name
+            lines.append(f"# HELP {full} {h.doc}")
+            lines.append(f"# TYPE {full} histogram")
+            for key, s in sorted(h.snapshot().items()):
+                base = [f'{n}="{_escape(v)}"' for n, v in zip(h.labelnames, key)]
+                acc = 0
+                for le, c in zip([*map(_fmt, h.buckets), "+Inf"], s[:-1]):
+                    acc += c
+                    le_label = 'le="%s"' % le
+                    lines.append(f"{full}_bucket{{{','.join(base + [le_label])}}} {int(acc)}")
+                labels = f"{{{','.join(base)}}}" if base else ""
+                lines.append(f"{full}_sum{labels} {_fmt(s[-1])}")
+                lines.append(f"{full}_count{labels} {int(acc)}")
+        return "\n".join(lines) + "\n"
+
+    def report(self, since: Optional[Dict[str, Dict[LabelKey, List[float]]]] = None) -> Dict[str, List[Dict]]:
+        """
+        since（開始時の snapshot()）からの差分を、メトリクスごとに
+        [{labels, count, sum, mean, p50, p90, p99}] で返す。分位点はバケット内の線形補間による推定値。
+        """
+        since = since or {}
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda h: h.name)
+        out: Dict[str, List[Dict]] = {}
+        for h in metrics:
+            prev = since.get(h.name, {})
+            rows = []
+            for key, s in sorted(h.snapshot().items()):
+                p = prev.get(key)
+                d = [a - b for a, b in zip(s, p)] if p else s
+                count = int(sum(d[:-1]))
+                if count == 0:
+                    continue
+                rows.append({
+                    "labels": dict(zip(h.labelnames, key)),
+                    "count": count,
+                    "sum": round(d[-1], 6),
+                    "mean": round(d[-1] / count, 6),
+                    **{f"p{q}": _quantile(h.buckets, d[:-1], q / 100) for q in (50, 90, 99)},
+                })
+            if rows:
+                out[h.name] = rows
+        return out
+
+def _quantile(buckets: Tuple[float, ...], counts: List[float], q: float) -> float:
+    total = sum(counts)
+    rank = q * total
+    acc = 0.0
+    lower = 0.0
+    for i, c in enumerate(counts):
+        upper = buckets[i] if i < len(buckets) else buckets[-1]   # +Inf は最後の上限で頭打ち
+        if c and acc + c >= rank:
+            return round(lower + (upper - lower) * (rank - acc) / c, 6)
+        acc += c
+        lower = upper
+    return float(buckets[-1])
+
+def _fmt(v: float) -> str:
+    v = float(v)
+    return str(int(v)) if v.is_integer() and abs(v) < 1e15 else repr(v)
+
+def _escape(v: str) -> str:
+    return v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+REGISTRY = Registry()
+
+# ===========================
+# 計測項目
+# ===========================
+FETCH_SECONDS = REGISTRY.histogram(
+    "fetch_seconds", "HTTP 取得の所要秒（本文の読み込みまで、解析は含まない）",
+    SECONDS_BUCKETS, ("kind", "status"))
+FETCH_BYTES = REGISTRY.histogram(
+    "fetch_bytes", "1リクエストで読み込んだ本文バイト数（304 は 0）",
+    BYTES_BUCKETS, ("kind",))
+PARSE_SECONDS = REGISTRY.histogram(
+    "parse_seconds", "本文の解析秒（キャッシュの解析結果を使った場合は記録しない）",
+    SECONDS_BUCKETS, ("kind",))
+RATE_WAIT_SECONDS = REGISTRY.histogram(
+    "rate_limit_wait_seconds", "レート制限でトークンを待った秒",
+    SECONDS_BUCKETS)
+SQL_SECONDS = REGISTRY.histogram(
+    "sql_seconds", "書き込み系 SQL の所要秒（op ごと）",
+    SECONDS_BUCKETS, ("op",))
+ROWS_WRITTEN = REGISTRY.histogram(
+    "rows_written", "1回の書き込みで追加・更新した行数（table ごと）",
+    ROWS_BUCKETS, ("table",))
+PHASE_SECONDS = REGISTRY.histogram(
+    "phase_seconds", "集計ジョブのフェーズごとの所要秒",
+    SECONDS_BUCKETS, ("phase",))
+EXPORT_SECONDS = REGISTRY.histogram(
+    "export_seconds", "静的 JSON 書き出しの所要秒（stage ごと）",
+    SECONDS_BUCKETS, ("stage",))
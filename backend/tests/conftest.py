@@ -0,0 +1,5 @@
+# backend/ のモジュール（aggregator, db_pool ...）をパッケージ化せずに import できるようにする
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,45 @@
+import sqlite3
+import threading
+
+import pytest
+
+from aggregator import init_db
+from db_pool import ReadPool
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "trend.db")
+    init_db(path)
+    return path
+
+def _acquire_with_timeout(pool: ReadPool, timeout: float = 2.0) -> bool:
+    """別スレッドで connection() を取り、timeout 以内に取れたら True（取れなければ待ちっぱなし = 漏れ）"""
+    done = threading.Event()
+
+    def run():
+        with pool.connection() as conn:
+            conn.execute("SELECT 1").fetchone()
+        done.set()
+
+    threading.Thread(target=run, daemon=True).start()
+    return done.wait(timeout)
+
+def test_connection_is_returned_after_non_db_exception(db_path):
+    pool = ReadPool(db_path, size=2)
+    for _ in range(pool.size):
+        with pytest.raises(ValueError):
+            with pool.connection():
+                raise ValueError("bad cursor")
+    for _ in range(pool.size + 1):
+        assert _acquire_with_timeout(pool)
+    assert pool._created <= pool.size
+    pool.close()
+
+def test_database_error_discards_connection(db_path):
+    pool = ReadPool(db_path, size=1)
+    with pytest.raises(sqlite3.DatabaseError):
+        with pool.connection() as conn:
+            conn.execute("SELECT * FROM no_such_table")
+    assert pool._created == 0
+    assert _acquire_with_timeout(pool)
+    pool.close()
@@ -0,0 +1,40 @@
+import itertools
+import threading
+from contextlib import closing
+
+import pytest
+
+from aggregator import _interleave
+
+def _endless(name, closed):
+    try:
+        for i in itertools.count():
+            yield i
+    finally:
+        closed.add(name)
+
+def _source_threads():
+    return [t for t in threading.enumerate() if t.name.startswith("source-")]
+
+def test_consumer_error_stops_and_closes_sources():
+    closed = set()
+    gens = {name: _endless(name, closed) for name in ("zenn", "qiita")}
+    with pytest.raises(RuntimeError):
+        with closing(_interleave(gens)) as stream:
+            for n, (_, item) in enumerate(stream):
+                if n == 10:
+                    raise RuntimeError("writer failed")
+    assert closed == {"zenn", "qiita"}
+    assert not _source_threads()
+
+def test_source_error_ends_only_that_source():
+    def broken():
+        yield 1
+        raise ValueError("boom")
+
+    def finite():
+        yield from range(3)
+
+    items = list(_interleave({"a": broken(), "b": finite()}))
+    assert sorted(items) == [("a", 1), ("b", 0), ("b", 1), ("b", 2)]
+    assert not _source_threads()
@@ -0,0 +1,31 @@
+import threading
+
+import pytest
+
+from jobs import JobConflict, JobRunner
+
+def _blocking(release: threading.Event):
+    """release されるまで戻らないジョブ"""
+    def fn(progress, **params):
+        release.wait(5)
+        return params
+    return fn
+
+def test_single_flight_only_joins_identical_params():
+    release, finished = threading.Event(), threading.Event()
+    runner = JobRunner(on_finish=lambda job: finished.set())
+    fn = _blocking(release)
+
+    job, joined = runner.submit("aggregate", fn, days=90, sources=None)
+    assert not joined
+    same, joined = runner.submit("aggregate", fn, days=90, sources=None)
+    assert joined and same is job
+    with pytest.raises(JobConflict) as e:
+        runner.submit("aggregate", fn, days=90, sources="qiita")
+    assert e.value.job is job
+
+    release.set()
+    assert finished.wait(5)
+    assert job.status == "succeeded"
+    other, joined = runner.submit("aggregate", fn, days=90, sources="qiita")
+    assert not joined and other is not job
@@ -0,0 +1,62 @@
+import asyncio
+import os
+import subprocess
+import sys
+import threading
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+import main
+from aggregator import encode_cursor
+from db_pool import ReadPool
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+@pytest.fixture
+def app_state(tmp_path, monkeypatch):
+    """lifespan を1つのイベントループで開始・終了し、その間 app.state.pool が tmp の DB を指す"""
+    monkeypatch.setattr(main, "DB_PATH", str(tmp_path / "trend.db"))
+    loop = asyncio.new_event_loop()
+    cm = main.lifespan(main.app)
+    loop.run_until_complete(cm.__aenter__())
+    try:
+        yield main.app.state
+    finally:
+        loop.run_until_complete(cm.__aexit__(None, None, None))
+        loop.close()
+        del main.app.state.pool
+
+def test_import_does_not_touch_db(tmp_path):
+    db = tmp_path / "trend.db"
+    env = {**os.environ, "DB_PATH": str(db), "PYTHONPATH": BACKEND_DIR}
+    subprocess.run([sys.executable, "-c", "import main"], cwd=tmp_path, env=env, check=True)
+    assert not db.exists()
+
+def test_lifespan_creates_schema_and_pool(app_state):
+    assert isinstance(app_state.pool, ReadPool)
+    assert os.path.exists(app_state.pool.db_path)
+    assert main._read(lambda conn: conn.execute("SELECT COUNT(*) FROM metrics").fetchone()[0]) == 0
+
+def _request() -> Request:
+    return Request({"type": "http", "method": "GET", "path": "/rankings/page", "query_string": b"", "headers": []})
+
+def _rankings_page(cursor):
+    return main.rankings_page(_request(), days=30, limit=50, cursor=cursor, min_articles=0, tags=None,
+                              top_n=5, include_articles=True)
+
+def test_bad_cursors_do_not_exhaust_read_pool(app_state):
+    app_state.pool.close()
+    app_state.pool = ReadPool(app_state.pool.db_path, size=2)
+    for _ in range(app_state.pool.size + 2):
+        with pytest.raises(HTTPException) as e:
+            _rankings_page("garbage")
+        assert e.value.status_code == 400
+
+    result = {}
+    t = threading.Thread(target=lambda: result.update(res=_rankings_page(encode_cursor(1.0, "python"))), daemon=True)
+    t.start()
+    t.join(timeout=2.0)
+    assert not t.is_alive(), "read pool exhausted by bad cursors"
+    assert result["res"].status_code == 200
@@ -0,0 +1,17 @@
+import pytest
+
+from aggregator import SOURCE_ADAPTERS, SourceAdapter
+
+def test_adapter_without_fetch_methods_fails_at_construction():
+    class ListOnly(SourceAdapter):
+        name = "list-only"
+
+        def fetch_list(self, page, limiter, cache):
+            return []
+
+    with pytest.raises(TypeError):
+        ListOnly()
+
+def test_registered_adapters_are_complete():
+    assert set(SOURCE_ADAPTERS) == {"zenn", "qiita"}
+    assert all(isinstance(a, SourceAdapter) for a in SOURCE_ADAPTERS.values())
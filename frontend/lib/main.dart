@@ -528,13 +528,15 @@ class _DetailPageState extends State<DetailPage> {
     setState(() => loading = true);
     try {
       // ① 静的JSONを優先
-      final urlStatic = Uri.parse('$apiBase/tools/${widget.slug}-${days}.json');
+      // ファイル名は slug を encodeComponent したもの（exporter.slug_filename）。URL ではそれをもう一度エンコードする
+      final file = Uri.encodeComponent(Uri.encodeComponent(widget.slug));
+      final urlStatic = Uri.parse('$apiBase/tools/$file-${days}.json');
       final rs = await http.get(urlStatic);
       if (rs.statusCode == 200) {
         data = jsonDecode(rs.body) as Map<String, dynamic>;
       } else {
         // ② 失敗したらバックエンドへ
-        final urlApi = Uri.parse('$backendBase/tool/${widget.slug}?days=$days');
+        final urlApi = Uri.parse('$backendBase/tool/${Uri.encodeComponent(widget.slug)}?days=$days');
         final ra = await http.get(urlApi);
         if (ra.statusCode != 200) {
           throw Exception('detail not found (static:${rs.statusCode}, api:${ra.statusCode})');